@@ -8,6 +8,7 @@ import django_filters
 from django.db.models import QuerySet
 
 from cashflow.models import Cashflow
+from cashflow.search import search_cashflows
 
 
 class CashflowFilter(django_filters.FilterSet):
@@ -22,15 +23,14 @@ class CashflowFilter(django_filters.FilterSet):
 
     status = django_filters.NumberFilter(field_name="status_id")
 
-    # фильтры по иерархии через связи
-    type = django_filters.NumberFilter(
-        field_name="subcategory__category__type_id"
-    )
-    category = django_filters.NumberFilter(
-        field_name="subcategory__category_id"
-    )
+    # тип и категория хранятся в записи — фильтр без JOIN
+    type = django_filters.NumberFilter(field_name="type_id")
+    category = django_filters.NumberFilter(field_name="category_id")
     subcategory = django_filters.NumberFilter(field_name="subcategory_id")
 
+    # поиск по комментарию; без ordering — по релевантности
+    q = django_filters.CharFilter(method="filter_q", label="Поиск")
+
     ordering = django_filters.OrderingFilter(
         fields=(
             ("created_at", "created_at"),
@@ -49,4 +49,11 @@ class CashflowFilter(django_filters.FilterSet):
             "type",
             "category",
             "subcategory",
+            "q",
         ]
+
+    def filter_q(
+        self, queryset: QuerySet[Cashflow], name: str, value: str
+    ) -> QuerySet[Cashflow]:
+        """Записи со всеми словами запроса в комментарии."""
+        return search_cashflows(queryset, value)
@@ -0,0 +1,77 @@
+"""
+Проверки готовности для ``/api/health/``: БД и кэш.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any
+
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+from dds_project.metrics import HEALTH_LATENCY, HEALTH_UP
+
+logger = logging.getLogger(__name__)
+
+# Ключ кэша для проверки записи/чтения
+HEALTH_CACHE_KEY = "health:ping"
+
+# Что отдаётся вместо текста исключения: он может раскрыть хосты,
+# пользователей БД и пути, а ``/api/health/`` открыт без входа
+HEALTH_ERROR = "unavailable"
+
+
+def _result(name: str, started: float, error: Exception | None = None):
+    latency = time.perf_counter() - started
+    HEALTH_UP.set(0 if error else 1, check=name)
+    HEALTH_LATENCY.set(latency, check=name)
+    result: dict[str, Any] = {
+        "ok": error is None,
+        "latency_ms": round(latency * 1000, 2),
+    }
+    if error is not None:
+        logger.error("Проверка готовности %s не прошла", name, exc_info=error)
+        result["error"] = HEALTH_ERROR
+    return result
+
+
+def check_database(alias: str = "default") -> dict[str, Any]:
+    """
+    Готовность БД: ``SELECT 1`` и задержка соединения.
+
+    При включённом пуле psycopg3 добавляет его статистику.
+    """
+    connection = connections[alias]
+    started = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+    except DatabaseError as exc:
+        return _result("database", started, exc)
+    result = _result("database", started)
+    pool = getattr(connection, "pool", None)
+    if pool is not None:
+        result["pool"] = pool.get_stats()
+    return result
+
+
+def check_cache() -> dict[str, Any]:
+    """Готовность кэша (версии справочников и данных хранятся в нём)."""
+    started = time.perf_counter()
+    value = str(time.time_ns())
+    try:
+        cache.set(HEALTH_CACHE_KEY, value, timeout=10)
+        if cache.get(HEALTH_CACHE_KEY) != value:
+            raise RuntimeError("значение не прочиталось из кэша")
+    except Exception as exc:  # у бэкендов кэша нет общего исключения
+        return _result("cache", started, exc)
+    return _result("cache", started)
+
+
+def readiness() -> tuple[bool, dict[str, Any]]:
+    """Все проверки: признак готовности и подробности."""
+    checks = {"database": check_database(), "cache": check_cache()}
+    return all(check["ok"] for check in checks.values()), checks
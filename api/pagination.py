@@ -0,0 +1,123 @@
+"""
+Пагинация DRF для API.
+"""
+
+from __future__ import annotations
+
+from django.db.models import QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from cashflow.keyset import InvalidCursor, KeysetPage, KeysetPaginator
+
+
+class CashflowCursorPagination(BasePagination):
+    """Keyset-пагинация записей ДДС по ``(-created_at, -id)``.
+
+    Сортировка берётся из выборки (параметр ``ordering`` фильтра),
+    ``id`` добавляется как уникальный хвост ключа.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    invalid_cursor_message = "Некорректный курсор."
+
+    def get_page_size(self, request) -> int:
+        """Размер страницы из запроса с ограничением сверху."""
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None):
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.get_page_size(request))
+        try:
+            self.page: KeysetPage = paginator.page(
+                request.query_params.get(self.cursor_query_param)
+            )
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return self.page.object_list
+
+    async def apaginate_queryset(self, queryset: QuerySet, request):
+        """Асинхронный ``paginate_queryset`` для async-вьюх."""
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.get_page_size(request))
+        try:
+            self.page = await paginator.apage(
+                request.query_params.get(self.cursor_query_param)
+            )
+        except InvalidCursor:
+            raise NotFound(self.invalid_cursor_message)
+        return self.page.object_list
+
+    def _link(self, cursor: str | None) -> str | None:
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self) -> str | None:
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self) -> str | None:
+        return self._link(self.page.previous_cursor)
+
+    def get_first_link(self) -> str:
+        url = self.request.build_absolute_uri()
+        return remove_query_param(url, self.cursor_query_param)
+
+    def get_paginated_data(self, data) -> dict:
+        """Тело ответа страницы: ссылки соседних страниц и строки."""
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view) -> list[dict]:
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Курсор страницы (из ссылок next/previous).",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": (
+                    f"Размер страницы (по умолчанию {self.page_size}, "
+                    f"не более {self.max_page_size})."
+                ),
+                "schema": {"type": "integer"},
+            },
+        ]
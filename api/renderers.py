@@ -0,0 +1,37 @@
+"""
+Рендереры DRF для API.
+"""
+
+from __future__ import annotations
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # orjson — необязательная зависимость
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON через ``orjson``, если пакет установлен.
+
+    Ответ тот же, что у ``JSONRenderer`` (компактный UTF-8); без
+    ``orjson`` или при запросе отступов (``Accept: ...; indent=4``)
+    работает стандартный рендерер.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(
+            accepted_media_type or "", renderer_context or {}
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if data is None:
+            return b""
+        # даты и нестроковые ключи — как у стандартного кодировщика DRF
+        return orjson.dumps(
+            data,
+            default=self.encoder_class().default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
@@ -0,0 +1,703 @@
+"""
+Тесты API записей ДДС и проверки готовности.
+
+Бюджет SQL-запросов: число запросов каждого эндпоинта не зависит от
+числа записей — N+1 (например, пропавший ``select_related`` или
+обращение к справочнику в каждой строке) ломает тест. Остальные тесты
+проверяют ответы эндпоинтов.
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from cashflow.models import Cashflow
+from dds_project.testing import (
+    QueryBudgetTestCase,
+    create_cashflows,
+    create_directories,
+    create_statuses,
+    expected_rollup_rows,
+    rollup_rows,
+)
+
+from .health import HEALTH_ERROR
+from .renderers import ORJSONRenderer
+
+# Бюджеты запросов для клиента без сессии (с сессией DRF добавляет два
+# запроса: сессию и пользователя). Транзакции считаются запросами:
+# SAVEPOINT и RELEASE на каждый atomic.
+# Страница списка: строки страницы (+1 строка на признак следующей)
+LIST_QUERIES = 1
+# Карточка записи
+RETRIEVE_QUERIES = 1
+# Сводка: итоги из дневного агрегата или одним GROUP BY
+SUMMARY_QUERIES = 1
+# Выгрузка: одна выборка, читаемая пачками
+EXPORT_QUERIES = 1
+# Пересчёт корзин агрегата: блокировка дней, записи корзин, DELETE и
+# INSERT.
+# Создание: категория и тип подкатегории, INSERT, пересчёт корзины и две
+# транзакции; категория и тип для ответа — из снимка справочников
+CREATE_QUERIES = 10
+# Изменение: запись, категория и тип подкатегории, UPDATE, пересчёт
+# старой и новой корзин и две транзакции
+UPDATE_QUERIES = 11
+# Удаление: запись, DELETE, пересчёт корзины и две транзакции
+DELETE_QUERIES = 9
+# Массовые операции: одна пачка записей, корзины агрегата и их
+# пересчёт; справочники для проверки строк — из снимка, категория и тип
+# для записи — одним запросом на пачку
+BULK_CREATE_QUERIES = 12
+BULK_UPDATE_QUERIES = 14
+BULK_DELETE_QUERIES = 12
+# Готовность: SELECT 1
+HEALTH_QUERIES = 1
+
+
+class CashflowApiQueryBudgetTests(QueryBudgetTestCase):
+    """Эндпоинты ``/api/cashflows/``."""
+
+    login = False
+
+    def get(self, name: str, params: dict | None = None, **kwargs):
+        url = reverse(name, kwargs=kwargs or None)
+        return lambda: self.client.get(url, params)
+
+    def send(self, method: str, url: str, data):
+        return getattr(self.client, method)(
+            url, json.dumps(data), content_type="application/json"
+        )
+
+    def test_list(self) -> None:
+        self.assertQueryBudget(LIST_QUERIES, self.get("cashflows-list"))
+
+    def test_list_shapes_and_filters(self) -> None:
+        params = [
+            {"fields": "id,amount,type,category", "expand": "status"},
+            {"expand": "status,subcategory"},
+            {"status": self.statuses[0].pk, "type": self.type_id()},
+            {"category": self.subcategories[0].category_id, "q": "запись"},
+            {"date_from": "2000-01-01T00:00:00", "page_size": 5},
+        ]
+        for query in params:
+            with self.subTest(**query):
+                self.assertQueryBudget(
+                    LIST_QUERIES, self.get("cashflows-list", query)
+                )
+
+    def test_list_next_page(self) -> None:
+        def next_page():
+            first = self.client.get(
+                reverse("cashflows-list"), {"page_size": 2}
+            )
+            return self.client.get(first.json()["next"])
+
+        # в замер входят обе страницы: первая даёт курсор второй
+        self.assertQueryBudget(LIST_QUERIES * 2, next_page)
+
+    def test_retrieve(self) -> None:
+        def retrieve():
+            return self.client.get(
+                reverse("cashflows-detail", args=[self.cashflows[-1].pk]),
+                {"expand": "status,subcategory"},
+            )
+
+        self.assertQueryBudget(RETRIEVE_QUERIES, retrieve)
+
+    def test_summary(self) -> None:
+        for group_by in ("", "type,category", "status,month"):
+            with self.subTest(group_by=group_by):
+                self.assertQueryBudget(
+                    SUMMARY_QUERIES,
+                    self.get("cashflows-summary", {"group_by": group_by}),
+                )
+
+    def test_summary_filtered(self) -> None:
+        params = {"group_by": "subcategory", "q": "запись"}
+        self.assertQueryBudget(
+            SUMMARY_QUERIES, self.get("cashflows-summary", params)
+        )
+
+    def test_export(self) -> None:
+        for file_format in ("csv", "jsonl", "xlsx"):
+            with self.subTest(file_format=file_format):
+                self.assertQueryBudget(
+                    EXPORT_QUERIES,
+                    self.get(
+                        "cashflows-export", {"file_format": file_format}
+                    ),
+                )
+
+    def test_async_list_and_summary(self) -> None:
+        self.assertQueryBudget(
+            LIST_QUERIES,
+            self.get("cashflows-async-list", {"expand": "subcategory"}),
+        )
+        self.assertQueryBudget(
+            SUMMARY_QUERIES,
+            self.get("cashflows-async-summary", {"group_by": "type"}),
+        )
+
+    def test_create(self) -> None:
+        data = {
+            "status": self.statuses[0].pk,
+            "subcategory": self.subcategories[0].pk,
+            "amount": "150.00",
+            "comment": "новая",
+        }
+        self.assertQueryBudget(
+            CREATE_QUERIES,
+            lambda: self.send("post", reverse("cashflows-list"), data),
+            status=201,
+        )
+
+    def test_update(self) -> None:
+        def update():
+            return self.send(
+                "patch",
+                reverse("cashflows-detail", args=[self.cashflows[-1].pk]),
+                {"subcategory": self.subcategories[-1].pk},
+            )
+
+        self.assertQueryBudget(UPDATE_QUERIES, update)
+
+    def test_delete(self) -> None:
+        def delete():
+            pk = self.cashflows.pop().pk
+            return self.client.delete(reverse("cashflows-detail", args=[pk]))
+
+        self.assertQueryBudget(DELETE_QUERIES, delete, status=204)
+
+    def bulk_rows(self, count: int = 20) -> list[dict]:
+        return [
+            {
+                "status": self.statuses[index % 2].pk,
+                "subcategory": self.subcategories[index % 8].pk,
+                "amount": f"{index + 1}.00",
+                "created_at": f"2024-01-{index % 28 + 1:02d}T12:00:00Z",
+            }
+            for index in range(count)
+        ]
+
+    def test_bulk_create(self) -> None:
+        url = reverse("cashflows-bulk-create")
+        self.assertQueryBudget(
+            BULK_CREATE_QUERIES,
+            lambda: self.send("post", url, self.bulk_rows()),
+            status=201,
+        )
+
+    def test_bulk_update(self) -> None:
+        url = reverse("cashflows-bulk-create")
+
+        def update():
+            rows = [
+                {"id": obj.pk, "amount": "1.00", "status": obj.status_id}
+                for obj in self.cashflows[:5]
+            ]
+            return self.send("patch", url, rows)
+
+        self.assertQueryBudget(BULK_UPDATE_QUERIES, update)
+
+    def test_bulk_delete(self) -> None:
+        url = reverse("cashflows-bulk-create")
+
+        def delete():
+            pks = [self.cashflows.pop().pk for _ in range(2)]
+            return self.send("delete", url, {"ids": pks})
+
+        self.assertQueryBudget(BULK_DELETE_QUERIES, delete)
+
+    def type_id(self) -> int:
+        return self.subcategories[0].category.type_id
+
+
+class HealthQueryBudgetTests(QueryBudgetTestCase):
+    """Проверка готовности, метрики, корень и документация API."""
+
+    login = False
+
+    def test_health(self) -> None:
+        url = reverse("api-health")
+        response = self.assertQueryBudget(
+            HEALTH_QUERIES, lambda: self.client.get(url)
+        )
+        self.assertEqual(response.json()["status"], "ok")
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_no_database(self) -> None:
+        headers = {"Authorization": "Bearer secret"}
+        for name in ("api-root", "metrics", "schema", "swagger-ui", "redoc"):
+            with self.subTest(name=name):
+                url = reverse(name)
+                self.assertQueryBudget(
+                    0, lambda: self.client.get(url, headers=headers)
+                )
+
+
+class HealthTests(TestCase):
+    """Отказы проверок: 503 без подробностей, подробности — в лог."""
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def assertUnavailable(self, check: str, secret: str) -> None:
+        with self.assertLogs("api.health", "ERROR") as logs:
+            response = self.client.get(reverse("api-health"))
+
+        self.assertEqual(response.status_code, 503)
+        data = response.json()
+        self.assertEqual(data["status"], "unavailable")
+        self.assertEqual(data[check]["error"], HEALTH_ERROR)
+        self.assertNotIn(secret, response.content.decode())
+        self.assertIn(secret, logs.output[0])
+
+    def test_database_error(self) -> None:
+        secret = 'host "db.internal" user "dds"'
+        with mock.patch.object(
+            connections["default"],
+            "cursor",
+            side_effect=DatabaseError(f"connection to {secret} failed"),
+        ):
+            self.assertUnavailable("database", secret)
+
+    def test_cache_error(self) -> None:
+        secret = "redis://:password@cache.internal:6379"
+        with mock.patch(
+            "api.health.cache.set", side_effect=ConnectionError(secret)
+        ):
+            self.assertUnavailable("cache", secret)
+
+
+class CashflowApiTestCase(TestCase):
+    """Справочники для тестов ответов API записей ДДС."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.subcategories = create_directories()
+        cls.statuses = create_statuses()
+
+    def setUp(self) -> None:
+        # версии снимка справочников и данных ДДС из прошлых тестов
+        cache.clear()
+
+    def create(self, **kwargs) -> Cashflow:
+        """Запись ДДС: по умолчанию первые статус и подкатегория."""
+        kwargs.setdefault("status", self.statuses[0])
+        kwargs.setdefault("subcategory", self.subcategories[0])
+        kwargs.setdefault("amount", Decimal("100.00"))
+        return Cashflow.objects.create(**kwargs)
+
+
+class CashflowPaginationTests(CashflowApiTestCase):
+    """Курсорная пагинация ``/api/cashflows/``."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        # записи в пределах одной миллисекунды: курсор не должен
+        # терять микросекунды
+        self.objects = create_cashflows(
+            6,
+            self.subcategories[:1],
+            self.statuses[:1],
+            start=timezone.now().replace(microsecond=500),
+            step=-timedelta(microseconds=100),
+        )
+
+    def walk(self, url: str, link: str) -> list[list[int]]:
+        """Идёт по ссылкам ``link`` и возвращает id строк по страницам."""
+        pages = []
+        while url and len(pages) <= len(self.objects):
+            data = self.client.get(url).json()
+            pages.append([row["id"] for row in data["results"]])
+            url = data[link]
+        return pages
+
+    def test_pages_walk_both_ways(self) -> None:
+        by_date = [obj.pk for obj in self.objects]
+        for ordering, expected in (
+            ("-created_at", by_date[::-1]),
+            ("created_at", by_date),
+        ):
+            with self.subTest(ordering=ordering):
+                url = reverse("cashflows-list")
+                first = f"{url}?ordering={ordering}&page_size=2"
+                pages = self.walk(first, "next")
+                self.assertEqual(
+                    pages, [expected[i : i + 2] for i in (0, 2, 4)]
+                )
+
+                last = self.client.get(first).json()
+                while last["next"]:
+                    last = self.client.get(last["next"]).json()
+                back = self.walk(last["previous"], "previous")
+                self.assertEqual(back, pages[-2::-1])
+
+    def test_invalid_cursor(self) -> None:
+        response = self.client.get(
+            reverse("cashflows-list"), {"cursor": "not-a-cursor"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class CashflowSummaryTests(CashflowApiTestCase):
+    """Сводка ``/api/cashflows/summary/``."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        income, outcome = self.subcategories[0], self.subcategories[4]
+        day = timezone.localtime().replace(hour=12, minute=0)
+        self.day = day
+        self.create(subcategory=income, amount="100.00", created_at=day)
+        self.create(
+            subcategory=income,
+            amount="50.00",
+            created_at=day - timedelta(days=40),
+            status=self.statuses[1],
+        )
+        self.create(subcategory=outcome, amount="30.00", created_at=day)
+
+    def summary(self, **params) -> list[dict]:
+        response = self.client.get(reverse("cashflows-summary"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_totals(self) -> None:
+        (row,) = self.summary()
+        self.assertEqual(
+            row,
+            {
+                "count": 3,
+                "total": "180.00",
+                "min": "30.00",
+                "max": "100.00",
+                "income": "150.00",
+                "outcome": "30.00",
+                "net": "120.00",
+            },
+        )
+
+    def test_group_by_type(self) -> None:
+        rows = self.summary(group_by="type")
+        self.assertEqual(
+            [(r["type_name"], r["count"], r["total"]) for r in rows],
+            [("Пополнение", 2, "150.00"), ("Списание", 1, "30.00")],
+        )
+
+    def test_group_by_status_and_month(self) -> None:
+        rows = self.summary(group_by="status,month")
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(
+            {(r["status_id"], r["total"]) for r in rows},
+            {
+                (self.statuses[0].pk, "130.00"),
+                (self.statuses[1].pk, "50.00"),
+            },
+        )
+
+    def test_rollup_and_records_agree(self) -> None:
+        # границы целых дней — из агрегата, внутри дня — по записям
+        start = self.day.replace(hour=0)
+        for date_from in (start, start + timedelta(minutes=1)):
+            with self.subTest(date_from=date_from):
+                (row,) = self.summary(
+                    date_from=date_from.isoformat(), group_by="type"
+                )[:1]
+                self.assertEqual(
+                    (row["count"], row["total"]), (1, "100.00")
+                )
+
+    def test_invalid_group_by(self) -> None:
+        for group_by in ("nope", "day,month"):
+            with self.subTest(group_by=group_by):
+                response = self.client.get(
+                    reverse("cashflows-summary"), {"group_by": group_by}
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("group_by", response.json())
+
+
+class CashflowBulkTests(CashflowApiTestCase):
+    """Массовые операции ``/api/cashflows/bulk/``."""
+
+    url = reverse_lazy("cashflows-bulk-create")
+
+    def send(self, method: str, data):
+        return getattr(self.client, method)(
+            self.url, json.dumps(data), content_type="application/json"
+        )
+
+    def row(self, **kwargs) -> dict:
+        row = {
+            "status": self.statuses[0].pk,
+            "subcategory": self.subcategories[0].pk,
+            "amount": "10.00",
+            "created_at": "2024-03-01T12:00:00Z",
+        }
+        row.update(kwargs)
+        return row
+
+    def test_create(self) -> None:
+        subcategory = self.subcategories[5]
+        response = self.send(
+            "post", [self.row(), self.row(subcategory=subcategory.pk)]
+        )
+
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data["created"], 2)
+        obj = Cashflow.objects.get(pk=data["ids"][1])
+        self.assertEqual(
+            (obj.category_id, obj.type_id),
+            (subcategory.category_id, subcategory.category.type_id),
+        )
+        self.assertEqual(rollup_rows(), expected_rollup_rows())
+
+    def test_create_reports_row_errors_atomically(self) -> None:
+        response = self.send(
+            "post",
+            [self.row(), self.row(status=0), self.row(id=1)],
+        )
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["errors"]
+        self.assertEqual([error["index"] for error in errors], [1, 2])
+        self.assertIn("status", errors[0]["errors"])
+        self.assertFalse(Cashflow.objects.exists())
+
+    def test_not_a_list(self) -> None:
+        response = self.send("post", self.row())
+        self.assertEqual(response.status_code, 400)
+
+    def test_update(self) -> None:
+        objs = [self.create(), self.create()]
+        subcategory = self.subcategories[-1]
+        response = self.send(
+            "patch",
+            [
+                {"id": objs[0].pk, "amount": "1.50"},
+                {"id": objs[1].pk, "subcategory": subcategory.pk},
+            ],
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"updated": 2})
+        objs[0].refresh_from_db()
+        objs[1].refresh_from_db()
+        self.assertEqual(objs[0].amount, Decimal("1.50"))
+        self.assertEqual(objs[1].type_id, subcategory.category.type_id)
+        self.assertEqual(rollup_rows(), expected_rollup_rows())
+
+    def test_update_unknown_id_changes_nothing(self) -> None:
+        obj = self.create()
+        response = self.send(
+            "patch",
+            [
+                {"id": obj.pk, "amount": "1.00"},
+                {"id": obj.pk + 1000, "amount": "2.00"},
+            ],
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["index"], 1)
+        obj.refresh_from_db()
+        self.assertEqual(obj.amount, Decimal("100.00"))
+
+    def test_delete(self) -> None:
+        objs = [self.create(), self.create(), self.create()]
+        response = self.send("delete", {"ids": [objs[0].pk, objs[1].pk]})
+
+        self.assertEqual(response.json(), {"deleted": 2})
+        self.assertEqual(list(Cashflow.objects.all()), [objs[2]])
+        self.assertEqual(rollup_rows(), expected_rollup_rows())
+
+    def test_delete_unknown_id_deletes_nothing(self) -> None:
+        obj = self.create()
+        response = self.send("delete", {"ids": [obj.pk, obj.pk + 1000]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Cashflow.objects.filter(pk=obj.pk).exists())
+
+
+class ORJSONRendererTests(TestCase):
+    """``ORJSONRenderer`` отдаёт то же, что ``JSONRenderer``."""
+
+    data = {
+        "amount": Decimal("-1.50"),
+        "created_at": timezone.now(),
+        "comment": "строка",
+        "ids": [1, None],
+        1: True,
+    }
+
+    def test_same_output(self) -> None:
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(self.data)),
+            json.loads(JSONRenderer().render(self.data)),
+        )
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_indent_uses_json_renderer(self) -> None:
+        media_type = "application/json; indent=2"
+        self.assertEqual(
+            ORJSONRenderer().render(self.data, media_type),
+            JSONRenderer().render(self.data, media_type),
+        )
+
+
+class CashflowShapeTests(CashflowApiTestCase):
+    """Состав ответа: ``fields`` и ``expand``."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.cashflow = self.create(comment="аренда")
+        self.detail = reverse("cashflows-detail", args=[self.cashflow.pk])
+
+    def get(self, url: str, **params) -> tuple[dict, list[str]]:
+        """Ответ (карточка или первая строка списка) и SQL запроса."""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        row = data["results"][0] if "results" in data else data
+        return row, [query["sql"] for query in ctx.captured_queries]
+
+    def test_default_is_full(self) -> None:
+        row, _ = self.get(self.detail)
+        self.assertEqual(
+            list(row),
+            [
+                "id",
+                "created_at",
+                "status",
+                "subcategory",
+                "amount",
+                "comment",
+                "category",
+                "type",
+            ],
+        )
+        self.assertEqual(row["status"], self.statuses[0].pk)
+        self.assertEqual(
+            row["category"],
+            {
+                "id": self.cashflow.category_id,
+                "name": self.subcategories[0].category.name,
+            },
+        )
+
+    def test_fields(self) -> None:
+        for url in (reverse("cashflows-list"), self.detail):
+            with self.subTest(url=url):
+                row, queries = self.get(url, fields="id,amount")
+                self.assertEqual(
+                    row, {"id": self.cashflow.pk, "amount": "100.00"}
+                )
+                # категория и тип не запрошены — без JOIN справочников
+                self.assertNotIn("JOIN", queries[-1])
+
+    def test_expand(self) -> None:
+        row, _ = self.get(
+            self.detail, fields="status,subcategory", expand="status"
+        )
+        self.assertEqual(
+            row,
+            {
+                "status": {
+                    "id": self.statuses[0].pk,
+                    "name": self.statuses[0].name,
+                },
+                "subcategory": self.subcategories[0].pk,
+            },
+        )
+
+    def test_unknown_names(self) -> None:
+        for params in ({"fields": "id,secret"}, {"expand": "type"}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse("cashflows-list"), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+    def test_missing_detail(self) -> None:
+        for pk in (self.cashflow.pk + 1, "abc", "1e3"):
+            with self.subTest(pk=pk):
+                url = reverse("cashflows-detail", args=[pk])
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class CashflowAsyncViewTests(CashflowApiTestCase):
+    """Async-вьюхи отвечают так же, как вьюхи DRF."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        create_cashflows(
+            5,
+            self.subcategories[::4],
+            self.statuses[:1],
+            step=timedelta(hours=1),
+            amount=[Decimal(10 * (index + 1)) for index in range(5)],
+        )
+
+    async def assertSameResponse(
+        self, sync_name: str, async_name: str, params: dict
+    ) -> dict:
+        """Сравнивает ответы; возвращает JSON ответа async-вьюхи."""
+        expected = await self.async_client.get(reverse(sync_name), params)
+        response = await self.async_client.get(reverse(async_name), params)
+        self.assertEqual(response.status_code, expected.status_code)
+        # ссылки на страницы ведут на ту же вьюху, что и запрос
+        data = json.loads(
+            response.content.decode().replace("/api/async/", "/api/")
+        )
+        self.assertEqual(data, expected.json())
+        return data
+
+    async def test_list(self) -> None:
+        params = {"page_size": 2, "fields": "id,amount,type"}
+        data = await self.assertSameResponse(
+            "cashflows-list", "cashflows-async-list", params
+        )
+        self.assertEqual(len(data["results"]), 2)
+        cursor = data["next"].split("cursor=")[1].split("&")[0]
+
+        await self.assertSameResponse(
+            "cashflows-list",
+            "cashflows-async-list",
+            {**params, "cursor": cursor},
+        )
+
+    async def test_summary(self) -> None:
+        for group_by in ("", "type", "status,month"):
+            with self.subTest(group_by=group_by):
+                await self.assertSameResponse(
+                    "cashflows-summary",
+                    "cashflows-async-summary",
+                    {"group_by": group_by},
+                )
+
+    async def test_errors(self) -> None:
+        cases = [
+            ("cashflows-list", "cashflows-async-list", {"cursor": "x"}),
+            ("cashflows-list", "cashflows-async-list", {"fields": "x"}),
+            ("cashflows-list", "cashflows-async-list", {"status": "x"}),
+            (
+                "cashflows-summary",
+                "cashflows-async-summary",
+                {"group_by": "x"},
+            ),
+        ]
+        for sync_name, async_name, params in cases:
+            with self.subTest(params=params):
+                await self.assertSameResponse(sync_name, async_name, params)
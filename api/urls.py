@@ -5,11 +5,17 @@ URL DRF API: справочники, каскадные эндпоинты, ДД
 from __future__ import annotations
 
 from django.urls import include, path
+from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from api.health import readiness
 from api.routers import router
-from cashflow.views import CashflowViewSet
+from cashflow.views import (
+    CashflowViewSet,
+    cashflow_list_async,
+    cashflow_summary_async,
+)
 from directories.views import (
     CategoryCascadeViewSet,
     CategoryViewSet,
@@ -37,11 +43,28 @@ router.register(
 
 @api_view(["GET"])
 def health(_request):
-    """Проверка API."""
-    return Response({"status": "ok"})
+    """Проверка API: готовность БД и кэша (503, если что-то недоступно)."""
+    ready, checks = readiness()
+    if ready:
+        return Response({"status": "ok", **checks})
+    return Response(
+        {"status": "unavailable", **checks},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
 
 
 urlpatterns = [
     path("health/", health, name="api-health"),
+    # Async-версии списка и сводки ДДС (для ASGI)
+    path(
+        "async/cashflows/",
+        cashflow_list_async,
+        name="cashflows-async-list",
+    ),
+    path(
+        "async/cashflows/summary/",
+        cashflow_summary_async,
+        name="cashflows-async-summary",
+    ),
     path("", include(router.urls)),
 ]
@@ -1,14 +1,177 @@
 """
 Админка для записей ДДС.
 
-Отображает вычисляемые поля: тип и категория через связи подкатегории.
+Отображает тип и категорию записи (копии из подкатегории). Названия
+справочников в колонках и варианты фильтров берутся из снимка
+справочников, месяцы — из дневного агрегата, а число строк —
+``cheap_count``: страница списка не зависит от размера таблицы.
+
+Массовые действия (смена статуса, смена подкатегории, удаление)
+выполняются одним ``UPDATE``/``DELETE`` по выбранным строкам или по всей
+отфильтрованной выборке, без загрузки объектов.
 """
 
 from __future__ import annotations
 
-from django.contrib import admin
+import time
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import Model, ProtectedError, QuerySet, RestrictedError
+from django.http import HttpRequest
+from django.template.response import TemplateResponse
+
+from directories.cache import DirectorySnapshot, get_snapshot
+from directories.models import Subcategory
+from ui.forms import SnapshotChoiceField
+
+from .counts import EstimatedCountPaginator, cheap_count
+from .models import Cashflow, CashflowDailyRollup
+from .partitioning import month_bounds
+from .rollup import data_version
+
+# Сколько секунд держать список месяцев фильтра
+MONTHS_CACHE_TIMEOUT = 300
+
+
+def _name(obj: Model | None) -> str | None:
+    # None — админка покажет empty_value_display
+    return obj.name if obj is not None else None
+
+
+class SnapshotListFilter(admin.SimpleListFilter):
+    """
+    Фильтр по справочнику: варианты из снимка, без запросов к БД.
+
+    Подкласс задаёт ``field_name`` и ``objects``; без них ошибка
+    возникает при объявлении класса, а не при открытии списка.
+    """
+
+    # Колонка записи ДДС, по которой фильтруем
+    field_name = ""
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        if not cls.field_name:
+            raise ImproperlyConfigured(f"{cls.__name__}: не задан field_name.")
+        if cls.objects is SnapshotListFilter.objects:
+            raise ImproperlyConfigured(
+                f"{cls.__name__}: не определён метод objects()."
+            )
+
+    def objects(
+        self, request, snapshot: DirectorySnapshot
+    ) -> Iterable[Model]:
+        """Варианты фильтра из снимка справочников."""
+        raise NotImplementedError
+
+    def lookups(self, request, model_admin) -> list[tuple[int, str]]:
+        return [
+            (obj.pk, obj.name)
+            for obj in self.objects(request, get_snapshot())
+        ]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            return queryset.filter(**{self.field_name: int(self.value())})
+        except ValueError as exc:
+            raise IncorrectLookupParameters(exc) from exc
+
+
+class StatusListFilter(SnapshotListFilter):
+    title = "Статус"
+    parameter_name = "status"
+    field_name = "status_id"
+
+    def objects(self, request, snapshot):
+        return snapshot.statuses.values()
+
+
+class TypeListFilter(SnapshotListFilter):
+    title = "Тип"
+    parameter_name = "type"
+    field_name = "type_id"
+
+    def objects(self, request, snapshot):
+        return snapshot.types.values()
+
+
+class CategoryListFilter(SnapshotListFilter):
+    title = "Категория"
+    parameter_name = "category"
+    field_name = "category_id"
+
+    def objects(self, request, snapshot):
+        # при выбранном типе — только его категории
+        type_id = request.GET.get(TypeListFilter.parameter_name)
+        if type_id:
+            return snapshot.categories_of(type_id)
+        return snapshot.categories.values()
+
+
+class MonthListFilter(admin.SimpleListFilter):
+    """
+    Фильтр по месяцу вместо ``date_hierarchy``.
+
+    ``date_hierarchy`` на каждой странице ищет ``DISTINCT`` дат по всей
+    выборке записей; месяцы берём из дневного агрегата и кэшируем до
+    изменения данных. Фильтр — диапазон ``created_at`` (индекс и
+    секции месяца).
+    """
+
+    title = "Месяц"
+    parameter_name = "month"
+
+    def lookups(self, request, model_admin) -> list[tuple[str, str]]:
+        key = f"cashflow:admin-months:{data_version()}"
+        months = cache.get(key)
+        if months is None:
+            months = list(
+                CashflowDailyRollup.objects.dates("day", "month", "DESC")
+            )
+            cache.set(key, months, MONTHS_CACHE_TIMEOUT)
+        return [(f"{month:%Y-%m}", f"{month:%m.%Y}") for month in months]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            month = datetime.strptime(self.value(), "%Y-%m").date()
+        except ValueError as exc:
+            raise IncorrectLookupParameters(exc) from exc
+        start, end = month_bounds(month)
+        return queryset.filter(created_at__gte=start, created_at__lt=end)
+
+
+class BulkStatusForm(forms.Form):
+    """Новый статус для массовой смены."""
+
+    status = SnapshotChoiceField(
+        objects=lambda: get_snapshot().statuses.values(),
+        label="Новый статус",
+    )
+
+
+class BulkSubcategoryForm(forms.Form):
+    """Новая подкатегория; тип и категория записей меняются вместе с ней."""
+
+    subcategory = SnapshotChoiceField(
+        objects=lambda: get_snapshot().subcategories.values(),
+        label="Новая подкатегория",
+    )
 
-from .models import Cashflow
+
+class BulkDeleteForm(forms.Form):
+    """Подтверждение удаления (полей нет)."""
 
 
 @admin.register(Cashflow)
@@ -18,20 +181,174 @@ class CashflowAdmin(admin.ModelAdmin):
     list_display = (
         "created_at",
         "amount",
-        "status",
+        "status_name",
         "type_name",
         "category_name",
         "subcategory_name",
         "short_comment",
     )
     list_filter = (
-        "status",
-        "subcategory__category__type",
-        "subcategory__category",
+        MonthListFilter,
+        StatusListFilter,
+        TypeListFilter,
+        CategoryListFilter,
     )
+    # comment__icontains по словам — тот же поиск, что ``?q=`` в API
+    # и интерфейсе, его обслуживает триграммный индекс cf_comment_trgm
     search_fields = ("comment",)
-    date_hierarchy = "created_at"
     ordering = ("-created_at", "-id")
+    # без JOIN: названия справочников — из снимка
+    list_select_related = ()
+    # число строк — оценкой; полный COUNT(*) и счётчики у вариантов
+    # фильтров не считаем
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    actions = ("change_status", "change_subcategory", "delete_rows")
+    # шаблон промежуточной страницы (ui/templates)
+    bulk_action_template = "admin/cashflow/cashflow/bulk_action.html"
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # название подкатегории включает категорию — читаем их вместе
+        if db_field.name == "subcategory":
+            kwargs["queryset"] = Subcategory.objects.select_related(
+                "category"
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_actions(self, request: HttpRequest) -> dict:
+        # стандартное удаление грузит и удаляет записи по одной
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    def run_bulk_action(
+        self,
+        request: HttpRequest,
+        queryset: QuerySet[Cashflow],
+        form_class: type[forms.Form],
+        title: str,
+        apply: Callable[[QuerySet[Cashflow], dict], int],
+        done: str,
+    ) -> Optional[TemplateResponse]:
+        """
+        Массовое действие с промежуточной страницей.
+
+        Первый POST (из списка) показывает форму действия и число
+        затрагиваемых записей; POST с ``apply`` выполняет ``apply``
+        одним запросом в транзакции и возвращает в список с итогом.
+
+        Args:
+            request (HttpRequest): запрос.
+            queryset (QuerySet[Cashflow]): выбранные или отфильтрованные
+                записи.
+            form_class (type[forms.Form]): форма параметров действия.
+            title (str): заголовок страницы подтверждения.
+            apply (Callable): выполняет действие, возвращает число строк.
+            done (str): начало сообщения об успехе.
+        Returns:
+            Optional[TemplateResponse]: страница подтверждения или None
+            (возврат в список).
+        """
+        form = form_class(request.POST if "apply" in request.POST else None)
+        if form.is_bound and form.is_valid():
+            started = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    rows = apply(queryset, form.cleaned_data)
+            except (ProtectedError, RestrictedError) as exc:
+                self.message_user(
+                    request,
+                    "Действие отменено: на записи ссылаются защищённые "
+                    f"объекты ({exc.args[0]}).",
+                    messages.ERROR,
+                )
+                return None
+            except IntegrityError as exc:
+                self.message_user(
+                    request, f"Действие отменено: {exc}", messages.ERROR
+                )
+                return None
+            self.message_user(
+                request,
+                f"{done}: {rows} за "
+                f"{time.perf_counter() - started:.2f} с.",
+                messages.SUCCESS,
+            )
+            return None
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": title,
+            "opts": self.model._meta,
+            "form": form,
+            "rows": cheap_count(queryset),
+            "action": request.POST["action"],
+            "select_across": request.POST.get("select_across", "0"),
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+        }
+        request.current_app = self.admin_site.name
+        return TemplateResponse(request, self.bulk_action_template, context)
+
+    @admin.action(
+        description="Сменить статус выбранных записей",
+        permissions=("change",),
+    )
+    def change_status(self, request, queryset):
+        return self.run_bulk_action(
+            request,
+            queryset,
+            BulkStatusForm,
+            "Смена статуса записей ДДС",
+            lambda rows, data: rows.update(status=data["status"]),
+            "Статус изменён у записей",
+        )
+
+    @admin.action(
+        description="Сменить подкатегорию выбранных записей",
+        permissions=("change",),
+    )
+    def change_subcategory(self, request, queryset):
+        # CashflowQuerySet.update переносит тип и категорию подкатегории
+        return self.run_bulk_action(
+            request,
+            queryset,
+            BulkSubcategoryForm,
+            "Смена подкатегории записей ДДС",
+            lambda rows, data: rows.update(subcategory=data["subcategory"]),
+            "Подкатегория изменена у записей",
+        )
+
+    @admin.action(
+        description="Удалить выбранные записи",
+        permissions=("delete",),
+    )
+    def delete_rows(self, request, queryset):
+        # без сигналов удаления и ссылок на записи Django удаляет одним
+        # DELETE; CashflowQuerySet.delete пересчитывает агрегат
+        return self.run_bulk_action(
+            request,
+            queryset,
+            BulkDeleteForm,
+            "Удаление записей ДДС",
+            lambda rows, data: rows.delete()[0],
+            "Удалено записей",
+        )
+
+    def status_name(self, obj: Cashflow) -> str:
+        """
+        Возвращает название статуса для строки списка.
+
+        Args:
+            obj (Cashflow): текущая запись.
+        Returns:
+            str: название статуса.
+        """
+        return _name(get_snapshot().status(obj.status_id))
+
+    status_name.short_description = "Статус"
+    status_name.admin_order_field = "status__name"
 
     def type_name(self, obj: Cashflow) -> str:
         """
@@ -42,10 +359,10 @@ class CashflowAdmin(admin.ModelAdmin):
         Returns:
             str: название типа.
         """
-        return obj.type.name
+        return _name(get_snapshot().type(obj.type_id))
 
     type_name.short_description = "Тип"
-    type_name.admin_order_field = "subcategory__category__type__name"
+    type_name.admin_order_field = "type__name"
 
     def category_name(self, obj: Cashflow) -> str:
         """
@@ -56,10 +373,10 @@ class CashflowAdmin(admin.ModelAdmin):
         Returns:
             str: название категории.
         """
-        return obj.category.name
+        return _name(get_snapshot().category(obj.category_id))
 
     category_name.short_description = "Категория"
-    category_name.admin_order_field = "subcategory__category__name"
+    category_name.admin_order_field = "category__name"
 
     def subcategory_name(self, obj: Cashflow) -> str:
         """
@@ -70,7 +387,7 @@ class CashflowAdmin(admin.ModelAdmin):
         Returns:
             str: название подкатегории.
         """
-        return obj.subcategory.name
+        return _name(get_snapshot().subcategory(obj.subcategory_id))
 
     subcategory_name.short_description = "Подкатегория"
     subcategory_name.admin_order_field = "subcategory__name"
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CashflowConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cashflow'
+
+    def ready(self) -> None:
+        from . import signals  # noqa: F401
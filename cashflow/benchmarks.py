@@ -0,0 +1,310 @@
+"""
+Воспроизводимый замер горячих путей API и интерфейса.
+
+Сценарии выполняются в процессе через тестовый клиент Django (без
+сетевого сервера): список API с каждым фильтром и глубоким курсором,
+итоги, страницы списка в интерфейсе, HTMX-каскады, создание и
+редактирование записей. По каждому сценарию считаются перцентили
+задержки, пропускная способность и число SQL-запросов; результат —
+JSON для сравнения прогонов между релизами.
+"""
+
+from __future__ import annotations
+
+import statistics
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import timedelta
+from typing import Any, Callable, Optional
+
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from directories.cache import get_snapshot
+
+from .keyset import Cursor, encode_cursor
+from .models import Cashflow
+from .plans import PLAN_FILTERS, PLAN_WINDOW, most_common, search_term
+
+
+def percentile(values: list[float], share: float) -> float:
+    """Перцентиль по отсортированному списку (ближайший ранг)."""
+    index = max(0, min(len(values) - 1, round(share * len(values)) - 1))
+    return values[index]
+
+
+@dataclass
+class Scenario:
+    """
+    Сценарий: HTTP-запрос тестового клиента.
+
+    ``data`` — параметры или тело запроса либо функция, которая строит
+    их для очередного повтора (номер повтора — аргумент). Ответ с кодом,
+    отличным от ``expected``, считается ошибкой.
+    """
+
+    name: str
+    path: str
+    method: str = "get"
+    data: Any = None
+    writes: bool = False
+    expected: int = 200
+
+    def request(self, client: Client, attempt: int):
+        data = self.data(attempt) if callable(self.data) else self.data
+        if self.method == "get":
+            return client.get(self.path, data, HTTP_ACCEPT="application/json")
+        if self.path.startswith("/api/"):
+            return getattr(client, self.method)(
+                self.path, data, content_type="application/json"
+            )
+        return getattr(client, self.method)(self.path, data)
+
+
+@dataclass
+class ScenarioResult:
+    """Результат сценария; время — в миллисекундах."""
+
+    name: str
+    requests: int
+    errors: int
+    rps: float
+    mean: float
+    p50: float
+    p95: float
+    p99: float
+    max: float
+    queries: float
+    statuses: dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def _timed(
+    scenario: Scenario, client: Client, requests: int, warmup: int
+) -> ScenarioResult:
+    for attempt in range(warmup):
+        scenario.request(client, -attempt - 1)
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    queries = errors = 0
+    started = time.perf_counter()
+    for attempt in range(requests):
+        with CaptureQueriesContext(connection) as ctx:
+            began = time.perf_counter()
+            response = scenario.request(client, attempt)
+            latencies.append((time.perf_counter() - began) * 1000)
+        queries += len(ctx.captured_queries)
+        errors += response.status_code != scenario.expected
+        code = str(response.status_code)
+        statuses[code] = statuses.get(code, 0) + 1
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return ScenarioResult(
+        name=scenario.name,
+        requests=requests,
+        errors=errors,
+        rps=round(requests / elapsed, 1),
+        mean=round(statistics.mean(latencies), 2),
+        p50=round(percentile(latencies, 0.50), 2),
+        p95=round(percentile(latencies, 0.95), 2),
+        p99=round(percentile(latencies, 0.99), 2),
+        max=round(latencies[-1], 2),
+        queries=round(queries / requests, 1),
+        statuses=statuses,
+    )
+
+
+def run_scenario(
+    scenario: Scenario, requests: int, warmup: int = 3
+) -> ScenarioResult:
+    """
+    Выполняет сценарий ``requests`` раз (после ``warmup`` прогревочных).
+
+    Сценарии с записью выполняются в транзакции, которая откатывается:
+    данные после замера не меняются.
+    """
+    client = Client()
+    if not scenario.writes:
+        return _timed(scenario, client, requests, warmup)
+    with transaction.atomic():
+        result = _timed(scenario, client, requests, warmup)
+        transaction.set_rollback(True)
+    return result
+
+
+def build_scenarios() -> list[Scenario]:
+    """
+    Сценарии по текущим данным.
+
+    Значения фильтров — самые частые в данных (худшая селективность),
+    глубокий курсор — середина выборки.
+    """
+    values = {name: most_common(f"{name}_id") for name in PLAN_FILTERS}
+    base = Cashflow.objects.order_by("-created_at", "-id")
+    total = base.count()
+    middle = base.values("created_at", "id", "comment")[total // 2]
+    deep = encode_cursor(Cursor((middle["created_at"], middle["id"])))
+    latest = base.values_list("created_at", flat=True).first()
+    date_to = timezone.localtime(latest).replace(hour=12, minute=0, second=0)
+    window = {
+        "date_from": (date_to - PLAN_WINDOW).isoformat(),
+        "date_to": date_to.isoformat(),
+    }
+
+    scenarios = [Scenario("api: список", "/api/cashflows/")]
+    scenarios += [
+        Scenario(f"api: список {name}=", "/api/cashflows/", data={name: value})
+        for name, value in values.items()
+    ]
+    scenarios += [
+        Scenario("api: список за период", "/api/cashflows/", data=window),
+        Scenario(
+            "api: список по сумме",
+            "/api/cashflows/",
+            data={"ordering": "-amount"},
+        ),
+        Scenario(
+            "api: список fields=id,created_at,amount",
+            "/api/cashflows/",
+            data={"fields": "id,created_at,amount"},
+        ),
+        Scenario(
+            "api: keyset вглубь", "/api/cashflows/", data={"cursor": deep}
+        ),
+        Scenario(
+            "api: поиск q=",
+            "/api/cashflows/",
+            data={"q": search_term(middle["comment"]) or ""},
+        ),
+        Scenario("api: итоги", "/api/cashflows/summary/"),
+        Scenario(
+            "api: итоги type,month",
+            "/api/cashflows/summary/",
+            data={"group_by": "type,month"},
+        ),
+        Scenario(
+            "api: итоги за период", "/api/cashflows/summary/", data=window
+        ),
+        Scenario("ui: список", "/"),
+        Scenario("ui: список status=", "/", data={"status": values["status"]}),
+        Scenario("ui: keyset вглубь", "/", data={"cursor": deep}),
+        Scenario(
+            "htmx: категории типа",
+            "/htmx/types/categories/",
+            data={"type": values["type"]},
+        ),
+        Scenario(
+            "htmx: подкатегории категории",
+            "/htmx/categories/subcategories/",
+            data={"category": values["category"]},
+        ),
+    ]
+    scenarios += _write_scenarios(values)
+    return scenarios
+
+
+def _form_row(cashflow: Cashflow, attempt: int) -> dict[str, Any]:
+    """Данные формы записи ДДС с иерархией из записи-образца."""
+    subcategory = get_snapshot().subcategory(cashflow.subcategory_id)
+    created_at = timezone.localtime(cashflow.created_at)
+    return {
+        "created_at": (created_at - timedelta(minutes=attempt)).strftime(
+            "%Y-%m-%dT%H:%M"
+        ),
+        "type": subcategory.category.type_id,
+        "category": subcategory.category_id,
+        "subcategory": subcategory.pk,
+        "status": cashflow.status_id,
+        "amount": f"{100 + attempt % 1000}.00",
+        "comment": "benchmark",
+    }
+
+
+def _write_scenarios(values: dict[str, Any]) -> list[Scenario]:
+    target = Cashflow.objects.order_by("-created_at", "-id").first()
+
+    def api_row(attempt: int) -> dict[str, Any]:
+        return {
+            "status": values["status"],
+            "subcategory": values["subcategory"],
+            "amount": f"{100 + attempt % 1000}.00",
+            "comment": "benchmark",
+        }
+
+    return [
+        Scenario(
+            "api: создание",
+            "/api/cashflows/",
+            method="post",
+            data=api_row,
+            writes=True,
+            expected=201,
+        ),
+        Scenario(
+            "api: изменение",
+            f"/api/cashflows/{target.pk}/",
+            method="patch",
+            data=lambda attempt: {"amount": f"{100 + attempt % 1000}.00"},
+            writes=True,
+        ),
+        Scenario(
+            "ui: создание",
+            "/create/",
+            method="post",
+            data=lambda attempt: _form_row(target, attempt),
+            writes=True,
+            expected=302,
+        ),
+        Scenario(
+            "ui: изменение",
+            f"/{target.pk}/edit/",
+            method="post",
+            data=lambda attempt: _form_row(target, attempt),
+            writes=True,
+            expected=302,
+        ),
+    ]
+
+
+def run_benchmarks(
+    requests: int,
+    warmup: int = 3,
+    only: Optional[str] = None,
+    progress: Optional[Callable[[ScenarioResult], None]] = None,
+) -> dict[str, Any]:
+    """
+    Прогоняет все сценарии и возвращает машиночитаемый отчёт.
+
+    Args:
+        requests (int): запросов на сценарий.
+        warmup (int): прогревочных запросов (не учитываются).
+        only (str | None): выполнять только сценарии с этой подстрокой.
+        progress (Callable | None): вызывается после каждого сценария.
+    Returns:
+        dict: ``meta`` (когда, где, сколько строк) и ``results``.
+    """
+    started_at = timezone.now()
+    results = []
+    # тестовый клиент ходит с хостом testserver
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        for scenario in build_scenarios():
+            if only and only not in scenario.name:
+                continue
+            result = run_scenario(scenario, requests, warmup)
+            results.append(result.as_dict())
+            if progress is not None:
+                progress(result)
+    return {
+        "meta": {
+            "started_at": started_at.isoformat(),
+            "vendor": connection.vendor,
+            "rows": Cashflow.objects.count(),
+            "requests": requests,
+            "warmup": warmup,
+        },
+        "results": results,
+    }
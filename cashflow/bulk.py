@@ -0,0 +1,156 @@
+"""
+Массовые операции над записями ДДС: вставка, частичное обновление, удаление.
+
+Все операции выполняются пачками в одной транзакции; справочники
+берутся из снимка в памяти процесса.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from django.db import transaction
+
+from dds_project.metrics import IMPORT_ROWS, IMPORT_SECONDS
+from directories.cache import snapshot_for
+
+from .models import Cashflow, fill_hierarchy
+
+# Размер пачки для bulk_create / bulk_update
+BULK_BATCH_SIZE = 1000
+
+# Поля строки, которые можно менять массово: поле строки -> поле модели
+BULK_FIELDS = {
+    "created_at": "created_at",
+    "status": "status_id",
+    "subcategory": "subcategory_id",
+    "amount": "amount",
+    "comment": "comment",
+}
+
+
+def directory_ids(rows: Any = ()) -> dict[str, set[int]]:
+    """
+    Множества id справочников для проверки строк без запросов к БД.
+
+    Args:
+        rows: строки запроса; если они ссылаются на id, которых нет в
+            снимке, снимок сверяется с БД (``snapshot_for``).
+    """
+    rows = [row for row in rows if isinstance(row, dict)]
+    snapshot = snapshot_for(
+        {
+            "status": [row.get("status") for row in rows],
+            "subcategory": [row.get("subcategory") for row in rows],
+        }
+    )
+    return {
+        "status_ids": set(snapshot.statuses),
+        "subcategory_ids": set(snapshot.subcategories),
+    }
+
+
+def row_errors(errors: list[Any]) -> list[dict[str, Any]]:
+    """Ошибки сериализатора ``many=True`` в виде списка по строкам."""
+    return [
+        {"index": index, "errors": error}
+        for index, error in enumerate(errors)
+        if error
+    ]
+
+
+def create_rows(rows: list[dict[str, Any]]) -> list[int]:
+    """
+    Вставляет проверенные строки одной транзакцией.
+
+    Args:
+        rows (list[dict]): validated_data сериализатора строк.
+    Returns:
+        list[int]: id созданных записей.
+    """
+    objs = [
+        Cashflow(
+            **{
+                BULK_FIELDS[name]: value
+                for name, value in row.items()
+                if name in BULK_FIELDS
+            }
+        )
+        for row in rows
+    ]
+    started = time.perf_counter()
+    with transaction.atomic():
+        created = Cashflow.objects.bulk_create(
+            objs, batch_size=BULK_BATCH_SIZE
+        )
+    IMPORT_ROWS.inc(len(created), mode="api")
+    IMPORT_SECONDS.inc(time.perf_counter() - started, mode="api")
+    return [obj.pk for obj in created]
+
+
+def update_rows(
+    rows: list[dict[str, Any]],
+) -> tuple[int, list[dict[str, Any]]]:
+    """
+    Частично обновляет записи по id одной транзакцией.
+
+    Args:
+        rows (list[dict]): validated_data сериализатора строк (с id).
+    Returns:
+        tuple[int, list[dict]]: число обновлённых записей и ошибки по
+        строкам; при ошибках ничего не меняется.
+    """
+    fields = sorted(
+        {BULK_FIELDS[name] for row in rows for name in row if name != "id"}
+    )
+    with transaction.atomic():
+        objs = (
+            Cashflow.objects.only("id", *fields)
+            .select_for_update()
+            .in_bulk([row["id"] for row in rows])
+        )
+        errors = [
+            {"index": index, "errors": {"id": ["Запись не найдена."]}}
+            for index, row in enumerate(rows)
+            if row["id"] not in objs
+        ]
+        if errors or not fields:
+            return 0, errors
+
+        for row in rows:
+            obj = objs[row["id"]]
+            for name, value in row.items():
+                if name != "id":
+                    setattr(obj, BULK_FIELDS[name], value)
+        if "subcategory_id" in fields:
+            # тип и категория — копии из подкатегории
+            fill_hierarchy(objs.values())
+            fields += ["category_id", "type_id"]
+
+        updated = Cashflow.objects.bulk_update(
+            objs.values(), fields, batch_size=BULK_BATCH_SIZE
+        )
+    return updated, []
+
+
+def delete_ids(ids: list[int]) -> tuple[int, list[dict[str, Any]]]:
+    """
+    Удаляет записи по списку id одним DELETE.
+
+    Returns:
+        tuple[int, list[dict]]: число удалённых записей и ошибки по
+        позициям списка; при ошибках ничего не удаляется.
+    """
+    qs = Cashflow.objects.filter(pk__in=ids)
+    with transaction.atomic():
+        found = set(qs.select_for_update().values_list("id", flat=True))
+        errors = [
+            {"index": index, "errors": {"id": ["Запись не найдена."]}}
+            for index, pk in enumerate(ids)
+            if pk not in found
+        ]
+        if errors:
+            return 0, errors
+        deleted, _ = qs.delete()
+    return deleted, []
@@ -0,0 +1,96 @@
+"""
+Дешёвый подсчёт строк выборки для списков.
+
+Точный ``COUNT(*)`` по большой выборке читает все её строки. Поэтому
+точно считаем только до порога (``COUNT`` по ``LIMIT``-подзапросу), а
+дальше берём оценку планировщика PostgreSQL или кэшированный подсчёт.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Optional
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+
+from dds_project.metrics import cache_result
+
+# До скольких строк считаем точно
+EXACT_COUNT_LIMIT = 1000
+
+# Сколько секунд держать точный подсчёт в кэше (если нет оценки)
+COUNT_CACHE_TIMEOUT = 60
+
+
+@dataclass(frozen=True)
+class RowCount:
+    """Количество строк и признак, что оно точное."""
+
+    value: int
+    exact: bool
+
+
+def planner_estimate(queryset: QuerySet) -> Optional[int]:
+    """Оценка числа строк из ``EXPLAIN`` (только PostgreSQL)."""
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    sql, params = queryset.order_by().values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def cached_count(queryset: QuerySet) -> int:
+    """Точный подсчёт, закэшированный по тексту запроса."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha1(f"{sql}|{params!r}".encode()).hexdigest()
+    key = f"cashflow:count:{digest}"
+    value = cache.get(key)
+    cache_result("count", hit=value is not None)
+    if value is None:
+        value = queryset.count()
+        cache.set(key, value, COUNT_CACHE_TIMEOUT)
+    return value
+
+
+def cheap_count(
+    queryset: QuerySet, exact_limit: int = EXACT_COUNT_LIMIT
+) -> RowCount:
+    """
+    Количество строк выборки без полного ``COUNT(*)`` на больших данных.
+
+    Args:
+        queryset (QuerySet): выборка.
+        exact_limit (int): до скольких строк считать точно.
+    Returns:
+        RowCount: точное значение до порога, иначе оценка.
+    """
+    capped = queryset.order_by()[: exact_limit + 1].count()
+    if capped <= exact_limit:
+        return RowCount(capped, exact=True)
+    estimate = planner_estimate(queryset)
+    if estimate is not None:
+        return RowCount(max(estimate, capped), exact=False)
+    return RowCount(cached_count(queryset), exact=False)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор со счётчиком ``cheap_count``: точно до порога, дальше —
+    оценка. Для админки, где число строк нужно только для номеров
+    страниц.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        return cheap_count(self.object_list).value
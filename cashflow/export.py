@@ -0,0 +1,200 @@
+"""
+Потоковая выгрузка записей ДДС в CSV, JSON Lines и XLSX.
+
+Строки читаются серверным курсором (``iterator(chunk_size=...)``) и сразу
+отдаются клиенту, поэтому память не растёт с размером выгрузки — в том
+числе XLSX, архив которого пишется потоком (``cashflow.xlsx``).
+
+Текст из записей (комментарии, названия справочников) вводят
+пользователи: в CSV значения, которые табличный редактор принял бы за
+формулу (``=``, ``+``, ``-``, ``@`` в начале), экранируются апострофом.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import time
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from dds_project.metrics import EXPORT_ROWS, EXPORT_SECONDS
+
+from .models import Cashflow
+from .xlsx import stream_xlsx
+
+# Сколько строк читать из БД за раз
+EXPORT_CHUNK_SIZE = 2000
+
+# Сколько строк склеивать в один кусок ответа
+EXPORT_FLUSH_ROWS = 500
+
+# Колонки выгрузки: ключ, заголовок, путь поля
+EXPORT_COLUMNS = (
+    ("id", "ID", "id"),
+    ("created_at", "Дата/время", "created_at"),
+    ("type", "Тип", "type__name"),
+    ("category", "Категория", "category__name"),
+    ("subcategory", "Подкатегория", "subcategory__name"),
+    ("status", "Статус", "status__name"),
+    ("amount", "Сумма", "amount"),
+    ("comment", "Комментарий", "comment"),
+)
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "jsonl": ("application/x-ndjson; charset=utf-8", "jsonl"),
+    "xlsx": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "xlsx",
+    ),
+}
+
+
+# С чего начинаются значения, которые табличный редактор вычислит как
+# формулу
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class ExportFormatError(ValueError):
+    """Неизвестный формат выгрузки."""
+
+
+def export_rows(queryset: QuerySet[Cashflow]) -> Iterator[tuple]:
+    """
+    Строки выгрузки в порядке выборки, без создания объектов моделей.
+
+    Args:
+        queryset (QuerySet[Cashflow]): отфильтрованные записи.
+    Returns:
+        Iterator[tuple]: кортежи значений в порядке ``EXPORT_COLUMNS``.
+    """
+    paths = [path for _, _, path in EXPORT_COLUMNS]
+    return queryset.values_list(*paths).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _metered(rows: Iterable[tuple], file_format: str) -> Iterator[tuple]:
+    """Считает выгруженные строки и время выгрузки для метрик."""
+    started = time.perf_counter()
+    count = 0
+    try:
+        for row in rows:
+            count += 1
+            yield row
+    finally:
+        EXPORT_ROWS.inc(count, format=file_format)
+        EXPORT_SECONDS.inc(time.perf_counter() - started, format=file_format)
+
+
+def _local(value: datetime) -> datetime:
+    return timezone.localtime(value) if timezone.is_aware(value) else value
+
+
+def _batched(lines: Iterable[str]) -> Iterator[str]:
+    batch: list[str] = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= EXPORT_FLUSH_ROWS:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def spreadsheet_safe(value):
+    """
+    Текст, который табличный редактор не вычислит как формулу.
+
+    Строки, начинающиеся с ``FORMULA_PREFIXES``, получают апостроф в
+    начале; остальные значения (в т.ч. отрицательные суммы) — как есть.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_lines(rows: Iterable[tuple]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    # BOM — чтобы Excel открыл UTF-8 без мастера импорта
+    yield "\ufeff" + writer.writerow([title for _, title, _ in EXPORT_COLUMNS])
+    for row in rows:
+        values = [spreadsheet_safe(value) for value in row]
+        values[1] = _local(values[1]).strftime("%Y-%m-%d %H:%M:%S")
+        yield writer.writerow(values)
+
+
+def _jsonl_lines(rows: Iterable[tuple]) -> Iterator[str]:
+    keys = [key for key, _, _ in EXPORT_COLUMNS]
+    for row in rows:
+        values = list(row)
+        values[1] = _local(values[1])
+        yield (
+            json.dumps(
+                dict(zip(keys, values)),
+                cls=DjangoJSONEncoder,
+                ensure_ascii=False,
+            )
+            + "\n"
+        )
+
+
+def _xlsx_chunks(rows: Iterable[tuple]) -> Iterator[bytes]:
+    def local_rows() -> Iterator[list]:
+        for row in rows:
+            values = list(row)
+            values[1] = _local(values[1]).replace(tzinfo=None)
+            yield values
+
+    return stream_xlsx(
+        [title for _, title, _ in EXPORT_COLUMNS], local_rows(), "ДДС"
+    )
+
+
+def export_filename(file_format: str) -> str:
+    """Имя файла выгрузки с текущей датой."""
+    return f"cashflows-{timezone.localdate():%Y%m%d}.{file_format}"
+
+
+def export_response(
+    queryset: QuerySet[Cashflow], file_format: str
+) -> StreamingHttpResponse:
+    """
+    Ответ с выгрузкой выборки в заданном формате.
+
+    Args:
+        queryset (QuerySet[Cashflow]): отфильтрованные записи.
+        file_format (str): csv, jsonl или xlsx.
+    Returns:
+        StreamingHttpResponse: потоковый ответ-вложение.
+    Raises:
+        ExportFormatError: неизвестный формат.
+    """
+    if file_format not in EXPORT_FORMATS:
+        allowed = ", ".join(EXPORT_FORMATS)
+        raise ExportFormatError(
+            f"Неизвестный формат «{file_format}». Допустимо: {allowed}."
+        )
+    content_type, extension = EXPORT_FORMATS[file_format]
+    filename = export_filename(extension)
+    rows = _metered(export_rows(queryset), file_format)
+
+    if file_format == "xlsx":
+        chunks = _xlsx_chunks(rows)
+    else:
+        lines = _csv_lines if file_format == "csv" else _jsonl_lines
+        chunks = _batched(lines(rows))
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
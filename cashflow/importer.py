@@ -0,0 +1,424 @@
+"""
+Потоковый импорт записей ДДС (банковские выписки) из CSV и JSON Lines.
+
+Справочники загружаются в память один раз; строки читаются по одной,
+проверяются и пишутся пачками через ``bulk_create`` или ``COPY``. Номер
+последней записанной строки сохраняется в той же транзакции, что и
+пачка (``CashflowImportProgress``), поэтому возобновление после сбоя не
+пишет пачку повторно.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Iterable, Iterator, Optional, TextIO
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from dds_project.metrics import IMPORT_ROWS, IMPORT_SECONDS
+from directories.models import Status, Subcategory
+
+from .models import Cashflow, CashflowImportProgress, fill_hierarchy
+from .rollup import refresh_buckets
+
+# Заголовки колонок (в т.ч. из нашей же выгрузки) -> ключи строки
+COLUMN_ALIASES = {
+    "id": "id",
+    "created_at": "created_at",
+    "date": "created_at",
+    "дата": "created_at",
+    "дата/время": "created_at",
+    "status": "status",
+    "статус": "status",
+    "type": "type",
+    "тип": "type",
+    "category": "category",
+    "категория": "category",
+    "subcategory": "subcategory",
+    "подкатегория": "subcategory",
+    "subcategory_id": "subcategory_id",
+    "amount": "amount",
+    "сумма": "amount",
+    "comment": "comment",
+    "комментарий": "comment",
+}
+
+# Максимальная сумма, влезающая в DecimalField(max_digits=12, 2)
+MAX_AMOUNT = Decimal("9999999999.99")
+
+
+class RowError(ValueError):
+    """Строку нельзя импортировать."""
+
+
+def _key(value: Any) -> str:
+    return str(value or "").strip().lower()
+
+
+class DirectoryResolver:
+    """Разрешает коды и названия справочников в id без запросов к БД."""
+
+    def __init__(self) -> None:
+        self.statuses: dict[str, int] = {}
+        for status in Status.objects.all():
+            for alias in (status.code, status.name, status.pk):
+                self.statuses[_key(alias)] = status.pk
+
+        self.subcategory_ids: set[int] = set()
+        self.by_path: dict[tuple[str, str, str], int] = {}
+        by_pair: dict[tuple[str, str], set[int]] = {}
+        subcategories = Subcategory.objects.select_related(
+            "category", "category__type"
+        )
+        for sub in subcategories:
+            category = sub.category
+            self.subcategory_ids.add(sub.pk)
+            path = (
+                _key(category.type.name),
+                _key(category.name),
+                _key(sub.name),
+            )
+            self.by_path[path] = sub.pk
+            by_pair.setdefault(
+                (_key(category.name), _key(sub.name)), set()
+            ).add(sub.pk)
+        # без типа разрешаем только однозначные пары категория/подкатегория
+        self.by_pair = {
+            pair: next(iter(ids))
+            for pair, ids in by_pair.items()
+            if len(ids) == 1
+        }
+
+    def status_id(self, value: Any) -> int:
+        try:
+            return self.statuses[_key(value)]
+        except KeyError:
+            raise RowError(f"неизвестный статус «{value}»") from None
+
+    def subcategory_id(self, row: dict[str, Any]) -> int:
+        if row.get("subcategory_id") not in (None, ""):
+            try:
+                pk = int(row["subcategory_id"])
+            except (TypeError, ValueError):
+                pk = None
+            if pk not in self.subcategory_ids:
+                raise RowError(
+                    f"неизвестная подкатегория id={row['subcategory_id']}"
+                )
+            return pk
+
+        category = _key(row.get("category"))
+        sub = _key(row.get("subcategory"))
+        if not category or not sub:
+            raise RowError("не указаны категория и подкатегория")
+        if row.get("type"):
+            pk = self.by_path.get((_key(row["type"]), category, sub))
+        else:
+            pk = self.by_pair.get((category, sub))
+        if pk is None:
+            raise RowError(
+                "неизвестная подкатегория «{}»".format(
+                    " / ".join(
+                        str(row.get(name) or "—")
+                        for name in ("type", "category", "subcategory")
+                    )
+                )
+            )
+        return pk
+
+
+def parse_created_at(value: Any) -> datetime:
+    """Дата операции: ISO datetime или дата; наивные — в текущем поясе."""
+    text = str(value or "").strip()
+    if not text:
+        raise RowError("не указана дата")
+    try:
+        parsed = parse_datetime(text)
+        if parsed is None:
+            day = parse_date(text)
+            if day is not None:
+                parsed = datetime.combine(day, datetime.min.time())
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise RowError(f"некорректная дата «{text}»")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_amount(value: Any) -> Decimal:
+    """Сумма: допускает пробелы-разделители и десятичную запятую."""
+    text = str(value if value is not None else "").strip()
+    text = (
+        text.replace(" ", "")
+        .replace("\xa0", "")
+        .replace("\u202f", "")
+        .replace(",", ".")
+    )
+    try:
+        amount = Decimal(text).quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError):
+        raise RowError(f"некорректная сумма «{value}»") from None
+    if not amount.is_finite() or abs(amount) > MAX_AMOUNT:
+        raise RowError(f"некорректная сумма «{value}»")
+    return amount
+
+
+def read_rows(stream: TextIO, file_format: str) -> Iterator[dict[str, Any]]:
+    """
+    Читает строки файла по одной.
+
+    Args:
+        stream (TextIO): открытый файл.
+        file_format (str): ``csv`` или ``jsonl``.
+    Returns:
+        Iterator[dict]: строки с ключами из ``COLUMN_ALIASES``
+        (или ``{"__error__": ...}`` для нечитаемых строк JSON Lines).
+    """
+    if file_format == "csv":
+        dialect: Any = csv.excel
+        if stream.seekable():
+            sample = stream.read(4096)
+            stream.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+            except csv.Error:
+                pass
+        for raw in csv.DictReader(stream, dialect=dialect):
+            yield {
+                COLUMN_ALIASES.get(_key(name), _key(name)): value
+                for name, value in raw.items()
+                if name is not None
+            }
+        return
+
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            raw = json.loads(line)
+        except ValueError as exc:
+            yield {"__error__": f"некорректный JSON: {exc}"}
+            continue
+        if not isinstance(raw, dict):
+            yield {"__error__": "строка JSON должна быть объектом"}
+            continue
+        yield {
+            COLUMN_ALIASES.get(_key(name), _key(name)): value
+            for name, value in raw.items()
+        }
+
+
+def build_cashflow(
+    row: dict[str, Any], resolver: DirectoryResolver
+) -> Cashflow:
+    """
+    Превращает строку файла в несохранённую запись ДДС.
+
+    Raises:
+        RowError: строку нельзя импортировать.
+    """
+    if "__error__" in row:
+        raise RowError(row["__error__"])
+    return Cashflow(
+        created_at=parse_created_at(row.get("created_at")),
+        status_id=resolver.status_id(row.get("status")),
+        subcategory_id=resolver.subcategory_id(row),
+        amount=parse_amount(row.get("amount")),
+        comment=str(row.get("comment") or "").strip(),
+    )
+
+
+def _copy_value(value: Any) -> str:
+    text = value.isoformat() if isinstance(value, datetime) else str(value)
+    return (
+        text.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+# Колонки таблицы, которые пишет COPY
+COPY_FIELDS = (
+    "created_at",
+    "status_id",
+    "subcategory_id",
+    "category_id",
+    "type_id",
+    "amount",
+    "comment",
+)
+
+
+def copy_cashflows(objs: list[Cashflow]) -> None:
+    """
+    Пишет записи командой PostgreSQL ``COPY ... FROM STDIN``.
+
+    ``COPY`` обходит ORM, поэтому корзины агрегата пересчитываем сами.
+    """
+    fill_hierarchy(objs)
+    buffer = io.StringIO()
+    for obj in objs:
+        buffer.write(
+            "\t".join(_copy_value(getattr(obj, name)) for name in COPY_FIELDS)
+        )
+        buffer.write("\n")
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(Cashflow._meta.db_table)
+    columns = ", ".join(connection.ops.quote_name(f) for f in COPY_FIELDS)
+    sql = f"COPY {table} ({columns}) FROM STDIN"
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, "copy_expert"):
+            # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    refresh_buckets(obj.rollup_key for obj in objs)
+
+
+@dataclass
+class ImportStats:
+    """Счётчики импорта."""
+
+    read: int = 0
+    inserted: int = 0
+    rejected: int = 0
+    skipped: int = 0
+
+
+def write_batch(
+    objs: list[Cashflow],
+    use_copy: bool,
+    state_key: Optional[str] = None,
+    line: int = 0,
+    stats: Optional[ImportStats] = None,
+) -> None:
+    """
+    Пишет пачку записей одной транзакцией.
+
+    Args:
+        objs (list[Cashflow]): записи пачки (может быть пустой, если все
+            строки отклонены, — тогда сохраняется только прогресс).
+        use_copy (bool): писать командой ``COPY``.
+        state_key (str | None): источник для возобновления; в той же
+            транзакции сохраняется ``line`` и счётчики ``stats``.
+        line (int): номер последней строки пачки.
+        stats (ImportStats | None): счётчики с учётом этой пачки.
+    """
+    started = time.perf_counter()
+    with transaction.atomic():
+        if objs and use_copy:
+            copy_cashflows(objs)
+        elif objs:
+            Cashflow.objects.bulk_create(objs)
+        if state_key is not None:
+            save_progress(state_key, line, stats or ImportStats())
+    mode = "copy" if use_copy else "bulk_create"
+    IMPORT_ROWS.inc(len(objs), mode=mode)
+    IMPORT_SECONDS.inc(time.perf_counter() - started, mode=mode)
+
+
+def iter_batches(
+    rows: Iterable[dict[str, Any]],
+    resolver: DirectoryResolver,
+    stats: ImportStats,
+    batch_size: int,
+    start_after: int = 0,
+    on_reject: Optional[Callable[[int, str, dict], None]] = None,
+) -> Iterator[tuple[int, list[Cashflow]]]:
+    """
+    Группирует проверенные строки в пачки.
+
+    Args:
+        rows (Iterable[dict]): строки файла.
+        resolver (DirectoryResolver): справочники.
+        stats (ImportStats): счётчики, заполняются по ходу.
+        batch_size (int): размер пачки.
+        start_after (int): номер строки, после которой продолжаем
+            (возобновление после сбоя).
+        on_reject (Callable | None): вызывается для отклонённой строки
+            с её номером, причиной и данными.
+    Returns:
+        Iterator[tuple[int, list[Cashflow]]]: номер последней строки
+        пачки и сама пачка.
+    """
+    batch: list[Cashflow] = []
+    number = 0
+    for number, row in enumerate(rows, start=1):
+        stats.read += 1
+        if number <= start_after:
+            stats.skipped += 1
+            continue
+        try:
+            batch.append(build_cashflow(row, resolver))
+        except RowError as exc:
+            stats.rejected += 1
+            if on_reject is not None:
+                on_reject(number, str(exc), row)
+        if len(batch) >= batch_size:
+            yield number, batch
+            batch = []
+    if batch or number > start_after:
+        yield number, batch
+
+
+def read_progress(key: str) -> int:
+    """Номер последней записанной строки источника (0 — с начала)."""
+    line = (
+        CashflowImportProgress.objects.filter(key=key)
+        .values_list("line", flat=True)
+        .first()
+    )
+    return line or 0
+
+
+def save_progress(key: str, line: int, stats: ImportStats) -> None:
+    """Сохраняет номер последней записанной строки источника."""
+    CashflowImportProgress.objects.update_or_create(
+        key=key,
+        defaults={
+            "line": line,
+            "inserted": stats.inserted,
+            "rejected": stats.rejected,
+        },
+    )
+
+
+def clear_progress(key: str) -> None:
+    """Забывает прогресс источника (файл дочитан до конца)."""
+    CashflowImportProgress.objects.filter(key=key).delete()
+
+
+def trim_rejects(path: str, last_line: int) -> None:
+    """
+    Оставляет в CSV отклонённых строк только строки до ``last_line``.
+
+    Отказы пишутся по мере чтения, а пачка после сбоя читается заново:
+    без обрезки её отказы попали бы в файл дважды.
+    """
+    try:
+        with open(path, encoding="utf-8", newline="") as fh:
+            rows = list(csv.reader(fh))
+    except OSError:
+        return
+    header, body = rows[:1], rows[1:]
+    kept = [
+        row for row in body if row and row[0].isdigit()
+        and int(row[0]) <= last_line
+    ]
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        csv.writer(fh).writerows(header + kept)
@@ -0,0 +1,258 @@
+"""
+Keyset-пагинация (курсор по значениям полей сортировки).
+
+Курсор хранит значения полей сортировки последней строки страницы, поэтому
+следующая страница выбирается условием по индексу, а не через OFFSET:
+стоимость глубокой страницы такая же, как первой.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime, time
+from typing import Any, Sequence
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Model, Q, QuerySet
+from django.utils import timezone
+
+from dds_project.metrics import PAGINATION_CURSOR_AGE, PAGINATION_PAGES
+
+
+class InvalidCursor(ValueError):
+    """Курсор не удалось разобрать."""
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """Позиция в выборке: значения полей сортировки и направление."""
+
+    values: tuple
+    reverse: bool = False
+
+
+@dataclass
+class KeysetPage:
+    """Страница keyset-пагинации."""
+
+    object_list: list
+    next_cursor: str | None
+    previous_cursor: str | None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+
+def get_ordering(queryset: QuerySet) -> tuple[str, ...]:
+    """
+    Возвращает сортировку выборки, дополненную уникальным ``id``.
+
+    Берём сортировку, уже применённую к queryset (в т.ч. фильтром
+    ``ordering``), иначе — сортировку модели по умолчанию.
+    """
+    ordering = [
+        field
+        for field in (
+            queryset.query.order_by or queryset.model._meta.ordering or ()
+        )
+        if isinstance(field, str) and field != "?"
+    ]
+    ordering = [
+        "-id" if f == "-pk" else "id" if f == "pk" else f for f in ordering
+    ]
+    if not any(f.lstrip("-") == "id" for f in ordering):
+        desc = bool(ordering) and ordering[-1].startswith("-")
+        ordering.append("-id" if desc else "id")
+    return tuple(ordering)
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """
+    JSON курсора: время — с микросекундами.
+
+    ``DjangoJSONEncoder`` обрезает время до миллисекунд, и строки с тем
+    же значением в пределах миллисекунды пропускались бы (или
+    повторялись) на границе страниц.
+    """
+
+    def default(self, o: Any) -> Any:
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """Кодирует курсор в строку для query-параметра."""
+    payload = {"v": list(cursor.values)}
+    if cursor.reverse:
+        payload["r"] = 1
+    raw = json.dumps(payload, cls=CursorJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    encoded: str, model: type[Model], ordering: Sequence[str]
+) -> Cursor:
+    """
+    Разбирает курсор и приводит значения к типам полей модели.
+
+    Raises:
+        InvalidCursor: курсор повреждён или не подходит к сортировке.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+        payload = json.loads(raw)
+        values = payload["v"]
+        reverse = bool(payload.get("r"))
+    except (ValueError, TypeError, KeyError) as exc:
+        raise InvalidCursor(str(exc)) from exc
+
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor("cursor does not match ordering")
+
+    converted = []
+    for name, value in zip(ordering, values):
+        try:
+            field = model._meta.get_field(name.lstrip("-"))
+        except FieldDoesNotExist:
+            # аннотация — значение уже в JSON-типе
+            converted.append(value)
+            continue
+        try:
+            converted.append(field.to_python(value))
+        except ValidationError as exc:
+            raise InvalidCursor(str(exc)) from exc
+    return Cursor(values=tuple(converted), reverse=reverse)
+
+
+def _row_value(row: Any, name: str) -> Any:
+    if isinstance(row, dict):
+        return row[name]
+    return getattr(row, name)
+
+
+def _invert(ordering: Sequence[str]) -> tuple[str, ...]:
+    return tuple(f[1:] if f.startswith("-") else f"-{f}" for f in ordering)
+
+
+def keyset_filter(
+    ordering: Sequence[str], values: Sequence[Any], reverse: bool = False
+) -> Q:
+    """
+    Условие «строго после позиции» для составного ключа сортировки.
+
+    Для ``(-created_at, -id)`` получается ``created_at <= v1 AND
+    (created_at < v1 OR (created_at = v1 AND id < v2))``.
+    Нестрогое условие по первому полю дублируется, чтобы планировщик
+    использовал диапазонное сканирование индекса.
+    """
+    condition: Q | None = None
+    lookups = []
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        desc = field.startswith("-") != reverse
+        lookups.append((name, value, "lt" if desc else "gt"))
+
+    for name, value, op in reversed(lookups):
+        strict = Q(**{f"{name}__{op}": value})
+        if condition is None:
+            condition = strict
+        else:
+            condition = strict | (Q(**{name: value}) & condition)
+
+    name, value, op = lookups[0]
+    return Q(**{f"{name}__{op}e": value}) & condition
+
+
+def _observe_page(ordering: Sequence[str], position: Cursor | None) -> None:
+    """Метрики пагинации: направление и глубина (возраст курсора)."""
+    if position is None:
+        PAGINATION_PAGES.inc(direction="first")
+        return
+    PAGINATION_PAGES.inc(direction="previous" if position.reverse else "next")
+    value = position.values[0]
+    if ordering[0].lstrip("-") == "created_at" and isinstance(
+        value, datetime
+    ):
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        age = (timezone.now() - value).total_seconds() / 86400
+        PAGINATION_CURSOR_AGE.observe(max(age, 0.0))
+
+
+class KeysetPaginator:
+    """Пагинатор по курсору поверх произвольной выборки."""
+
+    def __init__(self, queryset: QuerySet, page_size: int) -> None:
+        self.ordering = get_ordering(queryset)
+        self.queryset = queryset.order_by(*self.ordering)
+        self.page_size = page_size
+
+    def _prepare(self, cursor: str | None) -> tuple[QuerySet, Cursor | None]:
+        position = (
+            decode_cursor(cursor, self.queryset.model, self.ordering)
+            if cursor
+            else None
+        )
+        _observe_page(self.ordering, position)
+        qs = self.queryset
+        if position is not None:
+            if position.reverse:
+                qs = qs.order_by(*_invert(self.ordering))
+            qs = qs.filter(
+                keyset_filter(self.ordering, position.values, position.reverse)
+            )
+        return qs[: self.page_size + 1], position
+
+    def _build(self, rows: list, position: Cursor | None) -> KeysetPage:
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        reverse = position is not None and position.reverse
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        def cursor_for(row: Any, backwards: bool) -> str:
+            values = tuple(
+                _row_value(row, f.lstrip("-")) for f in self.ordering
+            )
+            return encode_cursor(Cursor(values=values, reverse=backwards))
+
+        return KeysetPage(
+            object_list=rows,
+            next_cursor=cursor_for(rows[-1], False)
+            if rows and has_next
+            else None,
+            previous_cursor=cursor_for(rows[0], True)
+            if rows and has_previous
+            else None,
+        )
+
+    def page(self, cursor: str | None = None) -> KeysetPage:
+        """
+        Возвращает страницу после (или до) позиции курсора.
+
+        Args:
+            cursor (str | None): закодированный курсор или None для начала.
+        Returns:
+            KeysetPage: строки страницы и курсоры соседних страниц.
+        Raises:
+            InvalidCursor: курсор повреждён.
+        """
+        qs, position = self._prepare(cursor)
+        return self._build(list(qs), position)
+
+    async def apage(self, cursor: str | None = None) -> KeysetPage:
+        """Асинхронный ``page``: строки читаются через async ORM."""
+        qs, position = self._prepare(cursor)
+        return self._build([row async for row in qs], position)
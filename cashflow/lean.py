@@ -0,0 +1,182 @@
+"""
+Быстрое чтение записей ДДС для API без сериализатора DRF.
+
+Строки выбираются через ``.values()`` вместе с названиями категории и
+типа (JOIN по копиям в записи) и превращаются в словари того же вида,
+что отдаёт ``CashflowSerializer``. Объекты моделей и поля DRF не
+создаются — на списках это основная доля CPU.
+
+Клиент может сузить ответ (``fields``) и развернуть статус и
+подкатегорию в объекты (``expand``): в SQL попадают только нужные
+колонки, а JOIN — только для запрошенных вложенных объектов.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from .keyset import get_ordering
+from .models import Cashflow
+
+_CENT = Decimal("0.01")
+
+
+def format_datetime(value: Optional[datetime]) -> Optional[str]:
+    """Дата/время как у ``serializers.DateTimeField`` (ISO 8601)."""
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    text = value.isoformat()
+    if text.endswith("+00:00"):
+        text = text[:-6] + "Z"
+    return text
+
+
+def format_amount(value: Optional[Decimal]) -> Optional[str]:
+    """Сумма строкой с двумя знаками, как у ``DecimalField`` DRF."""
+    if value is None:
+        return None
+    return format(value.quantize(_CENT), "f")
+
+
+def _ref(pk: Optional[int], name: Optional[str]) -> Optional[dict]:
+    return {"id": pk, "name": name} if pk is not None else None
+
+
+# Поле ответа -> (колонки выборки, функция значения по строке)
+LEAN_FIELDS: dict[str, tuple[tuple[str, ...], Callable]] = {
+    "id": (("id",), lambda row: row["id"]),
+    "created_at": (
+        ("created_at",),
+        lambda row: format_datetime(row["created_at"]),
+    ),
+    "status": (("status_id",), lambda row: row["status_id"]),
+    "subcategory": (("subcategory_id",), lambda row: row["subcategory_id"]),
+    "amount": (("amount",), lambda row: format_amount(row["amount"])),
+    "comment": (("comment",), lambda row: row["comment"]),
+    "category": (
+        ("category_id", "category__name"),
+        lambda row: _ref(row["category_id"], row["category__name"]),
+    ),
+    "type": (
+        ("type_id", "type__name"),
+        lambda row: _ref(row["type_id"], row["type__name"]),
+    ),
+}
+
+# Поля, которые ``expand`` превращает из id в объект {id, name}
+LEAN_EXPANSIONS: dict[str, tuple[tuple[str, ...], Callable]] = {
+    "status": (
+        ("status_id", "status__name"),
+        lambda row: _ref(row["status_id"], row["status__name"]),
+    ),
+    "subcategory": (
+        ("subcategory_id", "subcategory__name"),
+        lambda row: _ref(row["subcategory_id"], row["subcategory__name"]),
+    ),
+}
+
+
+def parse_names(raw: Optional[str], allowed: Iterable[str]) -> list[str]:
+    """
+    Разбирает список имён через запятую (``fields``, ``expand``).
+
+    Raises:
+        ValueError: неизвестное имя.
+    """
+    allowed = list(allowed)
+    names: list[str] = []
+    for name in (raw or "").split(","):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in allowed:
+            raise ValueError(
+                f"Неизвестное значение «{name}». "
+                f"Допустимо: {', '.join(allowed)}."
+            )
+        names.append(name)
+    return names
+
+
+class LeanShape:
+    """
+    Состав ответа: какие поля отдавать и какие развернуть в объекты.
+
+    Без ``fields`` отдаются все поля ``LEAN_FIELDS``.
+    """
+
+    def __init__(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        expand: Sequence[str] = (),
+    ) -> None:
+        self.fields = tuple(fields or LEAN_FIELDS)
+        self.getters = {
+            name: (
+                LEAN_EXPANSIONS[name]
+                if name in expand and name in LEAN_EXPANSIONS
+                else LEAN_FIELDS[name]
+            )
+            for name in self.fields
+        }
+
+    def columns(self, extra: Iterable[str] = ()) -> list[str]:
+        """Колонки выборки (плюс ``extra``, например поля сортировки)."""
+        columns = dict.fromkeys(
+            column
+            for name in self.fields
+            for column in self.getters[name][0]
+        )
+        columns.update(dict.fromkeys(extra))
+        return list(columns)
+
+    def queryset(self, queryset: QuerySet[Cashflow]) -> QuerySet:
+        """
+        Выборка словарей только с нужными колонками.
+
+        Поля сортировки добавляются всегда — по ним строится курсор.
+        """
+        ordering = [name.lstrip("-") for name in get_ordering(queryset)]
+        return queryset.values(*self.columns(ordering))
+
+    def row(self, row: dict[str, Any]) -> dict[str, Any]:
+        """Строка выборки в формате ответа."""
+        return {name: get(row) for name, (_, get) in self.getters.items()}
+
+    def rows(self, rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Строки выборки в формате ответа."""
+        return [self.row(row) for row in rows]
+
+
+# Полный ответ, как у ``CashflowSerializer``
+DEFAULT_SHAPE = LeanShape()
+
+
+def lean_queryset(queryset: QuerySet[Cashflow]) -> QuerySet:
+    """Выборка словарей для полного ответа."""
+    return DEFAULT_SHAPE.queryset(queryset)
+
+
+def lean_row(row: dict[str, Any]) -> dict[str, Any]:
+    """
+    Строка ``lean_queryset`` в формате ``CashflowSerializer``.
+
+    Args:
+        row (dict): словарь из ``lean_queryset``.
+    Returns:
+        dict: id, created_at, status, subcategory, amount, comment,
+        category и type.
+    """
+    return DEFAULT_SHAPE.row(row)
+
+
+def lean_rows(rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Список строк ``lean_queryset`` в формате ``CashflowSerializer``."""
+    return DEFAULT_SHAPE.rows(rows)
@@ -0,0 +1,127 @@
+"""
+Замер горячих путей API и интерфейса с машиночитаемым отчётом.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from cashflow.benchmarks import ScenarioResult, run_benchmarks
+from cashflow.models import Cashflow
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет задержку (p50/p95/p99), пропускную способность и число "
+        "SQL-запросов списка API с фильтрами, итогов, страниц интерфейса, "
+        "HTMX-каскадов, создания и изменения записей. Пишет JSON для "
+        "сравнения прогонов."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--seed-rows",
+            type=int,
+            default=0,
+            help="Сначала создать столько синтетических записей "
+            "(seed_cashflows); по умолчанию не создавать.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=50,
+            help="Запросов на сценарий (по умолчанию 50).",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=3,
+            help="Прогревочных запросов, не учитываются (по умолчанию 3).",
+        )
+        parser.add_argument(
+            "--only",
+            help="Только сценарии, в названии которых есть эта подстрока.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Файл для JSON-отчёта.",
+        )
+        parser.add_argument(
+            "--compare",
+            help="JSON-отчёт прошлого прогона: показать изменение p50/p95.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if options["requests"] < 1:
+            raise CommandError("--requests должен быть > 0.")
+        previous = self._load(options["compare"]) if options["compare"] else {}
+
+        if options["seed_rows"]:
+            call_command(
+                "seed_cashflows",
+                rows=options["seed_rows"],
+                stdout=self.stdout,
+            )
+        if not Cashflow.objects.exists():
+            raise CommandError(
+                "Нет записей ДДС: укажите --seed-rows или запустите "
+                "seed_cashflows."
+            )
+
+        self.stdout.write(
+            f"{'сценарий':<42} {'p50':>8} {'p95':>8} {'p99':>8} "
+            f"{'зап/с':>8} {'SQL':>5}"
+        )
+        report = run_benchmarks(
+            options["requests"],
+            warmup=options["warmup"],
+            only=options["only"],
+            progress=lambda result: self._row(result, previous),
+        )
+
+        if options["output"]:
+            Path(options["output"]).write_text(
+                json.dumps(report, ensure_ascii=False, indent=2),
+                encoding="utf-8",
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f"Отчёт записан в {options['output']}")
+            )
+
+    def _row(
+        self, result: ScenarioResult, previous: dict[str, dict[str, Any]]
+    ) -> None:
+        line = (
+            f"{result.name:<42} {result.p50:8.1f} {result.p95:8.1f} "
+            f"{result.p99:8.1f} {result.rps:8.1f} {result.queries:5.1f}"
+        )
+        before = previous.get(result.name)
+        if before:
+            line += (
+                f"  p50 {_delta(before['p50'], result.p50)}"
+                f"  p95 {_delta(before['p95'], result.p95)}"
+            )
+        if result.errors:
+            line += f"  ошибок: {result.errors} {result.statuses}"
+            self.stdout.write(self.style.WARNING(line))
+        else:
+            self.stdout.write(line)
+
+    @staticmethod
+    def _load(path: str) -> dict[str, dict[str, Any]]:
+        try:
+            report = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Не удалось прочитать {path}: {exc}")
+        return {row["name"]: row for row in report.get("results", [])}
+
+
+def _delta(before: float, after: float) -> str:
+    if not before:
+        return "—"
+    return f"{(after - before) / before * 100:+.0f}%"
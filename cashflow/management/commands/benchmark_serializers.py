@@ -0,0 +1,90 @@
+"""
+Сравнение скорости чтения списка: CashflowSerializer против lean-пути.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Callable
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer, orjson
+from cashflow.lean import lean_queryset, lean_rows
+from cashflow.serializers import CashflowSerializer
+from cashflow.views import CashflowViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет выборку и сериализацию страницы записей ДДС: "
+        "CashflowSerializer и .values() без DRF, JSON и orjson."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=1000,
+            help="Строк в выборке (по умолчанию 1000).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Повторов каждого замера; берётся лучший (по умолчанию 5).",
+        )
+
+    def handle(self, *args, **options) -> None:
+        rows, repeat = options["rows"], options["repeat"]
+        base = CashflowViewSet.queryset
+        if not base.exists():
+            raise CommandError("Нет записей ДДС: manage.py seed_cashflows.")
+
+        def serializer() -> list:
+            return CashflowSerializer(base[:rows], many=True).data
+
+        def lean() -> list:
+            return lean_rows(lean_queryset(base)[:rows])
+
+        # сначала убеждаемся, что ответы совпадают
+        expected = json.loads(JSONRenderer().render(serializer()))
+        if json.loads(JSONRenderer().render(lean())) != expected:
+            raise CommandError("lean-путь отдаёт не то же, что сериализатор.")
+
+        results = {
+            "CashflowSerializer": self._best(serializer, repeat),
+            "lean (.values())": self._best(lean, repeat),
+        }
+        data = lean()
+        results["JSONRenderer"] = self._best(
+            lambda: JSONRenderer().render(data), repeat
+        )
+        if orjson is not None:
+            results["ORJSONRenderer"] = self._best(
+                lambda: ORJSONRenderer().render(data), repeat
+            )
+        else:
+            self.stdout.write("orjson не установлен — замер пропущен.")
+
+        self.stdout.write(f"{len(data)} строк, лучший из {repeat}:")
+        for name, seconds in results.items():
+            self.stdout.write(
+                f"  {name:<20} {seconds * 1000:8.1f} мс  "
+                f"{len(data) / seconds:10.0f} строк/с"
+            )
+        speedup = results["CashflowSerializer"] / results["lean (.values())"]
+        self.stdout.write(
+            self.style.SUCCESS(f"lean быстрее сериализатора в {speedup:.1f}×")
+        )
+
+    @staticmethod
+    def _best(func: Callable, repeat: int) -> float:
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        return best
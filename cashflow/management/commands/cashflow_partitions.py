@@ -0,0 +1,87 @@
+"""
+Секции записей ДДС: преобразование таблицы и создание будущих месяцев.
+"""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from cashflow.models import Cashflow
+from cashflow.partitioning import (
+    convert_to_partitioned,
+    convert_to_plain,
+    ensure_partitions,
+    is_partitioned,
+    partition_rows,
+    partitioning_supported,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Без действия (ensure) создаёт секции записей ДДС на текущий и "
+        "следующие месяцы и переносит записи из секции по умолчанию в "
+        "секции их месяцев; запускайте по расписанию (например, раз в "
+        "сутки). convert секционирует таблицу, revert возвращает обычную "
+        "(обе переписывают таблицу под блокировкой)."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "action",
+            nargs="?",
+            choices=("ensure", "convert", "revert"),
+            default="ensure",
+            help="Что сделать (по умолчанию ensure).",
+        )
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=None,
+            help="На сколько месяцев вперёд создавать секции "
+            "(по умолчанию CASHFLOW_PARTITION_MONTHS_AHEAD).",
+        )
+        parser.add_argument(
+            "--list",
+            action="store_true",
+            help="Показать секции и оценку числа строк в них.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if not partitioning_supported(connection):
+            raise CommandError(
+                "Секционирование поддерживает только PostgreSQL."
+            )
+        table = Cashflow._meta.db_table
+
+        if options["action"] == "revert":
+            with connection.schema_editor() as editor:
+                reverted = convert_to_plain(editor, Cashflow)
+            self.stdout.write(
+                f"Таблица {table} больше не секционирована."
+                if reverted
+                else f"Таблица {table} не была секционирована."
+            )
+            return
+
+        with connection.schema_editor() as editor:
+            if options["action"] == "convert" and convert_to_partitioned(
+                editor, Cashflow
+            ):
+                self.stdout.write(f"Таблица {table} секционирована.")
+            if not is_partitioned(table):
+                raise CommandError(
+                    f"Таблица {table} не секционирована: запустите "
+                    "cashflow_partitions convert."
+                )
+            created = ensure_partitions(editor, Cashflow, options["ahead"])
+
+        for name in created:
+            self.stdout.write(f"создана  {name}")
+        if options["list"]:
+            for name, rows in sorted(partition_rows(table).items()):
+                self.stdout.write(f"{name:<40} ~{max(rows, 0):,.0f}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Создано секций: {len(created)}.")
+        )
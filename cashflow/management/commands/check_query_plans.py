@@ -0,0 +1,137 @@
+"""
+Регрессионная проверка планов запросов ДДС: без Seq Scan по записям и,
+для секционированной таблицы, с отсечением секций по периоду.
+
+На заполненной БД (``seed_cashflows``) проверяются планы, которые
+выберет планировщик. С ``--no-seqscan`` — на любых данных, в том числе
+в тестах (``cashflow.tests.QueryPlanTests``): последовательное
+сканирование запрещается, и Seq Scan в плане остаётся, только если
+запросу не подходит ни один индекс.
+"""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from cashflow.models import Cashflow
+from cashflow.partitioning import is_partitioned, partition_rows
+from cashflow.plans import plan_cases, pruning_cases
+from cashflow.views import CashflowViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Выполняет EXPLAIN для запросов списка и итогов по всем "
+        "комбинациям фильтров и падает, если хоть один план читает "
+        "таблицу записей ДДС последовательным сканированием. Для "
+        "секционированной таблицы проверяет, что запросы за период "
+        "читают только секции своих месяцев. "
+        "Нужен PostgreSQL с данными (manage.py seed_cashflows)."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--min-rows",
+            type=int,
+            default=50_000,
+            help=(
+                "Минимум записей в БД: на маленькой таблице Seq Scan "
+                "оправдан (по умолчанию 50 000)."
+            ),
+        )
+        parser.add_argument(
+            "--min-partition-rows",
+            type=int,
+            default=10_000,
+            help=(
+                "Секции меньше этого числа строк (пустые будущие месяцы) "
+                "можно читать Seq Scan (по умолчанию 10 000)."
+            ),
+        )
+        parser.add_argument(
+            "--no-seqscan",
+            action="store_true",
+            help=(
+                "Запретить планировщику Seq Scan (SET LOCAL "
+                "enable_seqscan = off) и проверить, что каждому запросу "
+                "подходит индекс; для малых данных и тестов."
+            ),
+        )
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Печатать планы проваленных запросов.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        if connection.vendor != "postgresql":
+            raise CommandError(
+                "Проверка планов поддерживает только PostgreSQL."
+            )
+        # без Seq Scan план не зависит от объёма: нужны любые записи
+        minimum = 1 if options["no_seqscan"] else options["min_rows"]
+        total = Cashflow.objects.count()
+        if total < minimum:
+            raise CommandError(
+                f"В БД {total} записей, нужно не меньше "
+                f"{minimum}: запустите manage.py seed_cashflows."
+            )
+
+        table = Cashflow._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+            if options["no_seqscan"]:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            self._check(table, options)
+
+    def _check(self, table: str, options: dict) -> None:
+        """Проверяет планы; падает, если хоть один не прошёл."""
+        partitioned = is_partitioned(table)
+        small = (
+            {
+                name
+                for name, rows in partition_rows(table).items()
+                if rows < options["min_partition_rows"]
+            }
+            if partitioned
+            else set()
+        )
+        failed = []
+        for case in plan_cases(CashflowViewSet.queryset):
+            scans = case.seq_scans(ignore=small)
+            if scans:
+                failed.append(case)
+                self.stdout.write(self.style.ERROR(f"SEQ SCAN  {case.name}"))
+                if options["verbose_plans"]:
+                    self.stdout.write(str(case.explain()))
+            else:
+                self.stdout.write(f"ok        {case.name}")
+
+        unpruned = []
+        if partitioned:
+            for case in pruning_cases(CashflowViewSet.queryset):
+                extra = case.extra_partitions()
+                if extra:
+                    unpruned.append(case)
+                    self.stdout.write(
+                        self.style.ERROR(
+                            f"NO PRUNE  {case.name}: {', '.join(extra)}"
+                        )
+                    )
+                    if options["verbose_plans"]:
+                        self.stdout.write(str(case.explain()))
+                else:
+                    self.stdout.write(f"ok        {case.name} (секции)")
+
+        if failed:
+            raise CommandError(
+                f"{len(failed)} запрос(ов) читают {table} "
+                "последовательным сканированием."
+            )
+        if unpruned:
+            raise CommandError(
+                f"{len(unpruned)} запрос(ов) за период читают секции "
+                "вне своих месяцев."
+            )
+        self.stdout.write(self.style.SUCCESS("Все планы используют индексы."))
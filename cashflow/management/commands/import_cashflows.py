@@ -0,0 +1,225 @@
+"""
+Потоковый импорт записей ДДС из CSV / JSON Lines (банковские выписки).
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import os
+import sys
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from cashflow.importer import (
+    DirectoryResolver,
+    ImportStats,
+    clear_progress,
+    iter_batches,
+    read_progress,
+    read_rows,
+    trim_rejects,
+    write_batch,
+)
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+
+class Command(BaseCommand):
+    help = (
+        "Импортирует записи ДДС из CSV или JSON Lines пачками "
+        "(bulk_create или COPY), не загружая файл в память."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "path", help="Путь к файлу или «-» для чтения из stdin."
+        )
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            help="Формат файла (по умолчанию — по расширению, иначе csv).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Строк в одной транзакции (по умолчанию 5000).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только проверить строки, ничего не записывая.",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Писать командой COPY (только PostgreSQL).",
+        )
+        parser.add_argument(
+            "--rejects",
+            help="CSV-файл для отклонённых строк (номер, причина, данные).",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Продолжить с последней записанной пачки.",
+        )
+        parser.add_argument(
+            "--state-key",
+            help=(
+                "Имя источника для --resume (по умолчанию — абсолютный "
+                "путь к файлу)."
+            ),
+        )
+        parser.add_argument(
+            "--progress-every",
+            type=int,
+            default=50_000,
+            help="Печатать прогресс каждые N строк (0 — не печатать).",
+        )
+
+    def handle(self, *args, **options) -> None:
+        path = options["path"]
+        file_format = options["format"] or self._guess_format(path)
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size должен быть больше нуля.")
+        if options["copy"] and connection.vendor != "postgresql":
+            raise CommandError("--copy доступен только для PostgreSQL.")
+
+        state_key = options["state_key"]
+        if state_key is None and path != "-":
+            state_key = os.path.abspath(path)
+        if options["resume"] and state_key is None:
+            raise CommandError("Для --resume из stdin нужен --state-key.")
+        start_after = 0
+        if options["resume"]:
+            start_after = read_progress(state_key)
+            if start_after:
+                self.stdout.write(f"Продолжаем после строки {start_after}.")
+
+        stream = (
+            sys.stdin
+            if path == "-"
+            else self._open(path, encoding="utf-8-sig", newline="")
+        )
+        rejects = None
+        if options["rejects"]:
+            mode = "a" if start_after else "w"
+            if start_after:
+                # отказы непринятой пачки прочитаются заново
+                trim_rejects(options["rejects"], start_after)
+            rejects = self._open(
+                options["rejects"], mode=mode, encoding="utf-8", newline=""
+            )
+
+        try:
+            stats = self._import(
+                stream,
+                file_format,
+                batch_size=batch_size,
+                start_after=start_after,
+                dry_run=options["dry_run"],
+                use_copy=options["copy"],
+                rejects=rejects,
+                state_key=None if options["dry_run"] else state_key,
+                progress_every=options["progress_every"],
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects is not None:
+                rejects.close()
+
+        if state_key and not options["dry_run"]:
+            # файл дочитан до конца — возобновлять больше нечего
+            clear_progress(state_key)
+
+    @staticmethod
+    def _guess_format(path: str) -> str:
+        extension = os.path.splitext(path)[1].lower().lstrip(".")
+        if extension in ("jsonl", "ndjson"):
+            return "jsonl"
+        return "csv"
+
+    @staticmethod
+    def _open(path: str, mode: str = "r", **kwargs):
+        try:
+            return open(path, mode, **kwargs)
+        except OSError as exc:
+            raise CommandError(f"Не удалось открыть {path}: {exc}") from exc
+
+    def _import(
+        self,
+        stream,
+        file_format: str,
+        *,
+        batch_size: int,
+        start_after: int,
+        dry_run: bool,
+        use_copy: bool,
+        rejects,
+        state_key: str | None,
+        progress_every: int,
+    ) -> ImportStats:
+        stats = ImportStats()
+        on_reject = None
+        if rejects is not None:
+            writer = csv.writer(rejects)
+            if rejects.tell() == 0:
+                writer.writerow(["line", "error", "data"])
+
+            def on_reject(line: int, error: str, row: dict[str, Any]) -> None:
+                writer.writerow(
+                    [line, error, json.dumps(row, ensure_ascii=False)]
+                )
+
+        resolver = DirectoryResolver()
+        started = time.monotonic()
+        reported = 0
+        batches = iter_batches(
+            read_rows(stream, file_format),
+            resolver,
+            stats,
+            batch_size=batch_size,
+            start_after=start_after,
+            on_reject=on_reject,
+        )
+        for line, batch in batches:
+            stats.inserted += len(batch)
+            if not dry_run and (batch or state_key):
+                # прогресс — в той же транзакции, что и пачка
+                write_batch(
+                    batch,
+                    use_copy=use_copy,
+                    state_key=state_key,
+                    line=line,
+                    stats=stats,
+                )
+            if progress_every and stats.read - reported >= progress_every:
+                reported = stats.read
+                self._progress(stats, started)
+
+        elapsed = time.monotonic() - started
+        verb = "проверено" if dry_run else "записано"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Готово: прочитано {stats.read}, {verb} {stats.inserted}, "
+                f"отклонено {stats.rejected}, пропущено {stats.skipped} "
+                f"за {elapsed:.1f} с ({stats.read / max(elapsed, 1e-6):.0f} "
+                "строк/с)."
+            )
+        )
+        return stats
+
+    def _progress(self, stats: ImportStats, started: float) -> None:
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f"{stats.read} строк, записано {stats.inserted}, "
+            f"отклонено {stats.rejected}, "
+            f"{stats.read / max(elapsed, 1e-6):.0f} строк/с"
+        )
@@ -0,0 +1,129 @@
+"""
+Нагрузочный замер задержки страниц по HTTP.
+
+Сравнивает режимы соединений с БД: запустите сервер с
+``DB_CONN_MAX_AGE=0``, затем с постоянными соединениями или ``DB_POOL``
+и сравните задержки.
+"""
+
+from __future__ import annotations
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.encoding import iri_to_uri
+
+from cashflow.benchmarks import percentile
+
+
+def fetch(url: str, timeout: float) -> tuple[float, bool]:
+    """Время ответа в секундах и признак успешного (2xx) ответа."""
+    request = Request(url, headers={"Accept": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urlopen(request, timeout=timeout) as response:
+            response.read()
+            ok = 200 <= response.status < 300
+    except (URLError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+class Command(BaseCommand):
+    help = (
+        "Гоняет GET-запросы к работающему серверу и печатает задержки "
+        "(p50/p95/p99) и запросы в секунду."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--base-url",
+            default="http://127.0.0.1:8000",
+            help="Адрес сервера (по умолчанию http://127.0.0.1:8000).",
+        )
+        parser.add_argument(
+            "--path",
+            dest="paths",
+            action="append",
+            help="Путь для замера; можно несколько "
+            "(по умолчанию / и /api/cashflows/).",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Запросов на каждый путь (по умолчанию 200).",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Параллельных клиентов (по умолчанию 4).",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=5,
+            help="Запросов на прогрев, не учитываются (по умолчанию 5).",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=30,
+            help="Таймаут запроса в секундах (по умолчанию 30).",
+        )
+
+    def handle(self, *args, **options) -> None:
+        base_url = options["base_url"].rstrip("/")
+        paths = options["paths"] or ["/", "/api/cashflows/"]
+        total, timeout = options["requests"], options["timeout"]
+        if total < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests и --concurrency должны быть > 0.")
+
+        database = settings.DATABASES["default"]
+        pool = database.get("OPTIONS", {}).get("pool")
+        mode = (
+            f"пул {pool['min_size']}..{pool['max_size']}"
+            if pool
+            else f"CONN_MAX_AGE={database.get('CONN_MAX_AGE', 0)}"
+        )
+        self.stdout.write(
+            f"{base_url}, {total} запросов × {options['concurrency']} "
+            f"потоков (настройки этого процесса: {mode})"
+        )
+
+        with ThreadPoolExecutor(options["concurrency"]) as executor:
+            for path in paths:
+                # кириллица в пути — в процентной кодировке
+                url = iri_to_uri(base_url + path)
+                for _ in range(options["warmup"]):
+                    fetch(url, timeout)
+                started = time.perf_counter()
+                results = list(
+                    executor.map(lambda _: fetch(url, timeout), range(total))
+                )
+                elapsed = time.perf_counter() - started
+                self._report(path, results, elapsed)
+
+    def _report(
+        self, path: str, results: list[tuple[float, bool]], elapsed: float
+    ) -> None:
+        errors = sum(1 for _, ok in results if not ok)
+        latencies = sorted(seconds * 1000 for seconds, _ in results)
+        line = (
+            f"  {path:<20} {len(results) / elapsed:7.1f} зап/с  "
+            f"среднее {statistics.mean(latencies):7.1f} мс  "
+            f"p50 {percentile(latencies, 0.50):7.1f}  "
+            f"p95 {percentile(latencies, 0.95):7.1f}  "
+            f"p99 {percentile(latencies, 0.99):7.1f}  "
+            f"max {latencies[-1]:7.1f}"
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING(f"{line}  ошибок: {errors}"))
+        else:
+            self.stdout.write(line)
@@ -0,0 +1,92 @@
+"""
+Генерация синтетических записей ДДС для нагрузочных проверок.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from cashflow.models import Cashflow
+from directories.models import Status, Subcategory
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет БД случайными записями ДДС по существующим "
+        "справочникам (для EXPLAIN и нагрузочных тестов)."
+    )
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=200_000,
+            help="Сколько записей создать (по умолчанию 200 000).",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=3 * 365,
+            help="За сколько последних дней раскидать даты.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Размер пачки вставки (по умолчанию 5000).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=42,
+            help="Зерно генератора — для воспроизводимых данных.",
+        )
+
+    def handle(self, *args, **options) -> None:
+        statuses = list(Status.objects.values_list("id", flat=True))
+        subcategories = list(Subcategory.objects.values_list("id", flat=True))
+        if not statuses or not subcategories:
+            raise CommandError(
+                "Нет справочников: сначала загрузите фикстуры "
+                "initial_*.json."
+            )
+
+        rng = random.Random(options["seed"])
+        now = timezone.now()
+        span = options["days"] * 24 * 3600
+        rows, batch_size = options["rows"], options["batch_size"]
+        started = time.monotonic()
+        created = 0
+        while created < rows:
+            size = min(batch_size, rows - created)
+            Cashflow.objects.bulk_create(
+                Cashflow(
+                    created_at=now - timedelta(seconds=rng.randrange(span)),
+                    status_id=rng.choice(statuses),
+                    subcategory_id=rng.choice(subcategories),
+                    amount=Decimal(rng.randrange(100, 10_000_000)) / 100,
+                    comment=f"seed #{created + i}",
+                )
+                for i in range(size)
+            )
+            created += size
+            self.stdout.write(f"{created}/{rows}")
+
+        if connection.vendor == "postgresql":
+            # свежая статистика, чтобы планировщик видел новые объёмы
+            table = connection.ops.quote_name(Cashflow._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {table}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Создано {created} записей "
+                f"за {time.monotonic() - started:.1f} с."
+            )
+        )
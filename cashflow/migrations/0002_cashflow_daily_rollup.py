@@ -0,0 +1,58 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+
+
+def build_rollup(apps, schema_editor):
+    """Заполняет агрегат по уже существующим записям ДДС."""
+    Cashflow = apps.get_model("cashflow", "Cashflow")
+    CashflowDailyRollup = apps.get_model("cashflow", "CashflowDailyRollup")
+    rows = (
+        Cashflow.objects.order_by()
+        .values("subcategory_id", "status_id", day=TruncDate("created_at"))
+        .annotate(
+            total_amount=Sum("amount"),
+            records_count=Count("id"),
+            min_amount=Min("amount"),
+            max_amount=Max("amount"),
+        )
+    )
+    CashflowDailyRollup.objects.bulk_create(
+        (CashflowDailyRollup(**row) for row in rows.iterator()),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0001_initial'),
+        ('directories', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashflowDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=16, verbose_name='Сумма')),
+                ('records_count', models.PositiveIntegerField(verbose_name='Количество записей')),
+                ('min_amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Минимальная сумма')),
+                ('max_amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Максимальная сумма')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='directories.status', verbose_name='Статус')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='directories.subcategory', verbose_name='Подкатегория')),
+            ],
+            options={
+                'verbose_name': 'Дневной агрегат ДДС',
+                'verbose_name_plural': 'Дневные агрегаты ДДС',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='cashflow_ca_day_a9bccd_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'subcategory', 'status'), name='cashflow_rollup_day_bucket_uniq')],
+            },
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
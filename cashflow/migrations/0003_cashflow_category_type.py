@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_hierarchy(apps, schema_editor):
+    """Заполняет category/type существующих записей по подкатегориям."""
+    Cashflow = apps.get_model("cashflow", "Cashflow")
+    Subcategory = apps.get_model("directories", "Subcategory")
+    subcategory = Subcategory.objects.filter(pk=OuterRef("subcategory_id"))
+    Cashflow.objects.update(
+        category_id=Subquery(subcategory.values("category_id")[:1]),
+        type_id=Subquery(subcategory.values("category__type_id")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0002_cashflow_daily_rollup'),
+        ('directories', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cashflow',
+            name='category',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='directories.category', verbose_name='Категория'),
+        ),
+        migrations.AddField(
+            model_name='cashflow',
+            name='type',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='directories.type', verbose_name='Тип'),
+        ),
+        migrations.RunPython(backfill_hierarchy, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['type', 'created_at'], name='cashflow_ca_type_id_c8bc47_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['category', 'created_at'], name='cashflow_ca_categor_bceefc_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0003_cashflow_category_type'),
+        ('directories', '0001_initial'),
+    ]
+
+    # новые индексы создаём до удаления старых
+    operations = [
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['-created_at', '-id'], include=('amount',), name='cf_created_cov'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['status', '-created_at', '-id'], include=('amount',), name='cf_status_created_cov'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['type', '-created_at', '-id'], include=('amount',), name='cf_type_created_cov'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['category', '-created_at', '-id'], include=('amount',), name='cf_category_created_cov'),
+        ),
+        migrations.AddIndex(
+            model_name='cashflow',
+            index=models.Index(fields=['subcategory', '-created_at', '-id'], include=('amount',), name='cf_subcategory_created_cov'),
+        ),
+        migrations.RemoveIndex(
+            model_name='cashflow',
+            name='cashflow_ca_created_d57e52_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='cashflow',
+            name='cashflow_ca_status__e32625_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='cashflow',
+            name='cashflow_ca_subcate_490e61_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='cashflow',
+            name='cashflow_ca_type_id_c8bc47_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='cashflow',
+            name='cashflow_ca_categor_bceefc_idx',
+        ),
+        migrations.AlterField(
+            model_name='cashflow',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата/время операции'),
+        ),
+        migrations.AlterField(
+            model_name='cashflow',
+            name='status',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='cashflows', to='directories.status', verbose_name='Статус'),
+        ),
+        migrations.AlterField(
+            model_name='cashflow',
+            name='subcategory',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='cashflows', to='directories.subcategory', verbose_name='Подкатегория'),
+        ),
+    ]
@@ -0,0 +1,14 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Раньше миграция секционировала таблицу при CASHFLOW_PARTITIONING, и
+    # схема зависела от окружения в момент migrate. Теперь таблицу
+    # преобразует только явная команда cashflow_partitions convert;
+    # миграция оставлена пустой, чтобы не менять историю.
+
+    dependencies = [
+        ('cashflow', '0004_cashflow_covering_indexes'),
+    ]
+
+    operations = []
@@ -0,0 +1,37 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+INDEX = django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('comment'), name='gin_trgm_ops'), name='cf_comment_trgm')
+
+
+def create_trgm_index(apps, schema_editor):
+    # pg_trgm и GIN есть только в PostgreSQL; на других БД поиск идёт без индекса
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.add_index(apps.get_model('cashflow', 'Cashflow'), INDEX)
+
+
+def drop_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.remove_index(apps.get_model('cashflow', 'Cashflow'), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0005_cashflow_partitioning'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='cashflow', index=INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_trgm_index, drop_trgm_index),
+            ],
+        ),
+    ]
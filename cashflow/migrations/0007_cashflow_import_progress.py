@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cashflow', '0006_cashflow_comment_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashflowImportProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=500, unique=True, verbose_name='Источник')),
+                ('line', models.PositiveBigIntegerField(verbose_name='Последняя записанная строка')),
+                ('inserted', models.PositiveBigIntegerField(default=0, verbose_name='Записано')),
+                ('rejected', models.PositiveBigIntegerField(default=0, verbose_name='Отклонено')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Прогресс импорта ДДС',
+                'verbose_name_plural': 'Прогресс импорта ДДС',
+            },
+        ),
+    ]
@@ -2,19 +2,174 @@
 Модель движения денежных средств.
 
 Хранит факт операции с суммой, датой, статусом и подкатегорией.
-Категория и тип получаются через связи от подкатегории:
-Subcategory - Category - Type.
+Категория и тип определяются подкатегорией (Subcategory - Category - Type)
+и продублированы в записи, чтобы фильтровать по ним без JOIN.
 """
 
 from __future__ import annotations
 
 from decimal import Decimal
-from typing import Optional
+from typing import Iterable, Optional
 
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import models, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.functions import Upper
 from django.utils import timezone
 
-from directories.models import Category, Status, Subcategory, Type
+from directories.models import Category, Status, Subcategory, Type, TypeKind
+
+# Поля, которыми задаётся подкатегория записи
+SUBCATEGORY_FIELDS = ("subcategory", "subcategory_id")
+
+
+def hierarchy_ids(
+    subcategory_ids: Iterable[int],
+) -> dict[int, tuple[int, int]]:
+    """
+    Категория и тип для подкатегорий — одним запросом к БД.
+
+    Снимок справочников для записи не годится: в другом процессе он
+    может быть старше переноса подкатегории или категории (до
+    ``DIRECTORY_SNAPSHOT_TTL``), а перенос исправляет копии только у уже
+    сохранённых записей — записанные по старому снимку остались бы
+    неверными навсегда.
+
+    Returns:
+        dict[int, tuple[int, int]]: subcategory_id -> (category_id, type_id).
+    """
+    ids = set(subcategory_ids)
+    if not ids:
+        return {}
+    rows = Subcategory.objects.filter(pk__in=ids).values_list(
+        "pk", "category_id", "category__type_id"
+    )
+    return {pk: (category_id, type_id) for pk, category_id, type_id in rows}
+
+
+def fill_hierarchy(objs: Iterable[Cashflow]) -> None:
+    """Проставляет записям category_id и type_id по их подкатегориям."""
+    objs = [obj for obj in objs if obj.subcategory_id is not None]
+    ids = hierarchy_ids(obj.subcategory_id for obj in objs)
+    for obj in objs:
+        if obj.subcategory_id in ids:
+            obj.category_id, obj.type_id = ids[obj.subcategory_id]
+
+
+def hierarchy_subqueries() -> dict[str, Subquery]:
+    """Выражения для UPDATE: category_id и type_id из подкатегории."""
+    subcategory = Subcategory.objects.filter(pk=OuterRef("subcategory_id"))
+    return {
+        "category_id": Subquery(subcategory.values("category_id")[:1]),
+        "type_id": Subquery(subcategory.values("category__type_id")[:1]),
+    }
+
+
+def resync_hierarchy(subcategory_ids: Iterable[int]) -> int:
+    """
+    Исправляет копии категории и типа у записей подкатегорий, где они
+    не совпадают с подкатегорией (после UPDATE подкатегории выражением).
+
+    Returns:
+        int: число исправленных записей.
+    """
+    subqueries = hierarchy_subqueries()
+    return (
+        Cashflow.objects.filter(subcategory_id__in=subcategory_ids)
+        .exclude(
+            Q(category_id=subqueries["category_id"])
+            & Q(type_id=subqueries["type_id"])
+        )
+        .update(**subqueries)
+    )
+
+
+class CashflowQuerySet(models.QuerySet):
+    """Выборка записей ДДС, поддерживающая дневной агрегат в актуальном виде.
+
+    Массовые ``delete``/``update``/``bulk_create`` не вызывают ``save``
+    и ``delete`` моделей, поэтому пересчитываем затронутые корзины здесь.
+    """
+
+    def delete(self) -> tuple[int, dict[str, int]]:
+        from .rollup import bucket_keys, refresh_buckets
+
+        with transaction.atomic():
+            keys = bucket_keys(self)
+            result = super().delete()
+            refresh_buckets(keys)
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def update(self, **kwargs) -> int:
+        from .rollup import ROLLUP_FIELDS, bucket_keys, refresh_buckets
+
+        if not ROLLUP_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+
+        resync = False
+        if "category_id" not in kwargs:
+            for name in SUBCATEGORY_FIELDS:
+                if name not in kwargs:
+                    continue
+                value = kwargs[name]
+                if hasattr(value, "resolve_expression"):
+                    resync = True
+                else:
+                    kwargs.update(self._hierarchy_values(value))
+
+        with transaction.atomic():
+            if any(
+                hasattr(value, "resolve_expression")
+                for value in kwargs.values()
+            ):
+                # новые корзины — по тем же выражениям до UPDATE
+                new_keys = bucket_keys(self, kwargs)
+                keys = bucket_keys(self) | new_keys
+                rows = super().update(**kwargs)
+                if resync:
+                    resync_hierarchy({key[1] for key in new_keys})
+            else:
+                keys = bucket_keys(self)
+                rows = super().update(**kwargs)
+                keys |= {self._updated_key(key, kwargs) for key in keys}
+            refresh_buckets(keys)
+        return rows
+
+    update.alters_data = True
+
+    @staticmethod
+    def _hierarchy_values(subcategory) -> dict[str, Optional[int]]:
+        pk = getattr(subcategory, "pk", subcategory)
+        category_id, type_id = hierarchy_ids([pk]).get(pk, (None, None))
+        return {"category_id": category_id, "type_id": type_id}
+
+    @staticmethod
+    def _updated_key(key: tuple, values: dict) -> tuple:
+        from .rollup import local_day
+
+        day, subcategory_id, status_id = key
+        if "created_at" in values:
+            day = local_day(values["created_at"])
+        for name in SUBCATEGORY_FIELDS:
+            if name in values:
+                subcategory_id = getattr(values[name], "pk", values[name])
+        for name in ("status", "status_id"):
+            if name in values:
+                status_id = getattr(values[name], "pk", values[name])
+        return day, subcategory_id, status_id
+
+    def bulk_create(self, objs, *args, **kwargs) -> list:
+        from .rollup import refresh_buckets
+
+        objs = list(objs)
+        fill_hierarchy(objs)
+        with transaction.atomic():
+            created = super().bulk_create(objs, *args, **kwargs)
+            refresh_buckets(obj.rollup_key for obj in created)
+        return created
 
 
 class Cashflow(models.Model):
@@ -23,21 +178,41 @@ class Cashflow(models.Model):
     created_at: models.DateTimeField = models.DateTimeField(
         "Дата/время операции",
         default=timezone.now,
-        db_index=True,
+        db_index=False,
     )
     status: models.ForeignKey = models.ForeignKey(
         Status,
         on_delete=models.PROTECT,
         related_name="cashflows",
         verbose_name="Статус",
-        db_index=True,
+        db_index=False,
     )
     subcategory: models.ForeignKey = models.ForeignKey(
         Subcategory,
         on_delete=models.PROTECT,
         related_name="cashflows",
         verbose_name="Подкатегория",
-        db_index=True,
+        db_index=False,
+    )
+    # Копии из подкатегории (заполняются при сохранении) — для фильтров
+    # по типу и категории за период без JOIN
+    category: models.ForeignKey = models.ForeignKey(
+        Category,
+        on_delete=models.PROTECT,
+        related_name="+",
+        verbose_name="Категория",
+        null=True,
+        editable=False,
+        db_index=False,
+    )
+    type: models.ForeignKey = models.ForeignKey(
+        Type,
+        on_delete=models.PROTECT,
+        related_name="+",
+        verbose_name="Тип",
+        null=True,
+        editable=False,
+        db_index=False,
     )
     amount: models.DecimalField = models.DecimalField(
         "Сумма",
@@ -46,40 +221,114 @@ class Cashflow(models.Model):
     )
     comment: models.TextField = models.TextField("Комментарий", blank=True)
 
+    objects = CashflowQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Запись ДДС"
         verbose_name_plural = "Записи ДДС"
         ordering = ["-created_at", "-id"]
+        # Индексы повторяют порядок списка (-created_at, -id) после
+        # фильтра по справочнику: страница и keyset-переход — это range
+        # scan без сортировки. INCLUDE (amount) даёт итоги за период
+        # index-only сканом (INCLUDE поддерживает только PostgreSQL).
+        # Индексы по одному справочнику заодно обслуживают внешние ключи.
         indexes = [
-            models.Index(fields=["created_at"]),
-            models.Index(fields=["status"]),
-            models.Index(fields=["subcategory"]),
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="cf_created_cov",
+                include=["amount"],
+            ),
+            *(
+                models.Index(
+                    fields=[field, "-created_at", "-id"],
+                    name=f"cf_{field}_created_cov",
+                    include=["amount"],
+                )
+                for field in ("status", "type", "category", "subcategory")
+            ),
+            # Триграммы комментария (pg_trgm) для поиска подстрокой:
+            # выражение совпадает с тем, что Django строит для icontains
+            GinIndex(
+                OpClass(Upper("comment"), name="gin_trgm_ops"),
+                name="cf_comment_trgm",
+            ),
         ]
 
     def __str__(self) -> str:
         """
         Возвращает человекочитаемое представление записи.
+
+        Статус берётся из снимка справочников — без запроса на запись.
         """
+        from directories.cache import get_snapshot
+
+        status = get_snapshot().status(self.status_id) or self.status
         return " ".join(
             [
                 f"{self.created_at:%Y-%m-%d %H:%M} ·",
-                f"{self.amount} · {self.status.name}",
+                f"{self.amount} · {status.name}",
             ]
         )
 
+    @classmethod
+    def from_db(cls, db, field_names, values) -> Cashflow:
+        """Запоминает корзину агрегата, в которой запись лежит в БД."""
+        instance = super().from_db(db, field_names, values)
+        instance._stored_rollup_key = instance.rollup_key
+        return instance
+
     @property
-    def category(self) -> Category:
+    def rollup_key(self) -> Optional[tuple]:
         """
-        Возвращает категорию через связь подкатегории.
+        Корзина дневного агрегата для текущих значений записи.
         """
-        return self.subcategory.category
+        from .rollup import bucket_key
 
-    @property
-    def type(self) -> Type:
+        deferred = self.get_deferred_fields()
+        if deferred & {"created_at", "subcategory_id", "status_id"}:
+            return None
+        return bucket_key(self.created_at, self.subcategory_id, self.status_id)
+
+    def save(self, *args, **kwargs) -> None:
+        """
+        Сохраняет запись и пересчитывает затронутые корзины агрегата.
+        """
+        from .rollup import bucket_key, refresh_buckets
+
+        stored = getattr(self, "_stored_rollup_key", None)
+        if stored is None and self.pk is not None:
+            row = (
+                Cashflow.objects.filter(pk=self.pk)
+                .values_list("created_at", "subcategory_id", "status_id")
+                .first()
+            )
+            if row:
+                stored = bucket_key(*row)
+
+        if "subcategory_id" not in self.get_deferred_fields():
+            fill_hierarchy([self])
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and (
+            set(SUBCATEGORY_FIELDS) & set(update_fields)
+        ):
+            kwargs["update_fields"] = {*update_fields, "category", "type"}
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            refresh_buckets([stored, self.rollup_key])
+        self._stored_rollup_key = self.rollup_key
+
+    def delete(self, *args, **kwargs) -> tuple[int, dict[str, int]]:
         """
-        Возвращает тип через цепочку подкатегория → категория → тип.
+        Удаляет запись и пересчитывает её корзину агрегата.
         """
-        return self.subcategory.category.type
+        from .rollup import refresh_buckets
+
+        key = getattr(self, "_stored_rollup_key", None) or self.rollup_key
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            refresh_buckets([key])
+        return result
 
     def clean(self) -> None:
         """
@@ -91,16 +340,104 @@ class Cashflow(models.Model):
         """
         Проверяет, является ли операция «пополнением».
         """
-        return self.type.name.lower() == "пополнение"
+        return self.type.kind == TypeKind.INCOME
 
     def is_outcome(self) -> bool:
         """
         Проверяет, является ли операция «списанием».
         """
-        return self.type.name.lower() == "списание"
+        return self.type.kind == TypeKind.OUTCOME
 
     def abs_amount(self) -> Decimal:
         """
         Возвращает модуль суммы.
         """
         return abs(self.amount)
+
+
+class CashflowDailyRollup(models.Model):
+    """Дневной агрегат ДДС: день × подкатегория × статус."""
+
+    day: models.DateField = models.DateField("День")
+    subcategory: models.ForeignKey = models.ForeignKey(
+        Subcategory,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Подкатегория",
+    )
+    status: models.ForeignKey = models.ForeignKey(
+        Status,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Статус",
+    )
+    total_amount: models.DecimalField = models.DecimalField(
+        "Сумма",
+        max_digits=16,
+        decimal_places=2,
+    )
+    records_count: models.PositiveIntegerField = (
+        models.PositiveIntegerField("Количество записей")
+    )
+    min_amount: models.DecimalField = models.DecimalField(
+        "Минимальная сумма",
+        max_digits=12,
+        decimal_places=2,
+    )
+    max_amount: models.DecimalField = models.DecimalField(
+        "Максимальная сумма",
+        max_digits=12,
+        decimal_places=2,
+    )
+
+    class Meta:
+        verbose_name = "Дневной агрегат ДДС"
+        verbose_name_plural = "Дневные агрегаты ДДС"
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "subcategory", "status"],
+                name="cashflow_rollup_day_bucket_uniq",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["day"]),
+        ]
+
+    def __str__(self) -> str:
+        return (
+            f"{self.day:%Y-%m-%d} · {self.total_amount} "
+            f"({self.records_count})"
+        )
+
+
+class CashflowImportProgress(models.Model):
+    """
+    Прогресс импорта ДДС для возобновления после сбоя.
+
+    Пишется в той же транзакции, что и пачка записей: после сбоя
+    импорт продолжается ровно после последней зафиксированной пачки.
+    """
+
+    key: models.CharField = models.CharField(
+        "Источник", max_length=500, unique=True
+    )
+    line: models.PositiveBigIntegerField = models.PositiveBigIntegerField(
+        "Последняя записанная строка"
+    )
+    inserted: models.PositiveBigIntegerField = (
+        models.PositiveBigIntegerField("Записано", default=0)
+    )
+    rejected: models.PositiveBigIntegerField = (
+        models.PositiveBigIntegerField("Отклонено", default=0)
+    )
+    updated_at: models.DateTimeField = models.DateTimeField(
+        "Обновлено", auto_now=True
+    )
+
+    class Meta:
+        verbose_name = "Прогресс импорта ДДС"
+        verbose_name_plural = "Прогресс импорта ДДС"
+
+    def __str__(self) -> str:
+        return f"{self.key}: {self.line}"
@@ -0,0 +1,287 @@
+"""
+Секционирование записей ДДС по месяцам (PostgreSQL).
+
+Таблица ``cashflow_cashflow`` может быть секционирована по диапазонам
+``created_at``: одна секция на месяц
+(границы — полночь первого числа в ``TIME_ZONE``) и секция по умолчанию
+для записей вне созданных месяцев. Фильтр по периоду (``date_from`` /
+``date_to``) читает только секции своих месяцев, VACUUM и ANALYZE
+обрабатывают секции по отдельности.
+
+Первичный ключ секционированной таблицы — ``(id, created_at)``: ключ
+секционирования обязан в него входить. Для Django первичным ключом
+остаётся ``id`` — его уникальность обеспечивает последовательность.
+
+Таблицу преобразует только явная команда ``cashflow_partitions
+convert`` (обратно — ``revert``), а не миграции: иначе схема зависела
+бы от окружения в момент ``migrate``, и одна история миграций давала
+бы разные таблицы. Признак секционирования хранит сама БД
+(``is_partitioned``). Секции будущих месяцев создаёт
+``cashflow_partitions``.
+"""
+
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection as default_connection
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.utils import timezone
+
+# Суффикс секции по умолчанию
+DEFAULT_PARTITION_SUFFIX = "default"
+
+
+def partitioning_supported(connection=default_connection) -> bool:
+    """Поддерживает ли БД секционирование (только PostgreSQL)."""
+    return connection.vendor == "postgresql"
+
+
+def add_months(month: date, count: int) -> date:
+    """Первое число месяца через ``count`` месяцев."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_of(value: datetime) -> date:
+    """Первое число месяца момента ``value`` в ``TIME_ZONE``."""
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def month_bounds(month: date) -> tuple[datetime, datetime]:
+    """Границы секции месяца: ``[начало месяца, начало следующего)``."""
+    following = add_months(month, 1)
+    return (
+        timezone.make_aware(datetime(month.year, month.month, 1)),
+        timezone.make_aware(datetime(following.year, following.month, 1)),
+    )
+
+
+def months_between(start: datetime, end: datetime) -> list[date]:
+    """Месяцы, которые пересекает период ``[start, end]``."""
+    month, last = month_of(start), month_of(end)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def partition_name(table: str, month: Optional[date] = None) -> str:
+    """Имя секции месяца (без ``month`` — секции по умолчанию)."""
+    if month is None:
+        return f"{table}_{DEFAULT_PARTITION_SUFFIX}"
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(table: str, connection=default_connection) -> bool:
+    """Секционирована ли таблица."""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass(%s))",
+            [table],
+        )
+        return cursor.fetchone()[0]
+
+
+def partition_rows(
+    table: str, connection=default_connection
+) -> dict[str, float]:
+    """Секции таблицы и оценка числа строк в них (по ANALYZE)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, c.reltuples FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s)",
+            [table],
+        )
+        return {name: rows for name, rows in cursor.fetchall()}
+
+
+def _literal(value: datetime) -> str:
+    # границы секций в DDL передаются литералами, параметры не подходят
+    return f"'{value.isoformat()}'"
+
+
+def create_partition(
+    schema_editor: BaseDatabaseSchemaEditor, table: str, month: date
+) -> str:
+    """
+    Создаёт секцию месяца.
+
+    Записи этого месяца из секции по умолчанию переносятся в новую
+    секцию до её подключения — иначе PostgreSQL не даст её подключить.
+    """
+    qn = schema_editor.quote_name
+    name = partition_name(table, month)
+    start, end = month_bounds(month)
+    schema_editor.execute(
+        f"CREATE TABLE {qn(name)} "
+        f"(LIKE {qn(table)} INCLUDING CONSTRAINTS)"
+    )
+    schema_editor.execute(
+        f"WITH moved AS (DELETE FROM {qn(partition_name(table))} "
+        f"WHERE created_at >= {_literal(start)} "
+        f"AND created_at < {_literal(end)} RETURNING *) "
+        f"INSERT INTO {qn(name)} SELECT * FROM moved"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} "
+        f"FOR VALUES FROM ({_literal(start)}) TO ({_literal(end)})"
+    )
+    return name
+
+
+def default_partition_months(
+    schema_editor: BaseDatabaseSchemaEditor, table: str
+) -> set[date]:
+    """Месяцы записей, попавших в секцию по умолчанию."""
+    qn = schema_editor.quote_name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE %s) "
+            f"FROM {qn(partition_name(table))}",
+            [settings.TIME_ZONE],
+        )
+        return {row[0].date() for row in cursor.fetchall()}
+
+
+def ensure_partitions(
+    schema_editor: BaseDatabaseSchemaEditor,
+    model,
+    ahead: Optional[int] = None,
+) -> list[str]:
+    """
+    Создаёт недостающие секции: текущий месяц, ``ahead`` следующих и
+    месяцы записей из секции по умолчанию.
+
+    Returns:
+        list[str]: имена созданных секций.
+    """
+    if ahead is None:
+        ahead = settings.CASHFLOW_PARTITION_MONTHS_AHEAD
+    table = model._meta.db_table
+    existing = partition_rows(table, schema_editor.connection)
+    current = timezone.localdate().replace(day=1)
+    months = {add_months(current, count) for count in range(ahead + 1)}
+    months |= default_partition_months(schema_editor, table)
+    return [
+        create_partition(schema_editor, table, month)
+        for month in sorted(months)
+        if partition_name(table, month) not in existing
+    ]
+
+
+def _rebuild(
+    schema_editor: BaseDatabaseSchemaEditor, model, partitioned: bool
+) -> None:
+    """
+    Пересоздаёт таблицу модели (секционированной или обычной) и
+    переносит в неё записи, ограничения и индексы.
+    """
+    qn = schema_editor.quote_name
+    table = model._meta.db_table
+    old = f"{table}_old"
+    columns = ", ".join(
+        qn(field.column) for field in model._meta.local_concrete_fields
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype IN ('f', 'c')",
+            [table],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(f"SELECT MIN(created_at) FROM {qn(table)}")
+        first = cursor.fetchone()[0]
+
+    schema_editor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}")
+    # LIKE без INCLUDING: колонки и NOT NULL; индексы, ограничения и
+    # генерацию id добавляем после удаления старой таблицы (их имена
+    # заняты её объектами)
+    schema_editor.execute(
+        f"CREATE TABLE {qn(table)} (LIKE {qn(old)})"
+        + (" PARTITION BY RANGE (created_at)" if partitioned else "")
+    )
+    if partitioned:
+        schema_editor.execute(
+            f"CREATE TABLE {qn(partition_name(table))} "
+            f"PARTITION OF {qn(table)} DEFAULT"
+        )
+        current = timezone.localdate().replace(day=1)
+        month = month_of(first) if first else current
+        last = add_months(current, settings.CASHFLOW_PARTITION_MONTHS_AHEAD)
+        while month <= last:
+            create_partition(schema_editor, table, month)
+            month = add_months(month, 1)
+    schema_editor.execute(
+        f"INSERT INTO {qn(table)} ({columns}) "
+        f"SELECT {columns} FROM {qn(old)}"
+    )
+    schema_editor.execute(f"DROP TABLE {qn(old)}")
+
+    key = "id, created_at" if partitioned else "id"
+    schema_editor.execute(
+        f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f'{table}_pkey')} "
+        f"PRIMARY KEY ({key})"
+    )
+    if partitioned:
+        # IDENTITY у секционированных таблиц есть только с PostgreSQL 17
+        sequence = f"{table}_id_seq"
+        schema_editor.execute(f"CREATE SEQUENCE {qn(sequence)}")
+        schema_editor.execute(
+            f"ALTER SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id"
+        )
+        schema_editor.execute(
+            f"ALTER TABLE {qn(table)} ALTER COLUMN id "
+            f"SET DEFAULT nextval('{sequence}')"
+        )
+    else:
+        schema_editor.execute(
+            f"ALTER TABLE {qn(table)} ALTER COLUMN id "
+            "ADD GENERATED BY DEFAULT AS IDENTITY"
+        )
+    schema_editor.execute(
+        "SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+        f"COALESCE(MAX(id), 0) + 1, false) FROM {qn(table)}",
+        [table],
+    )
+    for name, definition in constraints:
+        schema_editor.execute(
+            f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}"
+        )
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+
+
+def convert_to_partitioned(
+    schema_editor: BaseDatabaseSchemaEditor, model
+) -> bool:
+    """
+    Секционирует таблицу записей ДДС, если она ещё не секционирована.
+
+    Таблица переписывается целиком под эксклюзивной блокировкой:
+    на больших объёмах — в окно обслуживания.
+
+    Returns:
+        bool: была ли таблица преобразована.
+    """
+    table = model._meta.db_table
+    if is_partitioned(table, schema_editor.connection):
+        return False
+    _rebuild(schema_editor, model, partitioned=True)
+    return True
+
+
+def convert_to_plain(schema_editor: BaseDatabaseSchemaEditor, model) -> bool:
+    """Возвращает обычную таблицу вместо секционированной."""
+    table = model._meta.db_table
+    if not is_partitioned(table, schema_editor.connection):
+        return False
+    _rebuild(schema_editor, model, partitioned=False)
+    return True
@@ -0,0 +1,254 @@
+"""
+Проверка планов запросов списка и итогов ДДС (PostgreSQL).
+
+Для каждой поддерживаемой комбинации фильтров ``CashflowFilter`` строятся
+те же запросы, что выполняет приложение: первая страница списка, переход
+по keyset-курсору вглубь и сумма за период (итоги, которые нельзя взять
+из дневного агрегата). Их ``EXPLAIN`` не должен содержать
+последовательного сканирования таблицы записей ДДС.
+
+Если таблица секционирована по месяцам, запросы за период из
+``CashflowFilter`` и ``CashflowFilterForm`` должны читать только секции
+месяцев этого периода (partition pruning).
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from datetime import timedelta
+from itertools import combinations
+from typing import Any, Collection, Iterator
+
+from django.db import connection
+from django.db.models import Count, QuerySet
+from django.utils import timezone
+
+from api.filters import CashflowFilter
+from ui.forms import CashflowFilterForm
+from ui.views import filter_cashflows
+
+from .keyset import get_ordering, keyset_filter
+from .models import Cashflow
+from .partitioning import months_between, partition_name
+
+# Размер страницы, как у API по умолчанию (+1 строка на признак next)
+PLAN_PAGE_SIZE = 50
+
+# Фильтры по справочникам, комбинации которых проверяем
+PLAN_FILTERS = ("status", "type", "category", "subcategory")
+
+# Окно дат для итогов: не по границам дней, чтобы не уйти в агрегат
+PLAN_WINDOW = timedelta(days=30)
+
+
+@dataclass
+class PlanCase:
+    """Проверяемый запрос: название и SQL с параметрами."""
+
+    name: str
+    sql: str
+    params: tuple
+
+    def explain(self) -> list[dict[str, Any]]:
+        """План запроса в формате JSON."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {self.sql}", self.params)
+            plan = cursor.fetchone()[0]
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    def scans(self) -> list[tuple[str, str]]:
+        """Чтения таблицы записей ДДС и её секций: (узел плана, таблица)."""
+        table = Cashflow._meta.db_table
+        return [
+            (node["Node Type"], node["Relation Name"])
+            for node in _walk(self.explain()[0]["Plan"])
+            if node.get("Relation Name", "").startswith(table)
+        ]
+
+    def seq_scans(self, ignore: Collection[str] = ()) -> list[str]:
+        """
+        Таблицы записей ДДС, которые план читает целиком.
+
+        Args:
+            ignore (Collection[str]): не считать эти таблицы (маленькие
+                секции, где Seq Scan оправдан).
+        """
+        return [
+            name
+            for node_type, name in self.scans()
+            if node_type == "Seq Scan" and name not in ignore
+        ]
+
+
+@dataclass
+class PruningCase(PlanCase):
+    """Запрос за период: какие секции ему разрешено читать."""
+
+    allowed: frozenset[str] = field(default_factory=frozenset)
+
+    def extra_partitions(self) -> list[str]:
+        """Прочитанные секции вне месяцев периода."""
+        return sorted(
+            {name for _, name in self.scans()} - self.allowed
+        )
+
+
+def _walk(node: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _walk(child)
+
+
+def _queryset_case(name: str, queryset: QuerySet) -> PlanCase:
+    sql, params = queryset.query.sql_with_params()
+    return PlanCase(name, sql, tuple(params))
+
+
+def _total_case(name: str, queryset: QuerySet) -> PlanCase:
+    # aggregate() сразу выполняет запрос, поэтому сумму оборачиваем сами
+    sql, params = queryset.order_by().values("amount").query.sql_with_params()
+    return PlanCase(
+        name, f"SELECT SUM(t.amount) FROM ({sql}) t", tuple(params)
+    )
+
+
+def most_common(field: str) -> Any:
+    """Самое частое значение поля в записях ДДС (или None)."""
+    row = (
+        Cashflow.objects.values(field)
+        .annotate(n=Count("id"))
+        .order_by("-n")
+        .first()
+    )
+    return row[field] if row else None
+
+
+def search_term(comment: str) -> str | None:
+    """Слово для проверки поиска: самое длинное в комментарии."""
+    words = comment.split()
+    return max(words, key=len) if words else None
+
+
+def plan_cases(base: QuerySet[Cashflow]) -> list[PlanCase]:
+    """
+    Запросы для всех комбинаций фильтров (до двух справочников).
+
+    Значения фильтров — самые частые в данных (худшая селективность),
+    окно дат — последние ``PLAN_WINDOW`` до середины последнего дня,
+    поиск — самое длинное слово комментария записи из середины выборки.
+
+    Args:
+        base (QuerySet[Cashflow]): исходная выборка списка API.
+    Returns:
+        list[PlanCase]: проверяемые запросы.
+    """
+    values = {name: most_common(f"{name}_id") for name in PLAN_FILTERS}
+    last = base.order_by("-created_at").values_list("created_at", flat=True)
+    latest = last.first()
+    if latest is None:
+        return []
+    date_to = timezone.localtime(latest).replace(hour=12, minute=0, second=0)
+    date_from = date_to - PLAN_WINDOW
+
+    total = base.count()
+    middle = (
+        base.order_by("-created_at", "-id")
+        .values("created_at", "id", "comment")[total // 2]
+    )
+
+    filter_sets = [()]
+    for size in (1, 2):
+        filter_sets += list(combinations(PLAN_FILTERS, size))
+
+    cases: list[PlanCase] = []
+    for names in filter_sets:
+        data = {name: values[name] for name in names}
+        label = "+".join(names) or "без фильтров"
+        qs = CashflowFilter(data, queryset=base).qs
+        ordering = get_ordering(qs)
+        cases.append(
+            _queryset_case(f"{label}: страница", qs[: PLAN_PAGE_SIZE + 1])
+        )
+        deep = qs.filter(
+            keyset_filter(ordering, [middle["created_at"], middle["id"]])
+        )
+        cases.append(
+            _queryset_case(
+                f"{label}: keyset вглубь", deep[: PLAN_PAGE_SIZE + 1]
+            )
+        )
+
+        windowed = CashflowFilter(
+            {
+                **data,
+                "date_from": date_from.isoformat(),
+                "date_to": date_to.isoformat(),
+            },
+            queryset=base,
+        ).qs
+        cases.append(
+            _queryset_case(
+                f"{label}: страница за период",
+                windowed[: PLAN_PAGE_SIZE + 1],
+            )
+        )
+        cases.append(_total_case(f"{label}: сумма за период", windowed))
+
+    term = search_term(middle["comment"])
+    if term:
+        found = CashflowFilter({"q": term}, queryset=base).qs
+        cases.append(
+            _queryset_case(
+                f"поиск «{term}»: страница", found[: PLAN_PAGE_SIZE + 1]
+            )
+        )
+    return cases
+
+
+def pruning_cases(base: QuerySet[Cashflow]) -> list[PruningCase]:
+    """
+    Запросы за период из API (``CashflowFilter``) и интерфейса
+    (``CashflowFilterForm``) для проверки отсечения секций.
+
+    Период — ``PLAN_WINDOW`` до середины последнего дня записей, как в
+    ``plan_cases``; читать разрешено секции его месяцев и секцию по
+    умолчанию (она пуста, пока секции созданы заранее).
+    """
+    latest = (
+        base.order_by("-created_at")
+        .values_list("created_at", flat=True)
+        .first()
+    )
+    if latest is None:
+        return []
+    date_to = timezone.localtime(latest).replace(hour=12, minute=0, second=0)
+    date_from = date_to - PLAN_WINDOW
+    table = Cashflow._meta.db_table
+    allowed = frozenset(
+        [partition_name(table)]
+        + [
+            partition_name(table, month)
+            for month in months_between(date_from, date_to)
+        ]
+    )
+    window = {
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+    }
+
+    api = CashflowFilter(window, queryset=base).qs
+    ui, _ = filter_cashflows(CashflowFilterForm(window))
+    cases = []
+    for label, queryset in (("api", api), ("ui", ui)):
+        for case in (
+            _queryset_case(
+                f"{label}: страница за период",
+                queryset[: PLAN_PAGE_SIZE + 1],
+            ),
+            _total_case(f"{label}: сумма за период", queryset),
+        ):
+            cases.append(
+                PruningCase(case.name, case.sql, case.params, allowed)
+            )
+    return cases
@@ -0,0 +1,295 @@
+"""
+Сводные отчёты по записям ДДС.
+
+Суммы, количество, min/max и сальдо (приход минус расход) с группировкой
+по справочникам и периоду считаются одним GROUP BY запросом в БД. Если
+фильтры укладываются в границы целых дней, запрос идёт в дневной агрегат,
+а не в записи ДДС.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from decimal import Decimal
+from typing import Any, Mapping, Optional
+
+from django.core.cache import cache
+from django.db.models import (
+    Count,
+    DateField,
+    DecimalField,
+    Max,
+    Min,
+    Q,
+    QuerySet,
+    Sum,
+    Value,
+)
+from django.db.models.functions import (
+    Coalesce,
+    TruncDay,
+    TruncMonth,
+    TruncWeek,
+)
+
+from dds_project.metrics import cache_result
+from directories.models import TypeKind
+
+from .models import Cashflow
+from .rollup import data_version, rollup_queryset
+
+# Группировки по справочникам: имя группы -> {ключ в ответе: путь поля}.
+# Пути общие для записей и дневного агрегата; для записей они сокращаются
+# до копий типа и категории (см. ``record_path``).
+GROUPINGS: dict[str, dict[str, str]] = {
+    "type": {
+        "type_id": "subcategory__category__type_id",
+        "type_name": "subcategory__category__type__name",
+    },
+    "category": {
+        "category_id": "subcategory__category_id",
+        "category_name": "subcategory__category__name",
+    },
+    "subcategory": {
+        "subcategory_id": "subcategory_id",
+        "subcategory_name": "subcategory__name",
+    },
+    "status": {
+        "status_id": "status_id",
+        "status_name": "status__name",
+    },
+}
+
+# Группировки по периоду (не более одной в запросе)
+PERIODS = {
+    "day": TruncDay,
+    "week": TruncWeek,
+    "month": TruncMonth,
+}
+
+MONEY_FIELDS = ("total", "min", "max", "income", "outcome", "net")
+
+# Сколько секунд держать итоги выборки в кэше (изменения записей
+# сбрасывают кэш раньше — через версию данных)
+TOTALS_CACHE_TIMEOUT = 30
+
+# Пути через подкатегорию -> поля, продублированные в записи ДДС
+RECORD_PATHS = (
+    ("subcategory__category__type", "type"),
+    ("subcategory__category", "category"),
+)
+
+
+def record_path(path: str) -> str:
+    """Путь поля для записей ДДС: тип и категория берутся без JOIN."""
+    for prefix, direct in RECORD_PATHS:
+        if path == prefix or path.startswith(prefix + "_"):
+            return direct + path[len(prefix):]
+    return path
+
+
+def parse_group_by(raw: str | None) -> list[str]:
+    """
+    Разбирает параметр ``group_by`` вида ``type,status,month``.
+
+    Args:
+        raw (str | None): значение параметра.
+    Returns:
+        list[str]: группировки без повторов в исходном порядке.
+    Raises:
+        ValueError: неизвестная группировка или несколько периодов.
+    """
+    groups: list[str] = []
+    for name in (raw or "").split(","):
+        name = name.strip()
+        if not name or name in groups:
+            continue
+        if name not in GROUPINGS and name not in PERIODS:
+            allowed = ", ".join([*GROUPINGS, *PERIODS])
+            raise ValueError(
+                f"Неизвестная группировка «{name}». Допустимо: {allowed}."
+            )
+        groups.append(name)
+    if sum(name in PERIODS for name in groups) > 1:
+        raise ValueError(
+            "Допускается только один период: day, week или month."
+        )
+    return groups
+
+
+def _money(expression) -> Coalesce:
+    return Coalesce(
+        expression,
+        Value(Decimal("0.00")),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def summary_aggregates(rollup: bool = False) -> dict[str, Any]:
+    """
+    Агрегаты сводки: количество, сумма, min/max, приход, расход, сальдо.
+
+    Args:
+        rollup (bool): агрегируем строки дневного агрегата, а не записи.
+    """
+    amount = "total_amount" if rollup else "amount"
+    kind = "subcategory__category__type__kind"
+    if not rollup:
+        kind = record_path(kind)
+    income = Sum(amount, filter=Q(**{kind: TypeKind.INCOME}))
+    outcome = Sum(amount, filter=Q(**{kind: TypeKind.OUTCOME}))
+    return {
+        "count": (
+            Coalesce(Sum("records_count"), Value(0))
+            if rollup
+            else Count("id")
+        ),
+        "total": _money(Sum(amount)),
+        "min": Min("min_amount" if rollup else "amount"),
+        "max": Max("max_amount" if rollup else "amount"),
+        "income": _money(income),
+        "outcome": _money(outcome),
+        "net": _money(income) - _money(outcome),
+    }
+
+
+def _format(
+    row: dict[str, Any], renames: dict[str, str] | None = None
+) -> dict[str, Any]:
+    if renames:
+        row = {renames.get(key, key): value for key, value in row.items()}
+    for key in MONEY_FIELDS:
+        if row.get(key) is not None:
+            row[key] = f"{row[key]:.2f}"
+    return row
+
+
+def _source(
+    queryset: QuerySet[Cashflow],
+    filters: Optional[Mapping[str, Any]],
+) -> tuple[QuerySet, bool]:
+    """Выборка для агрегатов: дневной агрегат, если фильтры позволяют."""
+    rollup = rollup_queryset(filters) if filters is not None else None
+    if rollup is not None:
+        return rollup.order_by(), True
+    return queryset.order_by(), False
+
+
+def _summary_query(
+    queryset: QuerySet[Cashflow],
+    group_by: list[str],
+    filters: Optional[Mapping[str, Any]],
+) -> tuple[QuerySet, dict[str, Any], Optional[dict[str, str]]]:
+    """
+    Запрос сводки: выборка, агрегаты и переименования колонок.
+
+    Без группировок переименований нет (None) — нужен ``aggregate``.
+    """
+    qs, rollup = _source(queryset, filters)
+    date_field = "day" if rollup else "created_at"
+    aggregates = summary_aggregates(rollup=rollup)
+
+    if not group_by:
+        return qs, aggregates, None
+
+    fields: list[str] = []
+    periods: dict[str, Any] = {}
+    renames: dict[str, str] = {}
+    for name in group_by:
+        if name in PERIODS:
+            periods["period"] = PERIODS[name](
+                date_field, output_field=DateField()
+            )
+            continue
+        for key, path in GROUPINGS[name].items():
+            if not rollup:
+                path = record_path(path)
+            fields.append(path)
+            renames[path] = key
+
+    rows = (
+        qs.values(*fields, **periods)
+        .annotate(**aggregates)
+        .order_by(*periods, *fields)
+    )
+    return rows, aggregates, renames
+
+
+def summarize(
+    queryset: QuerySet[Cashflow],
+    group_by: list[str],
+    filters: Optional[Mapping[str, Any]] = None,
+) -> list[dict[str, Any]]:
+    """
+    Считает сводку по отфильтрованной выборке одним запросом.
+
+    Args:
+        queryset (QuerySet[Cashflow]): отфильтрованные записи.
+        group_by (list[str]): группировки из ``parse_group_by``.
+        filters (Mapping | None): очищенные фильтры выборки; если они
+            укладываются в целые дни, сводка читается из агрегата.
+    Returns:
+        list[dict]: строки сводки; без группировок — одна строка итогов.
+    """
+    qs, aggregates, renames = _summary_query(queryset, group_by, filters)
+    if renames is None:
+        return [_format(qs.aggregate(**aggregates))]
+    return [_format(row, renames) for row in qs]
+
+
+async def asummarize(
+    queryset: QuerySet[Cashflow],
+    group_by: list[str],
+    filters: Optional[Mapping[str, Any]] = None,
+) -> list[dict[str, Any]]:
+    """Асинхронный ``summarize`` (``aaggregate`` / ``async for``)."""
+    qs, aggregates, renames = _summary_query(queryset, group_by, filters)
+    if renames is None:
+        return [_format(await qs.aaggregate(**aggregates))]
+    return [_format(row, renames) async for row in qs]
+
+
+def selection_summary(
+    queryset: QuerySet[Cashflow],
+    filters: Optional[Mapping[str, Any]] = None,
+) -> dict[str, Any]:
+    """
+    Итоги выборки одним запросом: количество, сумма, min/max, приход,
+    расход и сальдо.
+
+    Результат кэшируется по тексту запроса на ``TOTALS_CACHE_TIMEOUT``
+    секунд; любое изменение записей ДДС сбрасывает кэш.
+
+    Args:
+        queryset (QuerySet[Cashflow]): отфильтрованные записи.
+        filters (Mapping | None): очищенные фильтры выборки; если они
+            укладываются в целые дни, итоги читаются из агрегата.
+    Returns:
+        dict[str, Any]: значения агрегатов (суммы — Decimal).
+    """
+    qs, rollup = _source(queryset, filters)
+    sql, params = qs.query.sql_with_params()
+    digest = hashlib.sha1(f"{sql}|{params!r}".encode()).hexdigest()
+    key = f"cashflow:totals:{data_version()}:{digest}"
+    result = cache.get(key)
+    cache_result("totals", hit=result is not None)
+    if result is None:
+        result = qs.aggregate(**summary_aggregates(rollup=rollup))
+        cache.set(key, result, TOTALS_CACHE_TIMEOUT)
+    return result
+
+
+def selection_total(
+    queryset: QuerySet[Cashflow],
+    filters: Optional[Mapping[str, Any]] = None,
+) -> Decimal:
+    """
+    Сумма по выборке; по агрегату, если фильтры это позволяют.
+
+    Args:
+        queryset (QuerySet[Cashflow]): отфильтрованные записи.
+        filters (Mapping | None): очищенные фильтры выборки.
+    Returns:
+        Decimal: итоговая сумма.
+    """
+    return selection_summary(queryset, filters)["total"]
@@ -0,0 +1,322 @@
+"""
+Дневной агрегат ДДС (день × подкатегория × статус → сумма, количество).
+
+Агрегат поддерживается инкрементально: после любого изменения записей
+пересчитываются только затронутые корзины. Полный пересчёт — командой
+``manage.py rebuild_cashflow_rollup``.
+
+Корзины пересчитываются по записям, поэтому две транзакции, меняющие
+один день, не должны пересчитывать его одновременно: каждая не видит
+незафиксированных записей другой, и зафиксированная позже затёрла бы
+корзину первой. На PostgreSQL пересчёт берёт блокировку дней
+(``pg_advisory_xact_lock``) до конца транзакции и читает записи уже под
+ней — в READ COMMITTED это видит всё, что зафиксировали предыдущие
+владельцы блокировки.
+"""
+
+from __future__ import annotations
+
+import time as clock
+from datetime import date, datetime, time, timedelta
+from typing import Any, Iterable, Mapping, Optional
+
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Count, Max, Min, QuerySet, Sum, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Cashflow, CashflowDailyRollup
+
+# Ключ корзины агрегата: (день, subcategory_id, status_id)
+RollupKey = tuple[date, int, int]
+
+# Поля записи ДДС, от которых зависит агрегат
+ROLLUP_FIELDS = frozenset(
+    {
+        "created_at",
+        "amount",
+        "status",
+        "status_id",
+        "subcategory",
+        "subcategory_id",
+    }
+)
+
+# Фильтры, которые можно ответить по дневным корзинам
+ROLLUP_FILTERS = frozenset(
+    {
+        "date_from",
+        "date_to",
+        "status",
+        "type",
+        "category",
+        "subcategory",
+        "ordering",
+    }
+)
+
+# Блокировки агрегата (pg_advisory_xact_lock): пространство ключей,
+# ключ всего агрегата (дни — порядковые номера дат, начиная с 1) и
+# сколько дней блокировать по отдельности — больше блокируется весь
+# агрегат, чтобы не переполнить таблицу блокировок
+ROLLUP_LOCK_SPACE = 0x0DD5
+ROLLUP_LOCK_ALL = 0
+ROLLUP_LOCK_MAX_DAYS = 62
+
+# Версия данных ДДС в кэше: меняется после любого изменения записей,
+# по ней сбрасываются закэшированные итоги
+DATA_VERSION_KEY = "cashflow:data-version"
+
+
+def data_version() -> int:
+    """Текущая версия данных ДДС."""
+    return cache.get(DATA_VERSION_KEY, 0)
+
+
+def bump_data_version() -> None:
+    """Отмечает, что записи ДДС изменились."""
+    cache.set(DATA_VERSION_KEY, clock.time_ns(), timeout=None)
+
+
+def local_day(value: datetime) -> date:
+    """День операции в текущем часовом поясе."""
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def bucket_key(
+    created_at: Optional[datetime],
+    subcategory_id: Optional[int],
+    status_id: Optional[int],
+) -> Optional[RollupKey]:
+    """Ключ корзины для записи или None, если запись неполная."""
+    if created_at is None or subcategory_id is None or status_id is None:
+        return None
+    return local_day(created_at), subcategory_id, status_id
+
+
+def bucket_keys(
+    queryset: QuerySet[Cashflow], values: Optional[Mapping[str, Any]] = None
+) -> set[RollupKey]:
+    """
+    Корзины, которые затрагивает выборка (один DISTINCT запрос).
+
+    Args:
+        queryset (QuerySet[Cashflow]): записи.
+        values (Mapping | None): аргументы ``update``: корзины берутся для
+            новых значений полей — выражения вычисляются по тем же
+            строкам, что и в UPDATE, поэтому запрос делается до него.
+    """
+    columns: list[Any] = ["created_at", "subcategory_id", "status_id"]
+    for index, name in enumerate(("created_at", "subcategory", "status")):
+        for key in (name, f"{name}_id"):
+            if key not in (values or {}):
+                continue
+            value = values[key]
+            if not hasattr(value, "resolve_expression"):
+                value = Value(getattr(value, "pk", value))
+            columns[index] = value
+    created_at, subcategory, status = columns
+    rows = (
+        queryset.order_by()
+        .values_list(TruncDate(created_at), subcategory, status)
+        .distinct()
+    )
+    return set(rows)
+
+
+def lock_days(days: Optional[Iterable[date]] = None) -> None:
+    """
+    Блокирует дни агрегата до конца транзакции (только PostgreSQL).
+
+    Дни блокируются по возрастанию вместе с разделяемой блокировкой
+    всего агрегата, а больше ``ROLLUP_LOCK_MAX_DAYS`` дней (или весь
+    агрегат, ``days=None``) — исключительной блокировкой агрегата.
+    Один запрос: ветви UNION ALL выполняются по порядку.
+
+    Args:
+        days (Iterable[date] | None): дни или None — весь агрегат.
+    """
+    connection = connections[router.db_for_write(CashflowDailyRollup)]
+    if connection.vendor != "postgresql":
+        return
+    ordinals = sorted({day.toordinal() for day in days or ()})
+    with connection.cursor() as cursor:
+        if days is None or len(ordinals) > ROLLUP_LOCK_MAX_DAYS:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(%s, %s)",
+                [ROLLUP_LOCK_SPACE, ROLLUP_LOCK_ALL],
+            )
+            return
+        cursor.execute(
+            "SELECT 1 FROM pg_advisory_xact_lock_shared(%s, %s) "
+            "UNION ALL "
+            "SELECT 1 FROM (SELECT unnest(%s::int[]) AS day ORDER BY 1) d, "
+            "LATERAL pg_advisory_xact_lock(%s, d.day)",
+            [
+                ROLLUP_LOCK_SPACE,
+                ROLLUP_LOCK_ALL,
+                ordinals,
+                ROLLUP_LOCK_SPACE,
+            ],
+        )
+
+
+def _day_bounds(first: date, last: date) -> tuple[datetime, datetime]:
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(first, time.min), tz)
+    end = timezone.make_aware(
+        datetime.combine(last + timedelta(days=1), time.min), tz
+    )
+    return start, end
+
+
+def _aggregate_rows(queryset: QuerySet[Cashflow]) -> QuerySet:
+    return (
+        queryset.order_by()
+        .values("subcategory_id", "status_id", day=TruncDate("created_at"))
+        .annotate(
+            total_amount=Sum("amount"),
+            records_count=Count("id"),
+            min_amount=Min("amount"),
+            max_amount=Max("amount"),
+        )
+    )
+
+
+def refresh_buckets(keys: Iterable[Optional[RollupKey]]) -> None:
+    """
+    Пересчитывает корзины агрегата по исходным записям.
+
+    Пересчитывается прямоугольник «дни × подкатегории × статусы»,
+    покрывающий переданные ключи: удаляем его строки и вставляем заново.
+    Записи читаются под блокировкой дней (``lock_days``).
+
+    Args:
+        keys (Iterable[RollupKey | None]): затронутые корзины.
+    """
+    keys = {key for key in keys if key is not None}
+    if not keys:
+        return
+    transaction.on_commit(bump_data_version)
+
+    days = {key[0] for key in keys}
+    subcategories = {key[1] for key in keys}
+    statuses = {key[2] for key in keys}
+    start, end = _day_bounds(min(days), max(days))
+
+    source = Cashflow.objects.filter(
+        created_at__gte=start,
+        created_at__lt=end,
+        subcategory_id__in=subcategories,
+        status_id__in=statuses,
+    )
+
+    with transaction.atomic():
+        lock_days(days)
+        rollups = [
+            CashflowDailyRollup(**row)
+            for row in _aggregate_rows(source)
+            if row["day"] in days
+        ]
+        CashflowDailyRollup.objects.filter(
+            day__in=days,
+            subcategory_id__in=subcategories,
+            status_id__in=statuses,
+        ).delete()
+        CashflowDailyRollup.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=["day", "subcategory", "status"],
+            update_fields=[
+                "total_amount",
+                "records_count",
+                "min_amount",
+                "max_amount",
+            ],
+        )
+
+
+def rebuild(batch_size: int = 5000) -> int:
+    """
+    Полностью пересобирает агрегат.
+
+    Returns:
+        int: количество корзин.
+    """
+    created = 0
+    with transaction.atomic():
+        lock_days()
+        CashflowDailyRollup.objects.all().delete()
+        batch: list[CashflowDailyRollup] = []
+        rows = _aggregate_rows(Cashflow.objects.all())
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(CashflowDailyRollup(**row))
+            if len(batch) >= batch_size:
+                CashflowDailyRollup.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        CashflowDailyRollup.objects.bulk_create(batch)
+        created += len(batch)
+        transaction.on_commit(bump_data_version)
+    return created
+
+
+def _filter_id(value: Any) -> int:
+    return int(getattr(value, "pk", value))
+
+
+def _is_day_start(value: datetime) -> bool:
+    return timezone.localtime(value).time() == time.min
+
+
+def _is_day_end(value: datetime) -> bool:
+    return timezone.localtime(value).time() == time.max
+
+
+def rollup_queryset(
+    filters: Mapping[str, Any],
+) -> Optional[QuerySet[CashflowDailyRollup]]:
+    """
+    Выборка агрегата, эквивалентная фильтрам записей ДДС.
+
+    Агрегат подходит, если фильтры только по справочникам и границам
+    целых дней: ``date_from`` — начало дня, ``date_to`` — его конец.
+
+    Args:
+        filters (Mapping[str, Any]): очищенные значения фильтров
+            (id или объекты справочников).
+    Returns:
+        QuerySet | None: выборка агрегата или None, если нужны записи.
+    """
+    active = {key: value for key, value in filters.items() if value}
+    if not active.keys() <= ROLLUP_FILTERS:
+        return None
+
+    date_from = active.get("date_from")
+    date_to = active.get("date_to")
+    if date_from and not _is_day_start(date_from):
+        return None
+    if date_to and not _is_day_end(date_to):
+        return None
+
+    qs = CashflowDailyRollup.objects.all()
+    if date_from:
+        qs = qs.filter(day__gte=local_day(date_from))
+    if date_to:
+        qs = qs.filter(day__lte=local_day(date_to))
+    if "status" in active:
+        qs = qs.filter(status_id=_filter_id(active["status"]))
+    if "subcategory" in active:
+        qs = qs.filter(subcategory_id=_filter_id(active["subcategory"]))
+    if "category" in active:
+        qs = qs.filter(
+            subcategory__category_id=_filter_id(active["category"])
+        )
+    if "type" in active:
+        qs = qs.filter(
+            subcategory__category__type_id=_filter_id(active["type"])
+        )
+    return qs
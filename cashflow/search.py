@@ -0,0 +1,56 @@
+"""
+Поиск записей ДДС по комментарию.
+
+Каждое слово запроса ищется подстрокой без учёта регистра
+(``UPPER(comment) LIKE UPPER('%слово%')``) — на PostgreSQL такие условия
+обслуживает триграммный GIN-индекс ``cf_comment_trgm`` (``pg_trgm``), в
+том числе поиск в админке. Результаты сортируются по близости слов
+запроса к комментарию (``word_similarity``), затем по дате.
+"""
+
+from __future__ import annotations
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections
+from django.db.models import FloatField, QuerySet
+from django.db.models.functions import Cast
+
+from .models import Cashflow
+
+# Сортировка найденных записей: по релевантности, затем как список
+SEARCH_ORDERING = ("-rank", "-created_at", "-id")
+
+
+def search_terms(query: str) -> list[str]:
+    """Слова запроса без повторов."""
+    return list(dict.fromkeys(query.split()))
+
+
+def search_cashflows(
+    queryset: QuerySet[Cashflow], query: str, rank: bool = True
+) -> QuerySet[Cashflow]:
+    """
+    Записи, в комментарии которых есть все слова запроса.
+
+    Args:
+        queryset (QuerySet[Cashflow]): исходная выборка.
+        query (str): строка поиска.
+        rank (bool): отсортировать по релевантности (аннотация ``rank``,
+            только PostgreSQL).
+    Returns:
+        QuerySet[Cashflow]: отфильтрованная выборка.
+    """
+    terms = search_terms(query)
+    for term in terms:
+        queryset = queryset.filter(comment__icontains=term)
+    if not terms or not rank:
+        return queryset
+    if connections[queryset.db].vendor != "postgresql":
+        return queryset
+    # word_similarity возвращает real: в курсор попадает округлённое
+    # значение, равенство с которым не выполняется, поэтому ранг — в
+    # double precision
+    similarity = TrigramWordSimilarity(" ".join(terms), "comment")
+    return queryset.annotate(
+        rank=Cast(similarity, FloatField())
+    ).order_by(*SEARCH_ORDERING)
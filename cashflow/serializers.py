@@ -6,11 +6,36 @@ from __future__ import annotations
 
 from rest_framework import serializers
 
+from directories.cache import get_snapshot, snapshot_for
 from directories.models import Status, Subcategory
 
 from .models import Cashflow
 
 
+class SnapshotRelatedField(serializers.PrimaryKeyRelatedField):
+    """id справочника, проверяемый по снимку в памяти без запроса к БД.
+
+    id, которого нет в снимке, сверяется с БД (снимок мог отстать).
+    ``queryset`` нужен только для схемы и browsable API.
+    """
+
+    def __init__(self, lookup: str, **kwargs) -> None:
+        self.lookup = lookup
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        obj = getattr(snapshot_for({self.lookup: [pk]}), self.lookup)(pk)
+        if obj is None:
+            self.fail("does_not_exist", pk_value=data)
+        return obj
+
+
 class CashflowSerializer(serializers.ModelSerializer):
     """CRUD сериализатор для Cashflow.
 
@@ -18,14 +43,12 @@ class CashflowSerializer(serializers.ModelSerializer):
     На чтение дополнительно отдаём вычисляемые: category, type.
     """
 
-    status = serializers.PrimaryKeyRelatedField(queryset=Status.objects.all())
-    subcategory = serializers.PrimaryKeyRelatedField(
-        queryset=Subcategory.objects.select_related(
-            "category", "category__type"
-        ).all()
+    status = SnapshotRelatedField("status", queryset=Status.objects.all())
+    subcategory = SnapshotRelatedField(
+        "subcategory", queryset=Subcategory.objects.all()
     )
 
-    # read-only поля, вычисляются через связи
+    # read-only поля: названия из снимка справочников, без запроса к БД
     category = serializers.SerializerMethodField(read_only=True)
     type = serializers.SerializerMethodField(read_only=True)
 
@@ -45,10 +68,69 @@ class CashflowSerializer(serializers.ModelSerializer):
 
     def get_category(self, obj: Cashflow) -> dict | None:
         """Возвращает категорию как словарь."""
-        cat = obj.category
+        cat = get_snapshot().category(obj.category_id)
         return {"id": cat.id, "name": cat.name} if cat else None
 
     def get_type(self, obj: Cashflow) -> dict | None:
         """Возвращает тип как словарь."""
-        t = obj.type
+        t = get_snapshot().type(obj.type_id)
         return {"id": t.id, "name": t.name} if t else None
+
+
+# Максимум строк в одном массовом запросе
+BULK_MAX_ROWS = 10_000
+
+
+class CashflowBulkRowSerializer(serializers.Serializer):
+    """Строка массовой загрузки записей ДДС.
+
+    Статус и подкатегория передаются id и сверяются с множествами,
+    загруженными один раз на запрос (``context["status_ids"]``,
+    ``context["subcategory_ids"]``), без запроса к БД на каждую строку.
+    """
+
+    id = serializers.IntegerField(required=False)
+    created_at = serializers.DateTimeField(required=False)
+    status = serializers.IntegerField()
+    subcategory = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    comment = serializers.CharField(
+        required=False, allow_blank=True, default=""
+    )
+
+    def validate_status(self, value: int) -> int:
+        """Проверяет, что статус существует."""
+        if value not in self.context["status_ids"]:
+            raise serializers.ValidationError("Статус не найден.")
+        return value
+
+    def validate_subcategory(self, value: int) -> int:
+        """Проверяет, что подкатегория существует."""
+        if value not in self.context["subcategory_ids"]:
+            raise serializers.ValidationError("Подкатегория не найдена.")
+        return value
+
+    def validate(self, attrs: dict) -> dict:
+        """
+        При обновлении (partial) строка должна содержать id,
+        при создании id задаётся автоматически.
+        """
+        if self.partial and "id" not in attrs:
+            raise serializers.ValidationError(
+                {"id": ["Обязательное поле."]}
+            )
+        if not self.partial and "id" in attrs:
+            raise serializers.ValidationError(
+                {"id": ["При создании id не передаётся."]}
+            )
+        return attrs
+
+
+class CashflowBulkDeleteSerializer(serializers.Serializer):
+    """Список id записей ДДС для массового удаления."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=BULK_MAX_ROWS,
+    )
@@ -0,0 +1,63 @@
+"""
+Сигналы записей ДДС.
+"""
+
+from __future__ import annotations
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from directories.models import Category, Subcategory
+
+from .models import Cashflow, fill_hierarchy
+from .rollup import refresh_buckets
+
+
+@receiver(post_save, sender=Cashflow)
+def refresh_rollup_on_raw_save(
+    sender, instance: Cashflow, raw: bool, **kwargs
+) -> None:
+    """
+    Обновляет агрегат и копии категории/типа при загрузке фикстур
+    (``loaddata``).
+
+    Фикстуры сохраняются в обход ``Cashflow.save``; обычные сохранения
+    делают это сами.
+    """
+    if raw:
+        fill_hierarchy([instance])
+        Cashflow.objects.filter(pk=instance.pk).update(
+            category_id=instance.category_id, type_id=instance.type_id
+        )
+        refresh_buckets([instance.rollup_key])
+
+
+@receiver(post_save, sender=Subcategory)
+def move_cashflows_with_subcategory(
+    sender, instance: Subcategory, created: bool, **kwargs
+) -> None:
+    """Переносит записи ДДС вслед за подкатегорией в другую категорию."""
+    if created:
+        return
+    type_id = (
+        Category.objects.filter(pk=instance.category_id)
+        .values_list("type_id", flat=True)
+        .first()
+    )
+    if type_id is None:
+        return
+    Cashflow.objects.filter(subcategory_id=instance.pk).exclude(
+        category_id=instance.category_id, type_id=type_id
+    ).update(category_id=instance.category_id, type_id=type_id)
+
+
+@receiver(post_save, sender=Category)
+def move_cashflows_with_category(
+    sender, instance: Category, created: bool, **kwargs
+) -> None:
+    """Переносит записи ДДС вслед за категорией в другой тип."""
+    if created:
+        return
+    Cashflow.objects.filter(category_id=instance.pk).exclude(
+        type_id=instance.type_id
+    ).update(type_id=instance.type_id)
@@ -0,0 +1,1112 @@
+"""
+Тесты записей ДДС: бюджет SQL-запросов админки, массовые действия и
+поведение модулей приложения.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time as clock
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+from xml.etree import ElementTree
+
+from django.contrib.admin import helpers
+from django.core import serializers
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.models import F, Value
+from django.test import (
+    LiveServerTestCase,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from dds_project.testing import (
+    QueryBudgetTestCase,
+    create_cashflows,
+    create_directories,
+    create_statuses,
+    expected_rollup_rows,
+    rollup_rows,
+)
+from directories.cache import get_snapshot
+from directories.models import Category, Subcategory, Type, TypeKind
+
+from . import importer
+from .admin import SnapshotListFilter
+from .counts import cheap_count
+from .export import ExportFormatError, export_response
+from .keyset import KeysetPaginator
+from .lean import lean_queryset, lean_rows
+from .models import Cashflow, CashflowDailyRollup, CashflowImportProgress
+from .partitioning import (
+    add_months,
+    convert_to_plain,
+    is_partitioned,
+    month_of,
+    partition_name,
+    partition_rows,
+)
+from .plans import pruning_cases
+from .reports import selection_summary
+from .rollup import rebuild
+from .search import search_cashflows
+from .serializers import CashflowSerializer
+from .xlsx import XLSX_FLUSH_ROWS, stream_xlsx
+
+try:
+    import openpyxl
+except ImportError:  # openpyxl нужен только для проверки XLSX читателем
+    openpyxl = None
+
+# Запросов на страницу списка админки: сессия, пользователь, подсчёт,
+# строки страницы и месяцы фильтра (после изменения данных, дальше —
+# из кэша)
+ADMIN_CHANGELIST_QUERIES = 5
+
+# Запросов на массовое действие: сессия, пользователь, подсчёт строк
+# списка, транзакции, корзины агрегата до и после, сам UPDATE/DELETE и
+# пересчёт корзин (с блокировкой дней)
+ADMIN_BULK_ACTION_QUERIES = 16
+
+# Главная админки: сессия, пользователь и последние действия
+ADMIN_INDEX_QUERIES = 3
+
+# Форма записи: сессия, пользователь, запись и варианты статуса и
+# подкатегории (вместе с категориями)
+ADMIN_FORM_QUERIES = 5
+
+# Подтверждение удаления: сессия, пользователь и запись (связей,
+# которые удалялись бы вместе с ней, нет)
+ADMIN_DELETE_QUERIES = 3
+
+
+class CashflowAdminTests(QueryBudgetTestCase):
+    """Страницы записей в админке: число запросов не зависит от строк."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.url = reverse("admin:cashflow_cashflow_changelist")
+
+    def test_changelist_query_count_is_fixed(self) -> None:
+        self.assertQueryBudget(
+            ADMIN_CHANGELIST_QUERIES, lambda: self.client.get(self.url)
+        )
+
+    def test_changelist_filters_query_count(self) -> None:
+        params = {
+            "month": timezone.localdate().strftime("%Y-%m"),
+            "status": self.statuses[0].pk,
+            "type": self.subcategories[0].category.type_id,
+            "q": "запись",
+        }
+        self.assertQueryBudget(
+            ADMIN_CHANGELIST_QUERIES,
+            lambda: self.client.get(self.url, params),
+        )
+
+    def test_index(self) -> None:
+        url = reverse("admin:index")
+        self.assertQueryBudget(
+            ADMIN_INDEX_QUERIES, lambda: self.client.get(url)
+        )
+
+    def test_add_and_change_forms(self) -> None:
+        add_url = reverse("admin:cashflow_cashflow_add")
+        self.assertQueryBudget(
+            ADMIN_FORM_QUERIES, lambda: self.client.get(add_url)
+        )
+
+        def change_form():
+            pk = self.cashflows[-1].pk
+            return self.client.get(
+                reverse("admin:cashflow_cashflow_change", args=[pk])
+            )
+
+        self.assertQueryBudget(ADMIN_FORM_QUERIES, change_form)
+
+    def test_delete_confirmation(self) -> None:
+        def delete_form():
+            pk = self.cashflows[-1].pk
+            return self.client.get(
+                reverse("admin:cashflow_cashflow_delete", args=[pk])
+            )
+
+        self.assertQueryBudget(ADMIN_DELETE_QUERIES, delete_form)
+
+
+class SnapshotListFilterTests(SimpleTestCase):
+    """Подкласс фильтра без колонки или вариантов не объявить."""
+
+    def test_requires_field_name(self) -> None:
+        with self.assertRaisesMessage(ImproperlyConfigured, "field_name"):
+
+            class NoField(SnapshotListFilter):
+                def objects(self, request, snapshot):
+                    return snapshot.statuses.values()
+
+    def test_requires_objects(self) -> None:
+        with self.assertRaisesMessage(ImproperlyConfigured, "objects()"):
+
+            class NoObjects(SnapshotListFilter):
+                field_name = "status_id"
+
+
+class CashflowAdminBulkActionTests(QueryBudgetTestCase):
+    """Массовые действия админки: один запрос на любое число записей."""
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.url = reverse("admin:cashflow_cashflow_changelist")
+
+    def run_action(self, action: str, **data):
+        """Возвращает запрос, выполняющий действие над всей выборкой."""
+        payload = {"action": action, "select_across": "1", "index": "0"}
+        payload[helpers.ACTION_CHECKBOX_NAME] = ["0"]
+
+        def request():
+            return self.client.post(
+                self.url, {**payload, "apply": "1", **data}
+            )
+
+        # первый POST (без apply) — страница подтверждения
+        response = self.client.post(self.url, payload)
+        self.assertEqual(response.status_code, 200)
+        return request
+
+    def test_change_status_query_count_is_fixed(self) -> None:
+        status = self.statuses[1]
+        response = self.assertQueryBudget(
+            ADMIN_BULK_ACTION_QUERIES,
+            self.run_action("change_status", status=status.pk),
+            status=302,
+        )
+
+        self.assertRedirects(response, self.url)
+        self.assertFalse(Cashflow.objects.exclude(status=status).exists())
+
+    def test_change_subcategory_moves_hierarchy_and_rollup(self) -> None:
+        self.grow(10)
+        subcategory = self.subcategories[-1]
+        self.run_action("change_subcategory", subcategory=subcategory.pk)()
+
+        self.assertEqual(
+            set(
+                Cashflow.objects.values_list(
+                    "subcategory_id", "category_id", "type_id"
+                )
+            ),
+            {
+                (
+                    subcategory.pk,
+                    subcategory.category_id,
+                    subcategory.category.type_id,
+                )
+            },
+        )
+        self.assertEqual(
+            set(
+                CashflowDailyRollup.objects.values_list(
+                    "subcategory_id", flat=True
+                )
+            ),
+            {subcategory.pk},
+        )
+
+    def test_delete_rows(self) -> None:
+        self.grow(10)
+        self.run_action("delete_rows")()
+
+        self.assertFalse(Cashflow.objects.exists())
+        self.assertFalse(CashflowDailyRollup.objects.exists())
+
+
+class CashflowSearchTests(TestCase):
+    """Поиск по комментарию (``?q=``) и индекс ``cf_comment_trgm``."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        comments = [
+            "Оплата аренды офиса",
+            "аренда склада",
+            "Оплата связи",
+            "возврат за аренду офиса",
+            "",
+        ]
+        create_cashflows(
+            len(comments),
+            create_directories()[:1],
+            create_statuses()[:1],
+            comment=comments,
+        )
+
+    def comments(self, query: str, **kwargs) -> set[str]:
+        found = search_cashflows(Cashflow.objects.all(), query, **kwargs)
+        return {obj.comment for obj in found}
+
+    def test_all_words_match(self) -> None:
+        self.assertEqual(
+            self.comments("офис аренд"),
+            {"Оплата аренды офиса", "возврат за аренду офиса"},
+        )
+        self.assertEqual(self.comments("Оплата связи"), {"Оплата связи"})
+        self.assertEqual(self.comments("нет такого"), set())
+
+    @skipUnless(
+        connection.vendor == "postgresql",
+        "LIKE в SQLite не различает регистр только для ASCII",
+    )
+    def test_ignores_case(self) -> None:
+        self.assertEqual(
+            self.comments("ОФИС оплата", rank=False),
+            {"Оплата аренды офиса"},
+        )
+
+    def test_empty_query_keeps_queryset(self) -> None:
+        self.assertEqual(len(self.comments("  ")), Cashflow.objects.count())
+
+    @skipUnless(connection.vendor == "postgresql", "pg_trgm — PostgreSQL")
+    def test_ranked_by_similarity(self) -> None:
+        found = search_cashflows(Cashflow.objects.all(), "аренда")
+        self.assertEqual(found[0].comment, "аренда склада")
+        ranks = [obj.rank for obj in found]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+
+    @skipUnless(connection.vendor == "postgresql", "pg_trgm — PostgreSQL")
+    def test_ranked_pages_do_not_skip_or_repeat(self) -> None:
+        queryset = search_cashflows(Cashflow.objects.all(), "аренд")
+        paginator = KeysetPaginator(queryset, page_size=1)
+        seen, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            seen += [obj.pk for obj in page.object_list]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, [obj.pk for obj in queryset])
+
+    @skipUnless(connection.vendor == "postgresql", "pg_trgm — PostgreSQL")
+    def test_trigram_index_exists(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexdef FROM pg_indexes "
+                "WHERE indexname = 'cf_comment_trgm'"
+            )
+            (indexdef,) = cursor.fetchone()
+        self.assertIn("gin_trgm_ops", indexdef)
+        self.assertIn("upper", indexdef.lower())
+
+
+class RollupTests(TestCase):
+    """Дневной агрегат совпадает с записями после любых изменений."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.subcategories = create_directories()
+        cls.statuses = create_statuses()
+
+    def setUp(self) -> None:
+        self.objects = create_cashflows(
+            12, self.subcategories[:2], self.statuses
+        )
+        # две записи в одной корзине
+        self.objects[0].created_at = self.objects[2].created_at
+        self.objects[0].subcategory = self.objects[2].subcategory
+        self.objects[0].status = self.objects[2].status
+        self.objects[0].save()
+
+    def assertRollupMatches(self) -> None:
+        self.assertEqual(rollup_rows(), expected_rollup_rows())
+
+    def test_bulk_create_and_save(self) -> None:
+        self.assertRollupMatches()
+        obj = self.objects[3]
+        obj.amount = Decimal("1.00")
+        obj.created_at -= timedelta(days=30)
+        obj.subcategory = self.subcategories[5]
+        obj.save()
+        self.assertRollupMatches()
+
+    def test_delete(self) -> None:
+        self.objects[0].delete()
+        self.assertRollupMatches()
+        Cashflow.objects.filter(status=self.statuses[0]).delete()
+        self.assertRollupMatches()
+
+    def test_update_with_values(self) -> None:
+        Cashflow.objects.filter(status=self.statuses[0]).update(
+            status=self.statuses[1], amount=Decimal("5.00")
+        )
+        self.assertRollupMatches()
+
+    def test_update_with_expressions(self) -> None:
+        qs = Cashflow.objects.filter(amount__lt=Decimal("106.00"))
+        qs.update(
+            created_at=F("created_at") - timedelta(days=3),
+            amount=F("amount") * 2,
+        )
+        self.assertRollupMatches()
+
+        subcategory = self.subcategories[-1]
+        Cashflow.objects.filter(status=self.statuses[1]).update(
+            subcategory_id=Value(subcategory.pk)
+        )
+        self.assertRollupMatches()
+        self.assertEqual(
+            set(
+                Cashflow.objects.filter(status=self.statuses[1])
+                .values_list("category_id", "type_id")
+                .distinct()
+            ),
+            {(subcategory.category_id, subcategory.category.type_id)},
+        )
+
+    def test_expression_update_keeps_query_count(self) -> None:
+        def update() -> int:
+            with CaptureQueriesContext(connection) as ctx:
+                Cashflow.objects.update(amount=F("amount") + 1)
+            return len(ctx.captured_queries)
+
+        # корзины считаются запросом, а не по списку id записей
+        small = update()
+        create_cashflows(50, self.subcategories, self.statuses)
+        self.assertEqual(update(), small)
+        self.assertRollupMatches()
+
+    def test_rebuild(self) -> None:
+        CashflowDailyRollup.objects.all().delete()
+        self.assertEqual(rebuild(), len(expected_rollup_rows()))
+        self.assertRollupMatches()
+
+
+@skipUnless(connection.vendor == "postgresql", "блокировки — PostgreSQL")
+class RollupConcurrencyTests(TransactionTestCase):
+    """Параллельные транзакции в одной корзине не затирают друг друга."""
+
+    def test_concurrent_inserts_into_one_bucket(self) -> None:
+        subcategory = create_directories()[0]
+        status = create_statuses()[0]
+        created_at = timezone.now()
+        barrier = threading.Barrier(2, timeout=10)
+        errors = []
+
+        def insert(first: bool) -> None:
+            try:
+                with transaction.atomic():
+                    if not first:
+                        barrier.wait()
+                    Cashflow.objects.create(
+                        created_at=created_at,
+                        status=status,
+                        subcategory=subcategory,
+                        amount=Decimal("10.00"),
+                    )
+                    if first:
+                        # вторая транзакция пишет в ту же корзину, пока
+                        # первая не зафиксирована
+                        barrier.wait()
+                        clock.sleep(0.3)
+            except Exception as exc:  # pragma: no cover - в отчёт теста
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=insert, args=(first,))
+            for first in (True, False)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        (bucket,) = CashflowDailyRollup.objects.all()
+        self.assertEqual(
+            (bucket.records_count, bucket.total_amount),
+            (2, Decimal("20.00")),
+        )
+        self.assertEqual(rollup_rows(), expected_rollup_rows())
+
+
+class ExportTests(TestCase):
+    """Выгрузка записей ДДС в CSV, JSON Lines и XLSX."""
+
+    comments = ["=1+1", "-2", "@SUM(A1)", "обычный"]
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        count = len(cls.comments)
+        create_cashflows(
+            count,
+            create_directories()[:1],
+            create_statuses()[:1],
+            step=timedelta(hours=1),
+            amount=[Decimal("-5.50") + index for index in range(count)],
+            comment=cls.comments,
+        )
+
+    def content(self, file_format: str) -> bytes:
+        response = export_response(Cashflow.objects.all(), file_format)
+        self.assertIn("attachment", response["Content-Disposition"])
+        return b"".join(response.streaming_content)
+
+    def test_csv_escapes_formulas(self) -> None:
+        text = self.content("csv").decode("utf-8-sig")
+        header, *rows = list(csv.reader(io.StringIO(text)))
+
+        self.assertEqual(header[-1], "Комментарий")
+        self.assertEqual(
+            [row[-1] for row in rows],
+            ["'=1+1", "'-2", "'@SUM(A1)", "обычный"],
+        )
+        # отрицательная сумма — число, а не текст
+        self.assertEqual(rows[0][-2], "-5.50")
+
+    def test_jsonl_keeps_values(self) -> None:
+        lines = self.content("jsonl").decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+
+        self.assertEqual([row["comment"] for row in rows], self.comments)
+        self.assertEqual(rows[0]["amount"], "-5.50")
+        self.assertEqual(rows[0]["type"], "Пополнение")
+
+    def test_xlsx_is_valid_workbook_without_formulas(self) -> None:
+        archive = zipfile.ZipFile(io.BytesIO(self.content("xlsx")))
+        self.assertIsNone(archive.testzip())
+        sheet = ElementTree.fromstring(
+            archive.read("xl/worksheets/sheet1.xml")
+        )
+        ns = {"x": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+        rows = sheet.findall(".//x:row", ns)
+        self.assertEqual(len(rows), len(self.comments) + 1)
+        self.assertEqual(sheet.findall(".//x:f", ns), [])
+        texts = [
+            row.findall("x:c", ns)[-1].findtext(".//x:t", namespaces=ns)
+            for row in rows[1:]
+        ]
+        self.assertEqual(texts, self.comments)
+
+    @skipUnless(openpyxl is not None, "нужен openpyxl")
+    def test_xlsx_opens_in_openpyxl(self) -> None:
+        workbook = openpyxl.load_workbook(io.BytesIO(self.content("xlsx")))
+        sheet = workbook.active
+        header, *rows = sheet.iter_rows()
+
+        self.assertEqual(
+            [cell.value for cell in header],
+            [
+                "ID",
+                "Дата/время",
+                "Тип",
+                "Категория",
+                "Подкатегория",
+                "Статус",
+                "Сумма",
+                "Комментарий",
+            ],
+        )
+        self.assertEqual([row[-1].value for row in rows], self.comments)
+        # формулоподобный текст остаётся текстом
+        self.assertEqual({row[-1].data_type for row in rows}, {"s"})
+        self.assertEqual(rows[0][-2].value, -5.5)
+        cashflow = Cashflow.objects.get(pk=rows[0][0].value)
+        expected = timezone.localtime(cashflow.created_at)
+        self.assertEqual(rows[0][1].number_format, "yyyy-mm-dd hh:mm:ss")
+        self.assertAlmostEqual(
+            rows[0][1].value,
+            expected.replace(tzinfo=None),
+            delta=timedelta(milliseconds=1),
+        )
+
+    @skipUnless(openpyxl is not None, "нужен openpyxl")
+    def test_xlsx_values_in_openpyxl(self) -> None:
+        day = date(2025, 1, 31)
+        moment = datetime(2025, 1, 31, 13, 45, 30)
+        values = [None, True, 7, Decimal("1.25"), day, moment, "a\x01<b>&"]
+        content = b"".join(stream_xlsx([f"c{i}" for i in range(7)], [values]))
+
+        sheet = openpyxl.load_workbook(io.BytesIO(content)).active
+        row = [cell.value for cell in sheet[2]]
+        self.assertEqual(
+            row,
+            [None, True, 7, 1.25, datetime(2025, 1, 31), moment, "a<b>&"],
+        )
+
+    def test_xlsx_streams_before_reading_all_rows(self) -> None:
+        consumed = 0
+        total = XLSX_FLUSH_ROWS * 3
+
+        def rows():
+            nonlocal consumed
+            for index in range(total):
+                consumed += 1
+                yield [index, f"строка {index}"]
+
+        chunks = stream_xlsx(["№", "Текст"], rows())
+        next(chunks)  # служебные части архива
+        next(chunks)  # первая пачка строк листа
+        self.assertLess(consumed, total)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        self.assertIn("xl/worksheets/sheet1.xml", archive.namelist())
+
+    def test_unknown_format(self) -> None:
+        with self.assertRaises(ExportFormatError):
+            export_response(Cashflow.objects.all(), "pdf")
+
+
+class ImportTests(TestCase):
+    """Импорт выписок: отказы и возобновление после сбоя."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.subcategory = create_directories()[0]
+        create_statuses()
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "выписка.csv")
+        self.rejects = os.path.join(tmp.name, "отказы.csv")
+        with open(self.path, "w", encoding="utf-8", newline="") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(
+                ["created_at", "status", "subcategory_id", "amount"]
+            )
+            for index in range(1, 7):
+                status = "нет такого" if index == 3 else "business"
+                writer.writerow(
+                    [f"2025-01-0{index}", status, self.subcategory.pk, index]
+                )
+
+    def run_import(self, *args: str) -> None:
+        call_command(
+            "import_cashflows",
+            self.path,
+            "--batch-size=2",
+            f"--rejects={self.rejects}",
+            *args,
+            stdout=io.StringIO(),
+        )
+
+    def rejected_lines(self) -> list[str]:
+        with open(self.rejects, encoding="utf-8", newline="") as fh:
+            return [row[0] for row in list(csv.reader(fh))[1:]]
+
+    def test_import(self) -> None:
+        self.run_import()
+
+        self.assertEqual(
+            sorted(Cashflow.objects.values_list("amount", flat=True)),
+            [Decimal(amount) for amount in (1, 2, 4, 5, 6)],
+        )
+        self.assertEqual(self.rejected_lines(), ["3"])
+        self.assertFalse(CashflowImportProgress.objects.exists())
+
+    def test_resume_after_crash_does_not_duplicate(self) -> None:
+        save_progress = importer.save_progress
+        calls = 0
+
+        def crash_on_second_batch(*args, **kwargs) -> None:
+            nonlocal calls
+            calls += 1
+            if calls == 2:
+                raise RuntimeError("сбой")
+            save_progress(*args, **kwargs)
+
+        with mock.patch.object(
+            importer, "save_progress", crash_on_second_batch
+        ):
+            with self.assertRaises(RuntimeError):
+                self.run_import()
+        # вторая пачка откатилась вместе с прогрессом
+        self.assertEqual(Cashflow.objects.count(), 2)
+        self.assertEqual(importer.read_progress(os.path.abspath(self.path)), 2)
+
+        self.run_import("--resume")
+
+        self.assertEqual(
+            sorted(Cashflow.objects.values_list("amount", flat=True)),
+            [Decimal(amount) for amount in (1, 2, 4, 5, 6)],
+        )
+        self.assertEqual(self.rejected_lines(), ["3"])
+        self.assertEqual(expected_rollup_rows(), rollup_rows())
+        self.assertFalse(CashflowImportProgress.objects.exists())
+
+
+class HierarchyTests(TestCase):
+    """Копии категории и типа в записях ДДС следуют за подкатегорией."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.subcategories = create_directories()
+        cls.status = create_statuses()[0]
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def create(self, index: int = 0) -> Cashflow:
+        return Cashflow.objects.create(
+            status=self.status,
+            subcategory=self.subcategories[index],
+            amount=Decimal("10.00"),
+        )
+
+    def assertHierarchy(self, cashflow: Cashflow) -> None:
+        cashflow.refresh_from_db()
+        category = Category.objects.get(pk=cashflow.subcategory.category_id)
+        self.assertEqual(cashflow.category_id, category.pk)
+        self.assertEqual(cashflow.type_id, category.type_id)
+
+    def test_save_and_bulk_create(self) -> None:
+        cashflow = self.create(0)
+        self.assertHierarchy(cashflow)
+        cashflow.subcategory = self.subcategories[5]
+        cashflow.save()
+        self.assertHierarchy(cashflow)
+
+        (created,) = Cashflow.objects.bulk_create(
+            [
+                Cashflow(
+                    status=self.status,
+                    subcategory=self.subcategories[3],
+                    amount=Decimal("1.00"),
+                )
+            ]
+        )
+        self.assertHierarchy(created)
+
+    def test_update(self) -> None:
+        cashflow = self.create(0)
+        updates = [
+            {"subcategory": self.subcategories[2]},
+            {"subcategory_id": self.subcategories[6].pk},
+            {"subcategory_id": Value(self.subcategories[1].pk)},
+        ]
+        for kwargs in updates:
+            with self.subTest(kwargs=kwargs):
+                Cashflow.objects.filter(pk=cashflow.pk).update(**kwargs)
+                self.assertHierarchy(cashflow)
+
+    def test_moving_subcategory_moves_cashflows(self) -> None:
+        cashflow = self.create(0)
+        subcategory = self.subcategories[0]
+        subcategory.category = self.subcategories[4].category
+        subcategory.save()
+
+        self.assertHierarchy(cashflow)
+        self.assertEqual(
+            cashflow.type_id, self.subcategories[4].category.type_id
+        )
+
+    def test_moving_category_moves_cashflows(self) -> None:
+        cashflow = self.create(0)
+        category = self.subcategories[0].category
+        category.type = Type.objects.exclude(pk=category.type_id).get()
+        category.save()
+
+        self.assertHierarchy(cashflow)
+        self.assertEqual(cashflow.type_id, category.type_id)
+
+    def test_stale_snapshot(self) -> None:
+        get_snapshot()
+        # перенос в другом процессе: версия снимка здесь не меняется
+        Subcategory.objects.filter(pk=self.subcategories[0].pk).update(
+            category=self.subcategories[4].category
+        )
+
+        cashflow = self.create(0)
+        (created,) = Cashflow.objects.bulk_create(
+            [
+                Cashflow(
+                    status=self.status,
+                    subcategory=self.subcategories[0],
+                    amount=Decimal("1.00"),
+                )
+            ]
+        )
+        for obj in (cashflow, created):
+            self.assertHierarchy(obj)
+            self.assertEqual(
+                obj.type_id, self.subcategories[4].category.type_id
+            )
+
+    def test_fixture_load(self) -> None:
+        cashflow = self.create(0)
+        # фикстура без копий категории и типа
+        fields = ("created_at", "status", "subcategory", "amount")
+        data = serializers.serialize("json", [cashflow], fields=fields)
+        Cashflow.objects.filter(pk=cashflow.pk).delete()
+
+        for obj in serializers.deserialize("json", data):
+            obj.save()
+
+        self.assertHierarchy(cashflow)
+        self.assertEqual(expected_rollup_rows(), rollup_rows())
+
+
+@skipUnless(connection.vendor == "postgresql", "планы запросов PostgreSQL")
+class QueryPlanTests(TestCase):
+    """
+    ``check_query_plans --no-seqscan``: каждому запросу списка и итогов
+    подходит индекс.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_cashflows(200, create_directories(), create_statuses())
+
+    def test_plans_use_indexes(self) -> None:
+        out = io.StringIO()
+        call_command("check_query_plans", "--no-seqscan", stdout=out)
+        self.assertIn("Все планы используют индексы.", out.getvalue())
+        self.assertNotIn("SEQ SCAN", out.getvalue())
+
+
+class CheapCountTests(TestCase):
+    """Подсчёт строк: точно до порога, дальше — оценка."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_cashflows(30, create_directories(), create_statuses()[:1])
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_exact_below_limit(self) -> None:
+        with self.assertNumQueries(1):
+            count = cheap_count(Cashflow.objects.all(), exact_limit=30)
+        self.assertEqual((count.value, count.exact), (30, True))
+
+    def test_estimate_above_limit(self) -> None:
+        queryset = Cashflow.objects.all()
+        count = cheap_count(queryset, exact_limit=10)
+
+        self.assertFalse(count.exact)
+        # оценка не меньше того, что уже точно посчитано
+        self.assertGreaterEqual(count.value, 11)
+        if connection.vendor != "postgresql":
+            self.assertEqual(count.value, 30)
+            with self.assertNumQueries(1):
+                cheap_count(queryset, exact_limit=10)
+
+
+class SelectionSummaryTests(TestCase):
+    """Итоги выборки: один запрос, кэш и его сброс после изменений."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.subcategories = create_directories()
+        cls.status = create_statuses()[0]
+        now = timezone.now()
+        # подкатегории 0–3 — «Пополнение», 4–7 — «Списание»
+        days = (0, 1, 4)
+        create_cashflows(
+            len(days),
+            [cls.subcategories[day] for day in days],
+            [cls.status],
+            created_at=[now - timedelta(days=day) for day in days],
+            amount=[Decimal("100.00"), Decimal("50.00"), Decimal("30.00")],
+            comment="",
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_totals(self) -> None:
+        with self.assertNumQueries(1):
+            summary = selection_summary(Cashflow.objects.all())
+
+        self.assertEqual(summary["count"], 3)
+        self.assertEqual(summary["total"], Decimal("180.00"))
+        self.assertEqual(summary["income"], Decimal("150.00"))
+        self.assertEqual(summary["outcome"], Decimal("30.00"))
+        self.assertEqual(summary["net"], Decimal("120.00"))
+        self.assertEqual(summary["min"], Decimal("30.00"))
+        self.assertEqual(summary["max"], Decimal("100.00"))
+
+    def test_totals_by_type_kind(self) -> None:
+        # приход и расход — по виду типа, а не по его названию
+        Type.objects.filter(kind=TypeKind.INCOME).update(name="ДОХОДЫ")
+        cashflow = Cashflow.objects.select_related("type").get(
+            subcategory=self.subcategories[0]
+        )
+
+        summary = selection_summary(Cashflow.objects.all())
+        self.assertEqual(summary["income"], Decimal("150.00"))
+        self.assertTrue(cashflow.is_income())
+        self.assertFalse(cashflow.is_outcome())
+
+    def test_cached_until_data_changes(self) -> None:
+        selection_summary(Cashflow.objects.all())
+        with self.assertNumQueries(0):
+            selection_summary(Cashflow.objects.all())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Cashflow.objects.create(
+                status=self.status,
+                subcategory=self.subcategories[0],
+                amount=Decimal("1.00"),
+            )
+        summary = selection_summary(Cashflow.objects.all())
+        self.assertEqual(summary["count"], 4)
+
+    def test_rollup_matches_records(self) -> None:
+        day = timezone.localtime()
+        filters = {
+            "date_from": (day - timedelta(days=1)).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            ),
+            "date_to": day.replace(
+                hour=23, minute=59, second=59, microsecond=999999
+            ),
+        }
+        queryset = Cashflow.objects.filter(
+            created_at__gte=filters["date_from"],
+            created_at__lte=filters["date_to"],
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            from_rollup = selection_summary(queryset, filters)
+        self.assertIn(
+            CashflowDailyRollup._meta.db_table, ctx.captured_queries[0]["sql"]
+        )
+        from_records = selection_summary(queryset)
+        self.assertEqual(from_rollup, from_records)
+        self.assertEqual(from_rollup["count"], 2)
+
+
+class LeanRowsTests(TestCase):
+    """Строки ``.values()`` совпадают с ответом ``CashflowSerializer``."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        amounts = ("-0.50", "12", "1234567.89")
+        create_cashflows(
+            len(amounts),
+            create_directories()[::3],
+            create_statuses()[:1],
+            start=timezone.now().replace(microsecond=123456),
+            amount=[Decimal(amount) for amount in amounts],
+            comment=["", "строка 1", "строка 2"],
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_same_as_serializer(self) -> None:
+        queryset = Cashflow.objects.order_by("-created_at", "-id")
+        expected = json.loads(
+            json.dumps(CashflowSerializer(queryset, many=True).data)
+        )
+
+        with self.assertNumQueries(1):
+            rows = lean_rows(lean_queryset(queryset))
+        self.assertEqual(rows, expected)
+
+
+class LoadTestCommandTests(LiveServerTestCase):
+    """``loadtest`` замеряет задержки работающего сервера."""
+
+    def test_reports_latency(self) -> None:
+        out = io.StringIO()
+        call_command(
+            "loadtest",
+            f"--base-url={self.live_server_url}",
+            "--path=/api/cashflows/",
+            "--path=/нет-такого/",
+            "--requests=4",
+            "--concurrency=2",
+            "--warmup=0",
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+
+        (ok,) = [line for line in lines if "/api/cashflows/" in line]
+        self.assertIn("p95", ok)
+        self.assertNotIn("ошибок", ok)
+        (missing,) = [line for line in lines if "/нет-такого/" in line]
+        self.assertIn("ошибок: 4", missing)
+
+
+class BenchmarkCommandTests(TestCase):
+    """``benchmark_hot_paths`` пишет отчёт и не меняет данные."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_cashflows(30, create_directories(), create_statuses()[:1])
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def benchmark(self, *args: str) -> str:
+        out = io.StringIO()
+        call_command(
+            "benchmark_hot_paths",
+            "--requests=2",
+            "--warmup=0",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_report(self) -> None:
+        before = list(Cashflow.objects.values_list("id", "amount"))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "report.json")
+            self.benchmark(f"--output={path}")
+            with open(path, encoding="utf-8") as report_file:
+                report = json.load(report_file)
+
+            self.assertEqual(report["meta"]["rows"], 30)
+            results = {row["name"]: row for row in report["results"]}
+            for name in ("api: список", "api: итоги", "ui: изменение"):
+                self.assertIn(name, results)
+            for row in report["results"]:
+                with self.subTest(scenario=row["name"]):
+                    self.assertEqual(row["errors"], 0, row["statuses"])
+                    self.assertEqual(row["requests"], 2)
+                    self.assertLessEqual(row["p50"], row["p99"])
+            # сценарии записи откатываются
+            self.assertEqual(
+                list(Cashflow.objects.values_list("id", "amount")), before
+            )
+
+            out = self.benchmark("--only=итоги", f"--compare={path}")
+        self.assertIn("api: итоги", out)
+        self.assertNotIn("api: список", out)
+        self.assertIn("p50 ", out.split("api: итоги", 1)[1])
+
+    def test_requires_rows(self) -> None:
+        Cashflow.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, "Нет записей ДДС"):
+            self.benchmark()
+
+
+@skipUnless(connection.vendor == "postgresql", "секционирование PostgreSQL")
+@override_settings(CASHFLOW_PARTITION_MONTHS_AHEAD=2)
+class PartitioningTests(TransactionTestCase):
+    """
+    Секционирование записей ДДС по месяцам: преобразование таблицы,
+    секции будущих месяцев и отсечение секций фильтром по периоду.
+    """
+
+    table = Cashflow._meta.db_table
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.subcategories = create_directories()
+        self.statuses = create_statuses()[:1]
+        create_cashflows(90, self.subcategories, self.statuses)
+        # следующим тестам — обычная таблица, как после миграций
+        self.addCleanup(self.unpartition)
+
+    def unpartition(self) -> None:
+        with connection.schema_editor() as editor:
+            convert_to_plain(editor, Cashflow)
+
+    def partitions(self, *args: str) -> str:
+        out = io.StringIO()
+        call_command("cashflow_partitions", *args, stdout=out)
+        return out.getvalue()
+
+    def partition_of(self, cashflow: Cashflow) -> str:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT tableoid::regclass::text FROM {self.table} "
+                "WHERE id = %s",
+                [cashflow.pk],
+            )
+            return cursor.fetchone()[0]
+
+    def rows(self) -> set[tuple]:
+        return set(Cashflow.objects.values_list("id", "created_at", "amount"))
+
+    def create(self, **kwargs) -> Cashflow:
+        return Cashflow.objects.create(
+            status=self.statuses[0],
+            subcategory=self.subcategories[0],
+            amount=Decimal("1.00"),
+            **kwargs,
+        )
+
+    def test_convert(self) -> None:
+        before = self.rows()
+        self.partitions("convert", "--list")
+
+        self.assertTrue(is_partitioned(self.table))
+        self.assertEqual(self.rows(), before)
+        first = month_of(Cashflow.objects.earliest("created_at").created_at)
+        last = add_months(timezone.localdate().replace(day=1), 2)
+        month, expected = first, {partition_name(self.table)}
+        while month <= last:
+            expected.add(partition_name(self.table, month))
+            month = add_months(month, 1)
+        self.assertEqual(set(partition_rows(self.table)), expected)
+
+        # id выдаёт последовательность, запись попадает в секцию месяца
+        cashflow = self.create()
+        self.assertGreater(cashflow.pk, max(pk for pk, *_ in before))
+        self.assertEqual(
+            self.partition_of(cashflow),
+            partition_name(self.table, month_of(cashflow.created_at)),
+        )
+        self.assertIn("Создано секций: 0.", self.partitions())
+
+    def test_default_partition_rows_moved(self) -> None:
+        self.partitions("convert")
+        cashflow = self.create(created_at=timezone.now() + timedelta(700))
+        self.assertEqual(
+            self.partition_of(cashflow), partition_name(self.table)
+        )
+
+        out = self.partitions()
+
+        month = partition_name(self.table, month_of(cashflow.created_at))
+        self.assertIn(f"создана  {month}", out)
+        self.assertEqual(self.partition_of(cashflow), month)
+
+    def test_pruning(self) -> None:
+        self.partitions("convert")
+        total = len(partition_rows(self.table))
+
+        cases = pruning_cases(Cashflow.objects.all())
+        self.assertEqual(len(cases), 4)
+        for case in cases:
+            with self.subTest(case=case.name):
+                self.assertEqual(case.extra_partitions(), [])
+                scanned = {name for _, name in case.scans()}
+                self.assertLess(len(scanned), total)
+
+    def test_convert_back(self) -> None:
+        before = self.rows()
+        self.partitions("convert")
+        out = self.partitions("revert")
+
+        self.assertIn("больше не секционирована", out)
+        self.assertFalse(is_partitioned(self.table))
+        self.assertEqual(self.rows(), before)
+        self.assertGreater(self.create().pk, max(pk for pk, *_ in before))
+
+    def test_requires_explicit_convert(self) -> None:
+        # миграции таблицу не секционируют
+        self.assertFalse(is_partitioned(self.table))
+        message = "cashflow_partitions convert"
+        with self.assertRaisesMessage(CommandError, message):
+            self.partitions()
@@ -1,29 +1,115 @@
 """
 API-вьюхи DRF для записей ДДС (CRUD + фильтры).
+
+Список и сводка есть и в виде нативных async-вьюх Django (DRF не
+поддерживает async): под ASGI они не занимают поток на время запроса.
 """
 
 from __future__ import annotations
 
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpRequest, HttpResponse
+from django.views.decorators.http import require_GET
+from django_filters import utils as filter_utils
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
+from rest_framework.response import Response
 
 from api.filters import CashflowFilter
+from api.pagination import CashflowCursorPagination
+from api.renderers import ORJSONRenderer
 
+from .bulk import (
+    create_rows,
+    delete_ids,
+    directory_ids,
+    row_errors,
+    update_rows,
+)
+from .export import EXPORT_FORMATS, ExportFormatError, export_response
+from .lean import LEAN_EXPANSIONS, LEAN_FIELDS, LeanShape, parse_names
 from .models import Cashflow
-from .serializers import CashflowSerializer
+from .reports import (
+    GROUPINGS,
+    PERIODS,
+    asummarize,
+    parse_group_by,
+    summarize,
+)
+from .serializers import (
+    BULK_MAX_ROWS,
+    CashflowBulkDeleteSerializer,
+    CashflowBulkRowSerializer,
+    CashflowSerializer,
+)
+
+# Параметры состава ответа списка и карточки записи
+SHAPE_PARAMETERS = [
+    OpenApiParameter(
+        "fields",
+        OpenApiTypes.STR,
+        description=(
+            "Поля ответа через запятую: "
+            + ", ".join(LEAN_FIELDS)
+            + " (по умолчанию все). Категория и тип (JOIN) читаются, "
+            "только если запрошены."
+        ),
+    ),
+    OpenApiParameter(
+        "expand",
+        OpenApiTypes.STR,
+        description=(
+            "Развернуть в объект {id, name} вместо id: "
+            + ", ".join(LEAN_EXPANSIONS)
+            + "."
+        ),
+    ),
+]
+
+
+def lean_shape(params) -> LeanShape:
+    """
+    Состав ответа из параметров запроса ``fields`` и ``expand``.
+
+    Raises:
+        ValidationError: неизвестное поле.
+    """
+    names = {}
+    for param, allowed in (
+        ("fields", LEAN_FIELDS),
+        ("expand", LEAN_EXPANSIONS),
+    ):
+        try:
+            names[param] = parse_names(params.get(param), allowed)
+        except ValueError as exc:
+            raise ValidationError({param: [str(exc)]})
+    return LeanShape(**names)
+
+
+def parse_summary_group_by(params) -> list[str]:
+    """
+    Группировки сводки из параметра ``group_by``.
+
+    Raises:
+        ValidationError: неизвестная группировка.
+    """
+    try:
+        return parse_group_by(params.get("group_by"))
+    except ValueError as exc:
+        raise ValidationError({"group_by": [str(exc)]})
 
 
 class CashflowViewSet(viewsets.ModelViewSet):
     """CRUD эндпоинты для записей ДДС."""
 
     queryset = (
-        Cashflow.objects.select_related(
-            "status",
-            "subcategory",
-            "subcategory__category",
-            "subcategory__category__type",
-        )
+        Cashflow.objects.select_related("category", "type")
         .all()
         .order_by("-created_at", "-id")
     )
@@ -31,3 +117,212 @@ class CashflowViewSet(viewsets.ModelViewSet):
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend]
     filterset_class = CashflowFilter
+    pagination_class = CashflowCursorPagination
+
+    def lean_shape(self) -> LeanShape:
+        """Состав ответа из параметров ``fields`` и ``expand``."""
+        return lean_shape(self.request.query_params)
+
+    @extend_schema(parameters=SHAPE_PARAMETERS)
+    def list(self, request, *args, **kwargs) -> Response:
+        """Список записей: ``.values()`` без сериализатора DRF."""
+        shape = self.lean_shape()
+        qs = shape.queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(qs)
+        if page is not None:
+            return self.get_paginated_response(shape.rows(page))
+        return Response(shape.rows(qs))
+
+    @extend_schema(parameters=SHAPE_PARAMETERS)
+    def retrieve(self, request, *args, **kwargs) -> Response:
+        """Одна запись: ``.values()`` без сериализатора DRF."""
+        shape = self.lean_shape()
+        qs = shape.queryset(self.filter_queryset(self.get_queryset()))
+        pk = kwargs[self.lookup_url_kwarg or "pk"]
+        try:
+            row = qs.filter(pk=pk).first()
+        except (TypeError, ValueError, DjangoValidationError):
+            # как get_object_or_404 в DRF: нечисловой id — 404, а не 500
+            row = None
+        if row is None:
+            raise Http404
+        return Response(shape.row(row))
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "group_by",
+                OpenApiTypes.STR,
+                description=(
+                    "Группировки через запятую: "
+                    + ", ".join([*GROUPINGS, *PERIODS])
+                    + " (не более одного периода)."
+                ),
+            )
+        ],
+        responses=OpenApiTypes.OBJECT,
+    )
+    @action(detail=False, methods=["get"], url_path="summary")
+    def summary(self, request) -> Response:
+        """Итоги по фильтру: суммы, количество, min/max, сальдо."""
+        group_by = parse_summary_group_by(request.query_params)
+        filterset = DjangoFilterBackend().get_filterset(
+            request, self.get_queryset(), self
+        )
+        if not filterset.is_valid():
+            raise filter_utils.translate_validation(filterset.errors)
+        results = summarize(
+            filterset.qs, group_by, filters=filterset.form.cleaned_data
+        )
+        return Response({"group_by": group_by, "results": results})
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "file_format",
+                OpenApiTypes.STR,
+                enum=[*EXPORT_FORMATS],
+                description="Формат файла (по умолчанию csv).",
+            )
+        ],
+        responses={(200, "application/octet-stream"): OpenApiTypes.BINARY},
+    )
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        """Потоковая выгрузка отфильтрованных записей в файл."""
+        qs = self.filter_queryset(self.get_queryset())
+        try:
+            return export_response(
+                qs, request.query_params.get("file_format", "csv")
+            )
+        except ExportFormatError as exc:
+            raise ValidationError({"file_format": [str(exc)]})
+
+    def _bulk_rows(
+        self, request, partial: bool
+    ) -> CashflowBulkRowSerializer:
+        """Сериализатор массива строк; справочники загружаются один раз."""
+        if not isinstance(request.data, list):
+            raise ValidationError(
+                {"non_field_errors": ["Ожидается массив записей."]}
+            )
+        return CashflowBulkRowSerializer(
+            data=request.data,
+            many=True,
+            partial=partial,
+            allow_empty=False,
+            max_length=BULK_MAX_ROWS,
+            context=directory_ids(request.data),
+        )
+
+    @staticmethod
+    def _bulk_errors(errors) -> Response:
+        """Ответ 400 с ошибками по номерам строк."""
+        if isinstance(errors, list):
+            errors = {"errors": row_errors(errors)}
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        request=CashflowBulkRowSerializer(many=True),
+        responses=OpenApiTypes.OBJECT,
+    )
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request) -> Response:
+        """Массовое создание записей (до 10 000 строк, одна транзакция)."""
+        serializer = self._bulk_rows(request, partial=False)
+        if not serializer.is_valid():
+            return self._bulk_errors(serializer.errors)
+        ids = create_rows(serializer.validated_data)
+        return Response(
+            {"created": len(ids), "ids": ids}, status=status.HTTP_201_CREATED
+        )
+
+    @extend_schema(
+        request=CashflowBulkRowSerializer(many=True),
+        responses=OpenApiTypes.OBJECT,
+    )
+    @bulk_create.mapping.patch
+    def bulk_update(self, request) -> Response:
+        """Массовое частичное обновление записей по id."""
+        serializer = self._bulk_rows(request, partial=True)
+        if not serializer.is_valid():
+            return self._bulk_errors(serializer.errors)
+        updated, errors = update_rows(serializer.validated_data)
+        if errors:
+            return self._bulk_errors({"errors": errors})
+        return Response({"updated": updated})
+
+    @extend_schema(
+        request=CashflowBulkDeleteSerializer,
+        responses=OpenApiTypes.OBJECT,
+    )
+    @bulk_create.mapping.delete
+    def bulk_destroy(self, request) -> Response:
+        """Массовое удаление записей по списку id."""
+        serializer = CashflowBulkDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        deleted, errors = delete_ids(serializer.validated_data["ids"])
+        if errors:
+            return self._bulk_errors({"errors": errors})
+        return Response({"deleted": deleted})
+
+
+def _json(data, status_code: int = 200) -> HttpResponse:
+    """JSON-ответ тем же рендерером, что у API."""
+    return HttpResponse(
+        ORJSONRenderer().render(data),
+        status=status_code,
+        content_type="application/json",
+    )
+
+
+def _error(exc: APIException) -> HttpResponse:
+    """Ошибка DRF в том же виде, что отдаёт обработчик исключений DRF."""
+    data = exc.detail
+    if not isinstance(data, (list, dict)):
+        data = {"detail": data}
+    return _json(data, exc.status_code)
+
+
+def _filterset(request: Request) -> CashflowFilter:
+    """
+    Проверенные фильтры записей ДДС из запроса.
+
+    Raises:
+        ValidationError: некорректные значения фильтров.
+    """
+    filterset = CashflowFilter(
+        request.query_params, queryset=CashflowViewSet.queryset
+    )
+    if not filterset.is_valid():
+        raise filter_utils.translate_validation(filterset.errors)
+    return filterset
+
+
+@require_GET
+async def cashflow_list_async(request: HttpRequest) -> HttpResponse:
+    """Список записей ДДС: то же, что ``GET /api/cashflows/``, async."""
+    request = Request(request)
+    pagination = CashflowCursorPagination()
+    try:
+        shape = lean_shape(request.query_params)
+        qs = shape.queryset(_filterset(request).qs)
+        rows = await pagination.apaginate_queryset(qs, request)
+    except APIException as exc:
+        return _error(exc)
+    return _json(pagination.get_paginated_data(shape.rows(rows)))
+
+
+@require_GET
+async def cashflow_summary_async(request: HttpRequest) -> HttpResponse:
+    """Сводка: то же, что ``GET /api/cashflows/summary/``, async."""
+    request = Request(request)
+    try:
+        group_by = parse_summary_group_by(request.query_params)
+        filterset = _filterset(request)
+    except APIException as exc:
+        return _error(exc)
+    results = await asummarize(
+        filterset.qs, group_by, filters=filterset.form.cleaned_data
+    )
+    return _json({"group_by": group_by, "results": results})
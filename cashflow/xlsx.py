@@ -0,0 +1,198 @@
+"""
+Потоковая запись XLSX.
+
+XLSX — zip-архив из XML-частей. Архив пишется ``zipfile`` в приёмник без
+``seek`` (размеры частей — в дескрипторах после данных), поэтому готовые
+байты отдаются клиенту по мере записи строк, а не после сборки всего
+файла во временном файле.
+
+Строки пишутся встроенными (``inlineStr``): такие ячейки Excel и
+LibreOffice не вычисляют как формулы, даже если текст начинается с
+``=``.
+
+Почему не openpyxl или xlsxwriter: оба собирают zip-архив только при
+сохранении книги. ``openpyxl`` в режиме ``write_only`` копит лист во
+временном файле, ``xlsxwriter`` с ``constant_memory`` — тоже, и первый
+байт уходит клиенту лишь после чтения всех строк. Здесь пишется
+минимум OOXML: один лист, два формата дат и строки без таблицы общих
+строк (shared strings). Что файл открывают настоящие читатели,
+проверяют тесты через ``openpyxl.load_workbook`` (если пакет
+установлен).
+"""
+
+from __future__ import annotations
+
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, Sequence
+from xml.sax.saxutils import escape
+
+# Сколько строк листа писать между отдачей байтов клиенту
+XLSX_FLUSH_ROWS = 500
+
+# Начало отсчёта дат Excel (с учётом ошибки 1900 года)
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+# Символы, недопустимые в XML 1.0
+ILLEGAL_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+SHEET_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+CONTENT_TYPES = (
+    XML_HEADER
+    + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/'
+    'content-types">'
+    '<Default Extension="rels" ContentType="application/'
+    'vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="'
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.'
+    'worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    "</Types>"
+)
+
+ROOT_RELS = (
+    XML_HEADER + f'<Relationships xmlns="{PKG_REL_NS}">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+
+WORKBOOK_RELS = (
+    XML_HEADER + f'<Relationships xmlns="{PKG_REL_NS}">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    "</Relationships>"
+)
+
+# Стиль 1 — дата и время, 2 — дата (форматы как в CSV-выгрузке)
+STYLES = (
+    XML_HEADER + f'<styleSheet xmlns="{SHEET_NS}">'
+    '<numFmts count="2">'
+    '<numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd"/>'
+    "</numFmts>"
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font>'
+    "</fonts>"
+    '<fills count="1"><fill><patternFill patternType="none"/></fill>'
+    "</fills>"
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+    '<cellXfs count="3"><xf xfId="0"/>'
+    '<xf numFmtId="164" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" xfId="0" applyNumberFormat="1"/>'
+    "</cellXfs>"
+    '<cellStyles count="1">'
+    '<cellStyle name="Normal" xfId="0" builtinId="0"/>'
+    "</cellStyles>"
+    "</styleSheet>"
+)
+
+
+class _Sink:
+    """Приёмник архива без ``seek``: копит байты до ``drain``."""
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        return None
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _workbook(sheet_name: str) -> str:
+    return (
+        XML_HEADER + f'<workbook xmlns="{SHEET_NS}" xmlns:r="{REL_NS}">'
+        f'<sheets><sheet name="{escape(sheet_name, {chr(34): "&quot;"})}" '
+        'sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    )
+
+
+def _cell(value: Any) -> str:
+    """Ячейка строки листа (без адреса — по порядку)."""
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f"<c><v>{value}</v></c>"
+    if isinstance(value, datetime):
+        days = (value.replace(tzinfo=None) - EXCEL_EPOCH).total_seconds()
+        return f'<c s="1"><v>{days / 86400!r}</v></c>'
+    if isinstance(value, date):
+        days = (value - EXCEL_EPOCH.date()).days
+        return f'<c s="2"><v>{days}</v></c>'
+    text = escape(ILLEGAL_XML_CHARS.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row(values: Iterable[Any]) -> str:
+    return "<row>" + "".join(_cell(value) for value in values) + "</row>"
+
+
+def stream_xlsx(
+    header: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    sheet_name: str = "Лист1",
+) -> Iterator[bytes]:
+    """
+    Байты XLSX-файла с одним листом по мере записи строк.
+
+    Args:
+        header (Sequence[str]): заголовки колонок (первая строка).
+        rows (Iterable[Sequence]): строки; даты и время — без часового
+            пояса (в том виде, в каком их показать).
+        sheet_name (str): имя листа.
+    Returns:
+        Iterator[bytes]: куски архива.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+        archive.writestr("_rels/.rels", ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _workbook(sheet_name))
+        archive.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS)
+        archive.writestr("xl/styles.xml", STYLES)
+        yield sink.drain()
+
+        with archive.open(
+            "xl/worksheets/sheet1.xml", "w", force_zip64=True
+        ) as sheet:
+            sheet.write(
+                f'{XML_HEADER}<worksheet xmlns="{SHEET_NS}"><sheetData>'
+                f"{_row(header)}".encode()
+            )
+            batch: list[str] = []
+            for row in rows:
+                batch.append(_row(row))
+                if len(batch) >= XLSX_FLUSH_ROWS:
+                    sheet.write("".join(batch).encode())
+                    batch = []
+                    yield sink.drain()
+            sheet.write(
+                ("".join(batch) + "</sheetData></worksheet>").encode()
+            )
+    yield sink.drain()
@@ -0,0 +1,258 @@
+"""
+Метрики в текстовом формате Prometheus (``/metrics``).
+
+Счётчики, гистограммы и gauge хранятся в памяти процесса, без внешних
+зависимостей. У каждого воркера gunicorn/uvicorn свои значения: их
+нужно собирать с каждого воркера (или запускать один воркер на под).
+
+Метрики:
+    задержка запросов по маршрутам, время БД и число SQL (по
+    замеряемым запросам ``RequestTimingMiddleware``), попадания в кэши
+    (снимок справочников, итоги, подсчёты), глубина keyset-пагинации,
+    объём и время выгрузки и загрузки записей, готовность БД и кэша.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+# Границы гистограмм задержки, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_metrics: list[_Metric] = []
+
+
+def _labels_text(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value)
+            .replace("\\", "\\\\")
+            .replace('"', '\\"')
+            .replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(
+        self, name: str, documentation: str, labels: Iterable[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        """Строки значений метрики (вызывается под блокировкой)."""
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self._lock:
+            lines += self._samples()
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик."""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_labels_text(self.label_names, key)} "
+            f"{_number(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    """Значение, которое может как расти, так и уменьшаться."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Гистограмма: накопительные корзины, сумма и количество."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # ключ меток -> (попадания в каждую корзину, [сумма значений])
+        self._values: dict[tuple[str, ...], tuple[list[int], list]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                key, ([0] * len(self.buckets), [0.0])
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _labels_text(
+                    self.label_names + ("le",), key + (_number(bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels_text(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_number(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "dds_http_request_duration_seconds",
+    "Время обработки HTTP-запроса.",
+    labels=("method", "route", "status"),
+)
+REQUEST_DB_DURATION = Histogram(
+    "dds_http_request_db_seconds",
+    "Суммарное время SQL за запрос (замеряемые запросы).",
+    labels=("route",),
+)
+REQUEST_QUERIES = Histogram(
+    "dds_http_request_queries",
+    "Число SQL-запросов за HTTP-запрос (замеряемые запросы).",
+    labels=("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+)
+CACHE_REQUESTS = Counter(
+    "dds_cache_requests_total",
+    "Обращения к кэшам: снимок справочников, итоги, подсчёты.",
+    labels=("cache", "result"),
+)
+PAGINATION_PAGES = Counter(
+    "dds_pagination_pages_total",
+    "Страницы keyset-пагинации: первая или по курсору вперёд/назад.",
+    labels=("direction",),
+)
+PAGINATION_CURSOR_AGE = Histogram(
+    "dds_pagination_cursor_age_days",
+    "Глубина листания: насколько дата курсора старше текущей, дни.",
+    buckets=(1, 7, 30, 90, 180, 365, 730, 1825),
+)
+EXPORT_ROWS = Counter(
+    "dds_export_rows_total",
+    "Выгружено строк.",
+    labels=("format",),
+)
+EXPORT_SECONDS = Counter(
+    "dds_export_seconds_total",
+    "Время выгрузки, секунды.",
+    labels=("format",),
+)
+IMPORT_ROWS = Counter(
+    "dds_import_rows_total",
+    "Загружено записей.",
+    labels=("mode",),
+)
+IMPORT_SECONDS = Counter(
+    "dds_import_seconds_total",
+    "Время записи загружаемых пачек, секунды.",
+    labels=("mode",),
+)
+HEALTH_UP = Gauge(
+    "dds_health_up",
+    "Результат последней проверки готовности (1 — в порядке).",
+    labels=("check",),
+)
+HEALTH_LATENCY = Gauge(
+    "dds_health_latency_seconds",
+    "Задержка последней проверки готовности.",
+    labels=("check",),
+)
+
+
+def cache_result(cache: str, hit: bool) -> None:
+    """Отмечает попадание или промах кэша."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def route_of(request: HttpRequest) -> str:
+    """Имя маршрута запроса (ограниченный набор значений для меток)."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match.route or "unnamed"
+
+
+def render_metrics() -> str:
+    """Все метрики в текстовом формате Prometheus."""
+    return "\n".join(metric.render() for metric in _metrics) + "\n"
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    ``GET /metrics``: метрики процесса для Prometheus.
+
+    Нужен заголовок ``Authorization: Bearer <METRICS_TOKEN>``; без
+    заданного токена доступ закрыт (метрики раскрывают маршруты и
+    нагрузку).
+    """
+    token: Optional[str] = settings.METRICS_TOKEN
+    if not token or not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
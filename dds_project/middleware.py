@@ -0,0 +1,272 @@
+"""
+Замер времени запроса: SQL, представление и рендеринг.
+
+Для выбранной доли запросов (``REQUEST_TIMING_SAMPLE_RATE``) считает
+число SQL-запросов, суммарное время БД, самые медленные запросы, время
+представления и рендеринга ответа. Итоги уходят в заголовок
+``Server-Timing`` (видно во вкладке Network браузера) и в лог
+``dds_project.timing`` одной JSON-строкой. Повторяющийся один и тот же
+запрос (N+1, например ``obj.type`` в каждой строке списка) отмечается
+отдельно. Задержка всех запросов (и SQL замеряемых) идёт в метрики
+``/metrics``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponseBase
+
+from . import metrics
+
+logger = logging.getLogger("dds_project.timing")
+
+# Списки параметров ``IN (%s, %s, ...)`` сворачиваем: это один запрос
+_PARAMS_LIST = re.compile(r"%s(?:\s*,\s*%s)+")
+
+# Замеры текущего запроса. Контекст, а не атрибут соединения: под ASGI
+# одновременные запросы выполняют SQL в одном потоке sync_to_async и
+# через одно соединение, а контекст у каждого свой (sync_to_async
+# переносит его в поток).
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """Текст запроса без длины списков параметров (ключ для N+1)."""
+    return _PARAMS_LIST.sub("%s", sql)
+
+
+@dataclass
+class RequestTimings:
+    """Замеры одного запроса; время — в миллисекундах."""
+
+    started: float = field(default_factory=time.perf_counter)
+    queries: list[tuple[float, str]] = field(default_factory=list)
+    view_started: Optional[float] = None
+    view_ms: float = 0.0
+    render_started: Optional[float] = None
+    render_ms: float = 0.0
+
+    @property
+    def db_ms(self) -> float:
+        return sum(duration for duration, _ in self.queries)
+
+    def slowest(self, limit: int) -> list[tuple[float, str]]:
+        """Самые долгие запросы (время, SQL)."""
+        return sorted(self.queries, reverse=True)[:limit]
+
+    def repeated(self, threshold: int) -> list[tuple[int, str]]:
+        """Запросы, выполненные ``threshold`` и более раз (N+1)."""
+        counts: dict[str, int] = {}
+        for _, sql in self.queries:
+            key = normalize_sql(sql)
+            counts[key] = counts.get(key, 0) + 1
+        return sorted(
+            ((n, sql) for sql, n in counts.items() if n >= threshold),
+            reverse=True,
+        )
+
+
+def _record_query(execute, sql, params, many, context):
+    """
+    Обёртка ``execute_wrappers``: время SQL в замеры текущего запроса.
+
+    Одна на соединение и не снимается: вне замеряемых запросов только
+    вызывает ``execute``.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    began = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries.append(((time.perf_counter() - began) * 1000, sql))
+
+
+def _install_wrappers() -> None:
+    """Ставит ``_record_query`` на соединения текущего потока."""
+    for connection in connections.all():
+        if _record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_record_query)
+
+
+def _metric(name: str, duration: float, desc: str = "") -> str:
+    value = f"{name};dur={duration:.1f}"
+    if desc:
+        value += f';desc="{desc}"'
+    return value
+
+
+class RequestTimingMiddleware:
+    """
+    Middleware замеров: ``Server-Timing`` и структурированный лог.
+
+    Настройки (``settings``):
+        REQUEST_TIMING_SAMPLE_RATE: доля замеряемых запросов (0..1).
+        REQUEST_TIMING_LOG_MS: писать в лог запросы дольше (мс);
+            запросы с N+1 пишутся всегда.
+        REQUEST_TIMING_SLOW_QUERIES: сколько самых долгих SQL в логе.
+        REQUEST_TIMING_N_PLUS_ONE: сколько повторов одного SQL — N+1.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _sampled(self) -> bool:
+        rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def __call__(self, request: HttpRequest):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        if not self._sampled():
+            response = self.get_response(request)
+        else:
+            _install_wrappers()
+            request.timings = RequestTimings()
+            token = _current_timings.set(request.timings)
+            try:
+                response = self.get_response(request)
+            finally:
+                _current_timings.reset(token)
+            response = self._finish(request, response)
+        return self._observe(request, response, started)
+
+    async def __acall__(self, request: HttpRequest):
+        started = time.perf_counter()
+        if not self._sampled():
+            response = await self.get_response(request)
+            return self._observe(request, response, started)
+        # соединения с БД у каждого потока свои: async ORM выполняет SQL
+        # в потоке sync_to_async, туда и ставим обёртку
+        await sync_to_async(_install_wrappers)()
+        request.timings = RequestTimings()
+        token = _current_timings.set(request.timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        response = self._finish(request, response)
+        return self._observe(request, response, started)
+
+    def _observe(
+        self, request: HttpRequest, response: HttpResponseBase, started: float
+    ) -> HttpResponseBase:
+        """Задержка запроса в метрики (для всех запросов)."""
+        metrics.REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=metrics.route_of(request),
+            status=str(response.status_code),
+        )
+        return response
+
+    def process_view(self, request: HttpRequest, *args, **kwargs) -> None:
+        timings = getattr(request, "timings", None)
+        if timings is not None:
+            timings.view_started = time.perf_counter()
+
+    def process_template_response(self, request: HttpRequest, response):
+        """Отложенный рендеринг (шаблоны, ответы DRF) меряем отдельно."""
+        timings = getattr(request, "timings", None)
+        if timings is None:
+            return response
+        now = time.perf_counter()
+        if timings.view_started is not None:
+            timings.view_ms = (now - timings.view_started) * 1000
+        timings.render_started = now
+
+        def rendered(response):
+            timings.render_ms = (time.perf_counter() - now) * 1000
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def _finish(
+        self, request: HttpRequest, response: HttpResponseBase
+    ) -> HttpResponseBase:
+        timings: RequestTimings = request.timings
+        total = (time.perf_counter() - timings.started) * 1000
+        if timings.view_started is not None and not timings.view_ms:
+            # рендеринг внутри представления (shortcut render) — в view
+            timings.view_ms = (
+                time.perf_counter() - timings.view_started
+            ) * 1000
+        repeated = timings.repeated(settings.REQUEST_TIMING_N_PLUS_ONE)
+        route = metrics.route_of(request)
+        metrics.REQUEST_DB_DURATION.observe(timings.db_ms / 1000, route=route)
+        metrics.REQUEST_QUERIES.observe(len(timings.queries), route=route)
+
+        entries = [
+            _metric("db", timings.db_ms, f"{len(timings.queries)} queries"),
+            _metric("view", timings.view_ms),
+        ]
+        if timings.render_started is not None:
+            entries.append(_metric("render", timings.render_ms))
+        if repeated:
+            entries.append(_metric("nplusone", 0, f"{repeated[0][0]}x"))
+        entries.append(_metric("total", total))
+        response.headers["Server-Timing"] = ", ".join(entries)
+
+        if repeated or total >= settings.REQUEST_TIMING_LOG_MS:
+            self._log(request, response, timings, total, repeated)
+        return response
+
+    def _log(
+        self,
+        request: HttpRequest,
+        response: HttpResponseBase,
+        timings: RequestTimings,
+        total: float,
+        repeated: list[tuple[int, str]],
+    ) -> None:
+        match = getattr(request, "resolver_match", None)
+        record: dict[str, Any] = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total, 1),
+            "view_ms": round(timings.view_ms, 1),
+            "render_ms": round(timings.render_ms, 1),
+            "db_ms": round(timings.db_ms, 1),
+            "queries": len(timings.queries),
+            "slowest": [
+                {"ms": round(duration, 1), "sql": sql}
+                for duration, sql in timings.slowest(
+                    settings.REQUEST_TIMING_SLOW_QUERIES
+                )
+            ],
+            "n_plus_one": [
+                {"count": count, "sql": sql} for count, sql in repeated
+            ],
+        }
+        level = logging.WARNING if repeated else logging.INFO
+        logger.log(
+            level,
+            json.dumps(record, ensure_ascii=False),
+            extra={"timing": record},
+        )
@@ -26,6 +26,8 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    # OpClass в индексах, TrigramExtension и поиск по триграммам
+    "django.contrib.postgres",
     "rest_framework",
     "django_filters",
     "drf_spectacular",
@@ -38,6 +40,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # первым, чтобы замер покрывал остальные middleware
+    "dds_project.middleware.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -47,6 +51,38 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Замер запросов (Server-Timing и лог dds_project.timing): доля
+# замеряемых запросов, порог записи в лог (мс), число медленных SQL в
+# логе и сколько повторов одного SQL считать N+1
+REQUEST_TIMING_SAMPLE_RATE = config(
+    "REQUEST_TIMING_SAMPLE_RATE", default=1.0 if DEBUG else 0.0, cast=float
+)
+REQUEST_TIMING_LOG_MS = config("REQUEST_TIMING_LOG_MS", default=500, cast=int)
+REQUEST_TIMING_SLOW_QUERIES = config(
+    "REQUEST_TIMING_SLOW_QUERIES", default=3, cast=int
+)
+REQUEST_TIMING_N_PLUS_ONE = config(
+    "REQUEST_TIMING_N_PLUS_ONE", default=5, cast=int
+)
+
+# Токен для /metrics (заголовок Authorization: Bearer ...); пусто — закрыт
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "dds_project.timing": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
 ROOT_URLCONF = "dds_project.urls"
 
 TEMPLATES = [
@@ -76,9 +112,74 @@ DATABASES = {
         "PASSWORD": config("DB_PASSWORD", default="postgres"),
         "HOST": config("DB_HOST", default="localhost"),
         "PORT": config("DB_PORT", default="5432"),
+        # Постоянные соединения: сколько секунд держать соединение между
+        # запросами (0 — закрывать после каждого запроса)
+        "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", default=60, cast=int),
+        # Проверять соединение перед повторным использованием
+        "CONN_HEALTH_CHECKS": config(
+            "DB_CONN_HEALTH_CHECKS", default=True, cast=bool
+        ),
     }
 }
 
+# Пул соединений psycopg3 (psycopg[pool]). С пулом постоянные
+# соединения Django отключаются: соединение возвращается в пул после
+# каждого запроса.
+DB_POOL = config("DB_POOL", default=False, cast=bool)
+
+if DB_POOL:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": config("DB_POOL_MIN_SIZE", default=2, cast=int),
+            "max_size": config("DB_POOL_MAX_SIZE", default=10, cast=int),
+            "timeout": config("DB_POOL_TIMEOUT", default=10, cast=int),
+        }
+    }
+
+# Секционирование записей ДДС по месяцам (только PostgreSQL): таблицу
+# преобразует manage.py cashflow_partitions convert, секции на
+# CASHFLOW_PARTITION_MONTHS_AHEAD месяцев вперёд создаёт
+# manage.py cashflow_partitions (запускать по расписанию)
+CASHFLOW_PARTITION_MONTHS_AHEAD = config(
+    "CASHFLOW_PARTITION_MONTHS_AHEAD", default=3, cast=int
+)
+
+# Кэш. Версия снимка справочников должна быть общей для всех воркеров,
+# поэтому в проде задаём REDIS_URL (пакет redis — в requirements.txt).
+REDIS_URL = config("REDIS_URL", default="")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Сколько секунд браузер и прокси могут не перепроверять справочники
+DIRECTORY_CACHE_MAX_AGE = config(
+    "DIRECTORY_CACHE_MAX_AGE", cast=int, default=60
+)
+
+# Сколько секунд снимок справочников в памяти процесса живёт без
+# перечитывания: ограничивает отставание, если версия справочников не
+# дошла до процесса (кэш без REDIS_URL у каждого процесса свой)
+DIRECTORY_SNAPSHOT_TTL = config(
+    "DIRECTORY_SNAPSHOT_TTL", cast=int, default=300
+)
+
+# Каскад тип → категория → подкатегория в формах интерфейса:
+# "client" — по дереву справочников, встроенному в страницу (без
+# запросов к серверу), "htmx" — запросом <option> при каждом выборе
+UI_CASCADE = config("UI_CASCADE", default="client")
+
 LANGUAGE_CODE = config("LANGUAGE_CODE", default="ru-ru")
 
 TIME_ZONE = config("TIME_ZONE", default="Europe/Moscow")
@@ -96,6 +197,10 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend"
     ],
@@ -0,0 +1,225 @@
+"""
+Общие средства тестов: справочники, записи ДДС, сверка дневного
+агрегата с записями и бюджет SQL-запросов.
+
+Тест бюджета выполняет запрос на малых и на больших данных и
+проверяет, что число SQL-запросов одинаково (нет N+1) и не больше
+заданного бюджета. Перед замером запрос выполняется один раз (снимок
+справочников уже загружен), а кэши итогов и подсчётов сбрасываются
+сменой версии данных — в замер входят и запросы итогов.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Optional, Sequence
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponseBase
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from cashflow.models import Cashflow, CashflowDailyRollup
+from cashflow.rollup import _aggregate_rows, bump_data_version
+from directories.models import Category, Status, Subcategory, Type, TypeKind
+
+
+def create_cashflows(
+    count: int,
+    subcategories: Sequence[Subcategory],
+    statuses: Sequence[Status],
+    *,
+    start: Optional[datetime] = None,
+    step: timedelta = timedelta(days=1),
+    **fields: Any,
+) -> list[Cashflow]:
+    """
+    Создаёт ``count`` записей ДДС: по одной на ``step`` назад от
+    ``start`` (по умолчанию — по дню от текущего момента).
+
+    Подкатегории и статусы чередуются по кругу, чтобы записи попадали в
+    разные группы сводок и фильтров. ``fields`` переопределяют поля
+    записей: список — значение для каждой записи по номеру, иначе —
+    одно для всех. По умолчанию сумма — 100 + номер, комментарий —
+    «запись N».
+    """
+    start = start or timezone.now()
+
+    def row(index: int) -> dict[str, Any]:
+        return {
+            name: given[index] if isinstance(given, (list, tuple)) else given
+            for name, given in fields.items()
+        }
+
+    return Cashflow.objects.bulk_create(
+        Cashflow(
+            **{
+                "created_at": start - step * index,
+                "status": statuses[index % len(statuses)],
+                "subcategory": subcategories[index % len(subcategories)],
+                "amount": Decimal("100.00") + index,
+                "comment": f"запись {index}",
+                **row(index),
+            }
+        )
+        for index in range(count)
+    )
+
+
+def create_statuses() -> list[Status]:
+    """Создаёт статусы «Бизнес» (business) и «Личное» (personal)."""
+    return [
+        Status.objects.create(name="Бизнес", code="business"),
+        Status.objects.create(name="Личное", code="personal"),
+    ]
+
+
+def create_directories(prefix: str = "") -> list[Subcategory]:
+    """
+    Создаёт два типа, по две категории и по две подкатегории в каждой.
+
+    Returns:
+        list[Subcategory]: созданные подкатегории.
+    """
+    subcategories = []
+    for type_name, kind in (
+        ("Пополнение", TypeKind.INCOME),
+        ("Списание", TypeKind.OUTCOME),
+    ):
+        type_obj = Type.objects.create(name=f"{prefix}{type_name}", kind=kind)
+        for category_index in range(2):
+            category = Category.objects.create(
+                type=type_obj, name=f"{type_obj.name} {category_index}"
+            )
+            for index in range(2):
+                subcategories.append(
+                    Subcategory.objects.create(
+                        category=category, name=f"{category.name}.{index}"
+                    )
+                )
+    return subcategories
+
+
+def rollup_rows() -> set[tuple]:
+    """Строки дневного агрегата."""
+    return set(
+        CashflowDailyRollup.objects.values_list(
+            "day",
+            "subcategory_id",
+            "status_id",
+            "total_amount",
+            "records_count",
+            "min_amount",
+            "max_amount",
+        )
+    )
+
+
+def expected_rollup_rows() -> set[tuple]:
+    """Те же строки, посчитанные по записям ДДС."""
+    return {
+        (
+            row["day"],
+            row["subcategory_id"],
+            row["status_id"],
+            row["total_amount"],
+            row["records_count"],
+            row["min_amount"],
+            row["max_amount"],
+        )
+        for row in _aggregate_rows(Cashflow.objects.all())
+    }
+
+
+def measure(
+    request: Callable[[], HttpResponseBase],
+) -> tuple[HttpResponseBase, int]:
+    """
+    Выполняет запрос и считает SQL-запросы (потоковый ответ читается
+    целиком внутри замера).
+    """
+    with CaptureQueriesContext(connection) as ctx:
+        response = request()
+        if response.streaming:
+            b"".join(response.streaming_content)
+    return response, len(ctx.captured_queries)
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Базовый класс тестов бюджета SQL-запросов.
+
+    Справочники (``subcategories``, ``statuses``) и суперпользователь
+    (``user``, уже вошёл) создаются один раз на класс; записи,
+    добавленные ``grow``, — в ``cashflows`` (новые в конце).
+    """
+
+    # Записей ДДС на малых и на больших данных
+    small_rows = 5
+    large_rows = 60
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.subcategories = create_directories()
+        cls.statuses = create_statuses()
+        cls.user = get_user_model().objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+
+    # Выполнять запросы от имени ``user`` (сессия и пользователь — два
+    # запроса на каждый запрос)
+    login = True
+
+    def setUp(self) -> None:
+        # кэш переживает откат транзакции теста: версии справочников и
+        # данных ДДС из прошлых тестов сбрасываем
+        cache.clear()
+        if self.login:
+            self.client.force_login(self.user)
+        self.cashflows: list[Cashflow] = []
+
+    def grow(self, count: int) -> None:
+        """Добавляет данных: по умолчанию ``count`` записей ДДС."""
+        self.cashflows += create_cashflows(
+            count, self.subcategories, self.statuses
+        )
+
+    def assertQueryBudget(
+        self,
+        budget: int,
+        request: Callable[[], HttpResponseBase],
+        status: int = 200,
+        grow: Optional[Callable[[int], None]] = None,
+    ) -> HttpResponseBase:
+        """
+        Проверяет, что число SQL-запросов не зависит от объёма данных и
+        не больше ``budget``.
+
+        Args:
+            budget (int): допустимое число запросов.
+            request (Callable): выполняет запрос, возвращает ответ; для
+                изменяющих запросов каждый вызов должен быть допустим.
+            status (int): ожидаемый код ответа.
+            grow (Callable): добавляет данных (по умолчанию ``grow``).
+        Returns:
+            HttpResponseBase: ответ на больших данных.
+        """
+        grow = grow or self.grow
+        counts = []
+        for rows in (self.small_rows, self.large_rows - self.small_rows):
+            grow(rows)
+            request()
+            bump_data_version()
+            response, queries = measure(request)
+            self.assertEqual(response.status_code, status)
+            counts.append(queries)
+        small, large = counts
+        self.assertEqual(
+            small, large, "число запросов растёт с объёмом данных"
+        )
+        self.assertLessEqual(large, budget)
+        return response
@@ -0,0 +1,224 @@
+"""
+Тесты проекта: настройки соединений с БД, замер времени запросов и
+метрики.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import json
+import os
+import re
+from types import ModuleType
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from dds_project import metrics, settings
+from dds_project.middleware import (
+    RequestTimings,
+    _record_query,
+    normalize_sql,
+)
+from dds_project.testing import (
+    create_cashflows,
+    create_directories,
+    create_statuses,
+)
+
+
+def load_settings(**env: str) -> ModuleType:
+    """Читает модуль настроек заново с переменными окружения ``env``."""
+    spec = importlib.util.spec_from_file_location(
+        "dds_project.settings_under_test", settings.__file__
+    )
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch.dict(os.environ, env):
+        spec.loader.exec_module(module)
+    return module
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    """Постоянные соединения и пул psycopg3 из переменных окружения."""
+
+    def test_persistent_connections(self) -> None:
+        database = load_settings(
+            DB_CONN_MAX_AGE="120", DB_CONN_HEALTH_CHECKS="False"
+        ).DATABASES["default"]
+
+        self.assertEqual(database["CONN_MAX_AGE"], 120)
+        self.assertIs(database["CONN_HEALTH_CHECKS"], False)
+        self.assertNotIn("pool", database.get("OPTIONS", {}))
+
+    def test_pool_disables_persistent_connections(self) -> None:
+        database = load_settings(
+            DB_POOL="True", DB_CONN_MAX_AGE="120", DB_POOL_MAX_SIZE="4"
+        ).DATABASES["default"]
+
+        # Django не допускает пул вместе с CONN_MAX_AGE > 0
+        self.assertEqual(database["CONN_MAX_AGE"], 0)
+        self.assertEqual(
+            database["OPTIONS"]["pool"],
+            {"min_size": 2, "max_size": 4, "timeout": 10},
+        )
+
+
+def server_timing(header: str) -> dict[str, tuple[float, str]]:
+    """Разбирает ``Server-Timing``: имя -> (длительность, описание)."""
+    metrics = {}
+    for entry in header.split(", "):
+        name, *params = entry.split(";")
+        values = dict(param.split("=", 1) for param in params)
+        metrics[name] = (
+            float(values["dur"]),
+            values.get("desc", "").strip('"'),
+        )
+    return metrics
+
+
+@override_settings(
+    REQUEST_TIMING_SAMPLE_RATE=1.0,
+    REQUEST_TIMING_LOG_MS=60_000,
+    REQUEST_TIMING_N_PLUS_ONE=5,
+)
+class RequestTimingMiddlewareTests(TestCase):
+    """``Server-Timing`` и лог медленных запросов и N+1."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        create_cashflows(3, create_directories(), create_statuses()[:1])
+
+    def test_server_timing(self) -> None:
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("cashflows-list"))
+
+        timing = server_timing(response.headers["Server-Timing"])
+        self.assertEqual(list(timing), ["db", "view", "render", "total"])
+        self.assertEqual(
+            timing["db"][1], f"{len(ctx.captured_queries)} queries"
+        )
+        self.assertGreaterEqual(timing["total"][0], timing["view"][0])
+
+    async def test_async_view(self) -> None:
+        response = await self.async_client.get(
+            reverse("cashflows-async-list")
+        )
+
+        timing = server_timing(response.headers["Server-Timing"])
+        # SQL async ORM выполняется в другом потоке, но тоже считается
+        queries = int(timing["db"][1].split()[0])
+        self.assertGreater(queries, 0)
+
+    async def test_concurrent_async_requests(self) -> None:
+        url = reverse("cashflows-async-list")
+        response = await self.async_client.get(url)
+        single = server_timing(response.headers["Server-Timing"])["db"][1]
+
+        # SQL одновременных запросов идёт через один поток и одно
+        # соединение, но каждый считает только свои запросы
+        responses = await asyncio.gather(
+            *(self.async_client.get(url) for _ in range(4))
+        )
+        for response in responses:
+            timing = server_timing(response.headers["Server-Timing"])
+            self.assertEqual(timing["db"][1], single)
+        # обёртка на соединении одна, сколько бы запросов ни прошло
+        wrappers = await sync_to_async(lambda: connection.execute_wrappers)()
+        self.assertEqual(wrappers.count(_record_query), 1)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0.0)
+    def test_not_sampled(self) -> None:
+        response = self.client.get(reverse("cashflows-list"))
+        self.assertNotIn("Server-Timing", response.headers)
+
+    @override_settings(REQUEST_TIMING_LOG_MS=0)
+    def test_slow_request_log(self) -> None:
+        with self.assertLogs("dds_project.timing", "INFO") as logs:
+            self.client.get(reverse("cashflows-list"), {"page_size": 2})
+
+        (record,) = logs.records
+        self.assertEqual(record.levelname, "INFO")
+        data = json.loads(record.getMessage())
+        self.assertEqual(data["view"], "cashflows-list")
+        self.assertEqual(data["status"], 200)
+        self.assertEqual(data["n_plus_one"], [])
+        self.assertLessEqual(len(data["slowest"]), 3)
+
+    def test_n_plus_one(self) -> None:
+        timings = RequestTimings()
+        for pk in range(5):
+            timings.queries.append((1.0, f"SELECT * FROM t WHERE id = {pk}"))
+        sql = "SELECT * FROM t WHERE id IN (%s, %s)"
+        timings.queries += [(1.0, sql), (1.0, sql.replace("%s)", "%s, %s)"))]
+
+        self.assertEqual(timings.repeated(2), [(2, normalize_sql(sql))])
+        self.assertEqual(
+            normalize_sql(sql), "SELECT * FROM t WHERE id IN (%s)"
+        )
+
+    @override_settings(REQUEST_TIMING_N_PLUS_ONE=1)
+    def test_n_plus_one_logged(self) -> None:
+        with self.assertLogs("dds_project.timing", "WARNING") as logs:
+            response = self.client.get(reverse("cashflows-list"))
+
+        timing = server_timing(response.headers["Server-Timing"])
+        self.assertTrue(re.fullmatch(r"\d+x", timing["nplusone"][1]))
+        data = json.loads(logs.records[0].getMessage())
+        self.assertTrue(data["n_plus_one"])
+
+
+class MetricsTests(TestCase):
+    """``/metrics``: формат Prometheus и доступ только по токену."""
+
+    def get(self, authorization: str = ""):
+        headers = {"Authorization": authorization} if authorization else {}
+        return self.client.get(reverse("metrics"), headers=headers)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token(self) -> None:
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get("Bearer wrong").status_code, 403)
+
+        response = self.get("Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            "# TYPE dds_http_request_duration_seconds histogram",
+            response.content.decode(),
+        )
+
+    @override_settings(METRICS_TOKEN="")
+    def test_closed_without_token(self) -> None:
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get("Bearer ").status_code, 403)
+
+    def test_render(self) -> None:
+        with mock.patch.object(metrics, "_metrics", []):
+            counter = metrics.Counter("test_total", "Счётчик.", ["kind"])
+            histogram = metrics.Histogram(
+                "test_seconds", "Гистограмма.", buckets=(0.1, 1)
+            )
+            counter.inc(kind='a"b')
+            counter.inc(2, kind='a"b')
+            histogram.observe(0.05)
+            histogram.observe(5)
+
+            text = metrics.render_metrics()
+
+        self.assertIn('test_total{kind="a\\"b"} 3', text)
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{le="1"} 1', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn("test_seconds_sum 5.05", text)
+        self.assertIn("test_seconds_count 2", text)
+
+    def test_metric_requires_samples(self) -> None:
+        class Broken(metrics._Metric):
+            kind = "gauge"
+
+        with self.assertRaises(TypeError):
+            Broken("broken", "Без значений.")
@@ -14,9 +14,13 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 
+from .metrics import metrics_view
+
 urlpatterns = [
     # Admin
     path("admin/", admin.site.urls),
+    # Метрики Prometheus
+    path("metrics", metrics_view, name="metrics"),
     # API (CRUD, каскады, health и т.п. объявлены в api.urls)
     path("api/", include("api.urls")),
     # UI
@@ -2,6 +2,9 @@
 Админка для справочников.
 
 Управление Типами, Категориями, Подкатегориями и Статусами.
+
+Название категории включает тип (``Category.__str__``), поэтому везде,
+где выводятся категории, тип читается тем же запросом.
 """
 
 from __future__ import annotations
@@ -11,13 +14,24 @@ from django.contrib import admin
 from .models import Category, Status, Subcategory, Type
 
 
+class CategoryListFilter(admin.RelatedFieldListFilter):
+    """Фильтр по категории: варианты вместе с типами одним запросом."""
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin)
+        categories = Category.objects.select_related("type")
+        if ordering:
+            categories = categories.order_by(*ordering)
+        return [(category.pk, str(category)) for category in categories]
+
+
 @admin.register(Type)
 class TypeAdmin(admin.ModelAdmin):
     """Настройки отображения типов операций."""
 
-    list_display = ("name", "is_active")
+    list_display = ("name", "kind", "is_active")
     search_fields = ("name",)
-    list_filter = ("is_active",)
+    list_filter = ("kind", "is_active")
 
 
 @admin.register(Category)
@@ -28,6 +42,9 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ("name",)
     list_filter = ("type",)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("type")
+
 
 @admin.register(Subcategory)
 class SubcategoryAdmin(admin.ModelAdmin):
@@ -35,7 +52,17 @@ class SubcategoryAdmin(admin.ModelAdmin):
 
     list_display = ("name", "category")
     search_fields = ("name",)
-    list_filter = ("category",)
+    list_filter = (("category", CategoryListFilter),)
+
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request).select_related("category__type")
+        )
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "category":
+            kwargs["queryset"] = Category.objects.select_related("type")
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 @admin.register(Status)
@@ -0,0 +1,259 @@
+"""
+Снимок справочников в памяти процесса.
+
+Справочники маленькие и меняются редко, поэтому формы, HTMX-каскады и
+сериализаторы берут их из снимка, а не из БД. Снимок версионируется
+ключом в кэше Django: сигналы справочников меняют версию, и каждый
+процесс (воркер gunicorn) при следующем обращении перечитывает таблицы.
+Чтобы версию видели все воркеры, кэш должен быть общим (Redis).
+
+Если кэш не общий (LocMem) или смена версии ещё не дошла, снимок может
+отстать от БД. Поэтому снимок живёт не дольше
+``DIRECTORY_SNAPSHOT_TTL`` секунд, а id, которого нет в снимке,
+сверяется с БД (``snapshot_for``) — новый справочник из другого процесса
+не отклоняется как несуществующий.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Any, Iterable, Mapping, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Model
+
+from dds_project.metrics import cache_result
+
+from .models import Category, Status, Subcategory, Type
+
+# Ключ версии справочников в общем кэше
+VERSION_KEY = "directories:version"
+
+# Модели справочников по имени метода поиска в снимке
+SNAPSHOT_MODELS: dict[str, type[Model]] = {
+    "type": Type,
+    "category": Category,
+    "subcategory": Subcategory,
+    "status": Status,
+}
+
+
+def _pk(value: Any) -> Optional[int]:
+    """id из строки запроса, числа или объекта; None — если не разобрать."""
+    value = getattr(value, "pk", value)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class DirectorySnapshot:
+    """Все строки справочников, проиндексированные по id и по родителю.
+
+    Связи объектов (``subcategory.category.type``) уже заполнены объектами
+    снимка, поэтому обращение к ним не делает запросов. Объекты общие для
+    всех запросов процесса — менять их нельзя.
+    """
+
+    version: int
+    loaded_at: float = field(default_factory=time.monotonic)
+    types: dict[int, Type] = field(default_factory=dict)
+    categories: dict[int, Category] = field(default_factory=dict)
+    subcategories: dict[int, Subcategory] = field(default_factory=dict)
+    statuses: dict[int, Status] = field(default_factory=dict)
+    categories_by_type: dict[int, list[Category]] = field(
+        default_factory=dict
+    )
+    subcategories_by_category: dict[int, list[Subcategory]] = field(
+        default_factory=dict
+    )
+
+    @classmethod
+    def load(cls, version: int) -> DirectorySnapshot:
+        """Читает справочники четырьмя запросами."""
+        snapshot = cls(version=version)
+        snapshot.types = {obj.pk: obj for obj in Type.objects.all()}
+        snapshot.statuses = {obj.pk: obj for obj in Status.objects.all()}
+        for category in Category.objects.all():
+            category.type = snapshot.types[category.type_id]
+            snapshot.categories[category.pk] = category
+            snapshot.categories_by_type.setdefault(
+                category.type_id, []
+            ).append(category)
+        for subcategory in Subcategory.objects.all():
+            subcategory.category = snapshot.categories[
+                subcategory.category_id
+            ]
+            snapshot.subcategories[subcategory.pk] = subcategory
+            snapshot.subcategories_by_category.setdefault(
+                subcategory.category_id, []
+            ).append(subcategory)
+        return snapshot
+
+    def type(self, value: Any) -> Optional[Type]:
+        """Тип по id (или None)."""
+        return self.types.get(_pk(value))
+
+    def category(self, value: Any) -> Optional[Category]:
+        """Категория по id (или None)."""
+        return self.categories.get(_pk(value))
+
+    def subcategory(self, value: Any) -> Optional[Subcategory]:
+        """Подкатегория по id (или None)."""
+        return self.subcategories.get(_pk(value))
+
+    def status(self, value: Any) -> Optional[Status]:
+        """Статус по id (или None)."""
+        return self.statuses.get(_pk(value))
+
+    def categories_of(self, type_id: Any) -> list[Category]:
+        """Категории типа, отсортированные по названию."""
+        return self.categories_by_type.get(_pk(type_id), [])
+
+    def subcategories_of(self, category_id: Any) -> list[Subcategory]:
+        """Подкатегории категории, отсортированные по названию."""
+        return self.subcategories_by_category.get(_pk(category_id), [])
+
+    @cached_property
+    def tree_json(self) -> str:
+        """
+        Дерево справочников для каскадов на клиенте, компактным JSON.
+
+        ``v`` — версия снимка; ``t`` — типы ``[[id, название], ...]``;
+        ``c`` и ``s`` — категории по id типа и подкатегории по id
+        категории. Строится один раз на версию.
+        """
+
+        def pairs(objs) -> list[tuple[int, str]]:
+            return [(obj.pk, obj.name) for obj in objs]
+
+        tree = {
+            "v": str(self.version),
+            "t": pairs(self.types.values()),
+            "c": {
+                pk: pairs(objs)
+                for pk, objs in self.categories_by_type.items()
+            },
+            "s": {
+                pk: pairs(objs)
+                for pk, objs in self.subcategories_by_category.items()
+            },
+        }
+        return json.dumps(tree, ensure_ascii=False, separators=(",", ":"))
+
+    def is_fresh(self, version: int) -> bool:
+        """Снимок той же версии и не старше ``DIRECTORY_SNAPSHOT_TTL``."""
+        age = time.monotonic() - self.loaded_at
+        return (
+            self.version == version and age < settings.DIRECTORY_SNAPSHOT_TTL
+        )
+
+
+_lock = threading.Lock()
+_snapshot: Optional[DirectorySnapshot] = None
+
+
+def current_version() -> int:
+    """Версия справочников из общего кэша (создаётся при отсутствии)."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY, 0)
+    return version
+
+
+def get_snapshot() -> DirectorySnapshot:
+    """
+    Актуальный снимок справочников.
+
+    Одно обращение к кэшу за версией; таблицы перечитываются, только
+    если версия изменилась или истёк ``DIRECTORY_SNAPSHOT_TTL``.
+
+    Returns:
+        DirectorySnapshot: снимок текущей версии.
+    """
+    global _snapshot
+    version = current_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.is_fresh(version):
+        cache_result("directories", hit=True)
+        return snapshot
+    with _lock:
+        if _snapshot is None or not _snapshot.is_fresh(version):
+            cache_result("directories", hit=False)
+            _snapshot = DirectorySnapshot.load(version)
+        return _snapshot
+
+
+def snapshot_for(ids: Mapping[str, Iterable[Any]]) -> DirectorySnapshot:
+    """
+    Снимок, в котором есть все переданные id, существующие в БД.
+
+    id, которых нет в снимке, проверяются по БД (один запрос на
+    справочник, только при промахе). Если какой-то из них в БД есть,
+    снимок отстал — он перечитывается; иначе id действительно неверные
+    и возвращается текущий снимок.
+
+    Args:
+        ids (Mapping[str, Iterable]): id по справочникам (ключи —
+            ``SNAPSHOT_MODELS``).
+    Returns:
+        DirectorySnapshot: снимок для проверки этих id.
+    """
+    global _snapshot
+    snapshot = get_snapshot()
+    for name, values in ids.items():
+        lookup = getattr(snapshot, name)
+        missing = {
+            pk
+            for pk in map(_pk, values)
+            if pk is not None and lookup(pk) is None
+        }
+        if not missing:
+            continue
+        model = SNAPSHOT_MODELS[name]
+        if model._default_manager.filter(pk__in=missing).exists():
+            with _lock:
+                if _snapshot is snapshot:
+                    cache_result("directories", hit=False)
+                    _snapshot = DirectorySnapshot.load(current_version())
+                return _snapshot
+    return snapshot
+
+
+async def acurrent_version() -> int:
+    """Асинхронный ``current_version``."""
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(VERSION_KEY, 0)
+    return version
+
+
+async def aget_snapshot() -> DirectorySnapshot:
+    """
+    Асинхронный ``get_snapshot`` для async-вьюх.
+
+    Версия читается через async-API кэша; если снимок устарел, таблицы
+    перечитываются в потоке (ORM в event loop синхронно не работает).
+    """
+    version = await acurrent_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.is_fresh(version):
+        cache_result("directories", hit=True)
+        return snapshot
+    return await sync_to_async(get_snapshot)()
+
+
+def invalidate() -> None:
+    """Сбрасывает снимок во всех процессах (новая версия в кэше)."""
+    global _snapshot
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+    _snapshot = None
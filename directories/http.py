@@ -0,0 +1,120 @@
+"""
+Условные GET-запросы (ETag / Last-Modified) для справочников.
+
+Ответы справочников зависят только от версии снимка
+(``directories.cache``), поэтому ETag и Last-Modified вычисляются из неё
+без обращения к таблицам. Пока версия не изменилась, браузер и прокси
+получают ``304 Not Modified``. Для одного объекта ETag вычисляется, только
+если объект есть в снимке, — иначе вьюха отвечает 404, а не 304.
+В общих кэшах (``public``) хранится только JSON; HTML browsable API и
+HTMX — ``private``.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Optional
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
+
+from .cache import current_version, get_snapshot
+
+# Форматы ответа DRF, которые можно хранить в общих кэшах (прокси, CDN);
+# HTML browsable API — только в кэше браузера
+PUBLIC_FORMATS = frozenset({"json"})
+
+
+def directory_etag(request, *args, **kwargs) -> str:
+    """ETag ответа — версия справочников (и формат ответа DRF)."""
+    renderer = getattr(request, "accepted_renderer", None)
+    suffix = f"-{renderer.format}" if renderer is not None else ""
+    return f'"dir-{current_version()}{suffix}"'
+
+
+def directory_last_modified(request, *args, **kwargs) -> datetime:
+    """Время последнего изменения справочников (версия — time_ns)."""
+    return datetime.fromtimestamp(
+        current_version() / 1_000_000_000, tz=timezone.utc
+    )
+
+
+def _cache_headers(view_func: Callable) -> Callable:
+    """
+    ``Cache-Control`` успешного ответа: ``public`` для JSON, ``private``
+    для остальных форматов; ответы с ошибками не кэшируются.
+    """
+
+    def patch(request, response):
+        if response.status_code not in (200, 304):
+            return response
+        renderer = getattr(request, "accepted_renderer", None)
+        public = renderer is not None and renderer.format in PUBLIC_FORMATS
+        patch_cache_control(
+            response,
+            public=public,
+            private=not public,
+            max_age=settings.DIRECTORY_CACHE_MAX_AGE,
+        )
+        return response
+
+    if iscoroutinefunction(view_func):
+
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            response = await view_func(request, *args, **kwargs)
+            return patch(request, response)
+
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        return patch(request, view_func(request, *args, **kwargs))
+
+    return wrapper
+
+
+def directory_cache(
+    view_func: Optional[Callable] = None, *, kind: Optional[str] = None
+) -> Callable:
+    """
+    Декоратор GET-вьюхи справочников: ETag, Last-Modified, 304 и
+    ``Cache-Control`` (время жизни — ``DIRECTORY_CACHE_MAX_AGE``).
+
+    ``Vary: Accept`` — DRF отдаёт по одному адресу и JSON, и HTML.
+
+    Args:
+        view_func (Callable | None): вьюха (или None — декоратор с
+            параметрами).
+        kind (str | None): справочник объекта ``pk`` (ключ
+            ``SNAPSHOT_MODELS``) для вьюх одного объекта: если в снимке
+            его нет, ETag не вычисляется и вьюха отвечает сама (404), а
+            не 304.
+    """
+    if view_func is None:
+        return lambda func: directory_cache(func, kind=kind)
+
+    def exists(kwargs) -> bool:
+        return kind is None or (
+            getattr(get_snapshot(), kind)(kwargs.get("pk")) is not None
+        )
+
+    def etag(request, *args, **kwargs) -> Optional[str]:
+        if not exists(kwargs):
+            return None
+        return directory_etag(request, *args, **kwargs)
+
+    def last_modified(request, *args, **kwargs) -> Optional[datetime]:
+        if not exists(kwargs):
+            return None
+        return directory_last_modified(request, *args, **kwargs)
+
+    view_func = condition(
+        etag_func=etag, last_modified_func=last_modified
+    )(view_func)
+    view_func = vary_on_headers("Accept")(view_func)
+    return _cache_headers(view_func)
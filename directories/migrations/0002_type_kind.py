@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+# Вид существующих типов — по названию, как считались итоги до поля kind
+KINDS_BY_NAME = {"пополнение": "income", "списание": "outcome"}
+
+
+def fill_kinds(apps, schema_editor):
+    Type = apps.get_model("directories", "Type")
+    for type_obj in Type.objects.all():
+        kind = KINDS_BY_NAME.get(type_obj.name.lower())
+        if kind:
+            type_obj.kind = kind
+            type_obj.save(update_fields=["kind"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directories', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='type',
+            name='kind',
+            field=models.CharField(choices=[('income', 'Приход'), ('outcome', 'Расход'), ('other', 'Прочее')], default='other', max_length=10, verbose_name='Вид'),
+        ),
+        migrations.RunPython(fill_kinds, migrations.RunPython.noop),
+    ]
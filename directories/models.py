@@ -9,12 +9,26 @@ from __future__ import annotations
 from django.db import models
 
 
+class TypeKind(models.TextChoices):
+    """Вид типа операции: по нему считаются приход и расход."""
+
+    INCOME = "income", "Приход"
+    OUTCOME = "outcome", "Расход"
+    OTHER = "other", "Прочее"
+
+
 class Type(models.Model):
     """Тип операции."""
 
     name: models.CharField = models.CharField(
         "Название типа", max_length=100, unique=True
     )
+    kind: models.CharField = models.CharField(
+        "Вид",
+        max_length=10,
+        choices=TypeKind.choices,
+        default=TypeKind.OTHER,
+    )
     is_active: models.BooleanField = models.BooleanField(
         "Активен", default=True
     )
@@ -14,7 +14,7 @@ class TypeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Type
-        fields = ["id", "name", "is_active"]
+        fields = ["id", "name", "kind", "is_active"]
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -0,0 +1,30 @@
+"""
+Сигналы справочников: сброс снимка в памяти процессов.
+"""
+
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate
+from .models import Category, Status, Subcategory, Type
+
+
+@receiver(post_save, sender=Type)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_save, sender=Status)
+@receiver(post_delete, sender=Type)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Subcategory)
+@receiver(post_delete, sender=Status)
+def invalidate_directory_snapshot(sender, **kwargs) -> None:
+    """
+    Меняет версию справочников после фиксации транзакции.
+
+    До коммита другие воркеры всё равно не видят изменений, поэтому
+    перечитывать снимок раньше бессмысленно.
+    """
+    transaction.on_commit(invalidate)
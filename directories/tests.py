@@ -0,0 +1,304 @@
+"""
+Бюджет SQL-запросов API справочников, каскадов и админки справочников,
+снимок справочников в памяти и условные GET-запросы.
+
+Объём данных здесь — число строк справочников: списки и страницы админки
+не должны делать запрос на каждую строку.
+"""
+
+from __future__ import annotations
+
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from dds_project.testing import (
+    QueryBudgetTestCase,
+    create_directories,
+    create_statuses,
+)
+
+from . import cache as snapshots
+from .models import Status
+
+# Список и карточка справочника — один SELECT (с JOIN родителей)
+API_READ_QUERIES = 1
+# Каскады — из снимка справочников; 304 — по версии снимка
+API_CASCADE_QUERIES = 0
+# Создание: родитель, проверка уникальности и INSERT
+API_CREATE_QUERIES = 3
+# Список в админке: сессия, пользователь, два подсчёта (по фильтру и
+# всего), строки и варианты фильтра (категории — вместе с типами)
+ADMIN_CHANGELIST_QUERIES = 6
+# Форма в админке: сессия, пользователь, объект (с родителями) и
+# варианты родителя
+ADMIN_CHANGE_QUERIES = 4
+
+
+class DirectoryQueryBudgetMixin:
+    """Рост данных — новые справочники вместо записей ДДС."""
+
+    batches = 0
+
+    def grow(self, count: int) -> None:
+        for _ in range(max(count // 8, 1)):
+            type(self).batches += 1
+            prefix = f"{self.batches}-"
+            create_directories(prefix)
+            Status.objects.create(name=f"{prefix}статус", code=f"{prefix}s")
+
+
+class DirectoryApiQueryBudgetTests(
+    DirectoryQueryBudgetMixin, QueryBudgetTestCase
+):
+    """CRUD справочников и каскады ``/api/``."""
+
+    login = False
+
+    def test_list_and_retrieve(self) -> None:
+        objects = {
+            "types": self.subcategories[0].category.type,
+            "categories": self.subcategories[0].category,
+            "subcategories": self.subcategories[0],
+            "statuses": self.statuses[0],
+        }
+        for basename, obj in objects.items():
+            with self.subTest(basename=basename):
+                list_url = reverse(f"{basename}-list")
+                self.assertQueryBudget(
+                    API_READ_QUERIES, lambda: self.client.get(list_url)
+                )
+                detail_url = reverse(f"{basename}-detail", args=[obj.pk])
+                self.assertQueryBudget(
+                    API_READ_QUERIES, lambda: self.client.get(detail_url)
+                )
+
+    def test_not_modified(self) -> None:
+        url = reverse("subcategories-list")
+
+        def conditional_get():
+            etag = self.client.get(url).headers["ETag"]
+            with self.assertNumQueries(0):
+                return self.client.get(url, headers={"if-none-match": etag})
+
+        self.assertQueryBudget(
+            API_READ_QUERIES, conditional_get, status=304
+        )
+
+    def test_cascades(self) -> None:
+        category = self.subcategories[0].category
+        urls = [
+            reverse("types-cascade-categories", args=[category.type_id]),
+            reverse(
+                "categories-cascade-subcategories", args=[category.pk]
+            ),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertQueryBudget(
+                    API_CASCADE_QUERIES, lambda: self.client.get(url)
+                )
+
+    def test_create(self) -> None:
+        category = self.subcategories[0].category
+        names = iter(range(100))
+
+        def create():
+            return self.client.post(
+                reverse("subcategories-list"),
+                json.dumps(
+                    {"name": f"новая {next(names)}", "category": category.pk}
+                ),
+                content_type="application/json",
+            )
+
+        self.assertQueryBudget(API_CREATE_QUERIES, create, status=201)
+
+
+class DirectoryAdminQueryBudgetTests(
+    DirectoryQueryBudgetMixin, QueryBudgetTestCase
+):
+    """Списки и формы справочников в админке."""
+
+    def test_changelists(self) -> None:
+        for model in ("type", "category", "subcategory", "status"):
+            with self.subTest(model=model):
+                url = reverse(f"admin:directories_{model}_changelist")
+                self.assertQueryBudget(
+                    ADMIN_CHANGELIST_QUERIES, lambda: self.client.get(url)
+                )
+
+    def test_add_forms(self) -> None:
+        for model in ("type", "category", "subcategory", "status"):
+            with self.subTest(model=model):
+                url = reverse(f"admin:directories_{model}_add")
+                self.assertQueryBudget(
+                    ADMIN_CHANGE_QUERIES, lambda: self.client.get(url)
+                )
+
+    def test_change_forms(self) -> None:
+        objects = {
+            "type": self.subcategories[0].category.type,
+            "category": self.subcategories[0].category,
+            "subcategory": self.subcategories[0],
+            "status": self.statuses[0],
+        }
+        for model, obj in objects.items():
+            with self.subTest(model=model):
+                url = reverse(
+                    f"admin:directories_{model}_change", args=[obj.pk]
+                )
+                self.assertQueryBudget(
+                    ADMIN_CHANGE_QUERIES, lambda: self.client.get(url)
+                )
+
+
+class DirectorySnapshotTests(TestCase):
+    """Снимок справочников: смена версии, TTL и сверка промахов с БД."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.subcategory = create_directories()[0]
+        create_statuses()
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.snapshot = snapshots.get_snapshot()
+
+    def create_status_elsewhere(self) -> Status:
+        """
+        Статус, созданный «другим процессом»: в тестах коллбэки
+        on_commit не выполняются, поэтому версия в кэше не меняется.
+        """
+        status = Status.objects.create(name="Новый", code="new")
+        self.assertIs(snapshots.get_snapshot(), self.snapshot)
+        self.assertIsNone(self.snapshot.status(status.pk))
+        return status
+
+    def test_change_invalidates_snapshot(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            status = Status.objects.create(name="Новый", code="new")
+
+        snapshot = snapshots.get_snapshot()
+        self.assertIsNot(snapshot, self.snapshot)
+        self.assertEqual(snapshot.status(status.pk), status)
+
+    def test_snapshot_expires(self) -> None:
+        with override_settings(DIRECTORY_SNAPSHOT_TTL=0):
+            self.assertIsNot(snapshots.get_snapshot(), self.snapshot)
+
+    def test_miss_is_checked_against_database(self) -> None:
+        status = self.create_status_elsewhere()
+
+        snapshot = snapshots.snapshot_for({"status": [status.pk]})
+        self.assertEqual(snapshot.status(status.pk), status)
+        self.assertIs(snapshots.get_snapshot(), snapshot)
+
+    def test_unknown_id_keeps_snapshot(self) -> None:
+        with self.assertNumQueries(1):
+            snapshot = snapshots.snapshot_for({"status": [10**9, "x"]})
+        self.assertIs(snapshot, self.snapshot)
+        with self.assertNumQueries(0):
+            snapshots.snapshot_for({"status": []})
+
+    def test_api_accepts_directory_from_another_process(self) -> None:
+        status = self.create_status_elsewhere()
+        row = {
+            "created_at": timezone.now().isoformat(),
+            "status": status.pk,
+            "subcategory": self.subcategory.pk,
+            "amount": "10.00",
+        }
+
+        response = self.client.post(
+            reverse("cashflows-list"), row, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_bulk_accepts_directory_from_another_process(self) -> None:
+        status = self.create_status_elsewhere()
+        row = {
+            "status": status.pk,
+            "subcategory": self.subcategory.pk,
+            "amount": "10.00",
+        }
+
+        response = self.client.post(
+            reverse("cashflows-bulk-create"),
+            [row, {**row, "status": 10**9}],
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [error["index"] for error in response.json()["errors"]], [1]
+        )
+
+
+class DirectoryHttpCacheTests(TestCase):
+    """ETag, 304 и ``Cache-Control`` GET-эндпоинтов справочников."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.subcategory = create_directories()[0]
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_not_modified(self) -> None:
+        url = reverse("subcategories-detail", args=[self.subcategory.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            url, headers={"if-none-match": response.headers["ETag"]}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed_directories_are_modified(self) -> None:
+        url = reverse("subcategories-list")
+        etag = self.client.get(url).headers["ETag"]
+        snapshots.invalidate()
+
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_missing_object_is_not_found(self) -> None:
+        url = reverse("subcategories-detail", args=[self.subcategory.pk])
+        found = self.client.get(url)
+        missing = [
+            reverse("subcategories-detail", args=[10**9]),
+            reverse("types-cascade-categories", args=[10**9]),
+        ]
+        for missing_url in missing:
+            with self.subTest(url=missing_url):
+                response = self.client.get(
+                    missing_url,
+                    headers={
+                        "if-none-match": found.headers["ETag"],
+                        "if-modified-since": found.headers["Last-Modified"],
+                    },
+                )
+                self.assertNotEqual(response.status_code, 304)
+                self.assertNotIn("ETag", response.headers)
+
+    def test_only_json_is_public(self) -> None:
+        url = reverse("subcategories-list")
+        cases = [
+            (url, "application/json", "public"),
+            (url, "text/html", "private"),
+            (reverse("htmx-type-categories"), "text/html", "private"),
+        ]
+        for case_url, accept, scope in cases:
+            with self.subTest(url=case_url, accept=accept):
+                response = self.client.get(
+                    case_url, headers={"accept": accept}
+                )
+                self.assertEqual(response.status_code, 200)
+                cache_control = response.headers["Cache-Control"]
+                self.assertIn(scope, cache_control)
+                self.assertIn("max-age=", cache_control)
+                self.assertIn("Accept", response.headers["Vary"])
@@ -4,10 +4,13 @@ API-вьюхи DRF для справочников и каскадных спи
 
 from __future__ import annotations
 
+from django.utils.decorators import method_decorator
 from rest_framework import mixins, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from .cache import get_snapshot
+from .http import directory_cache
 from .models import Category, Status, Subcategory, Type
 from .serializers import (
     CategorySerializer,
@@ -17,6 +20,8 @@ from .serializers import (
 )
 
 
+@method_decorator(directory_cache, name="list")
+@method_decorator(directory_cache(kind="type"), name="retrieve")
 class TypeViewSet(viewsets.ModelViewSet):
     """CRUD для типов операции."""
 
@@ -24,6 +29,8 @@ class TypeViewSet(viewsets.ModelViewSet):
     serializer_class = TypeSerializer
 
 
+@method_decorator(directory_cache, name="list")
+@method_decorator(directory_cache(kind="category"), name="retrieve")
 class CategoryViewSet(viewsets.ModelViewSet):
     """CRUD для категорий."""
 
@@ -31,6 +38,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
 
 
+@method_decorator(directory_cache, name="list")
+@method_decorator(directory_cache(kind="subcategory"), name="retrieve")
 class SubcategoryViewSet(viewsets.ModelViewSet):
     """CRUD для подкатегорий."""
 
@@ -42,6 +51,8 @@ class SubcategoryViewSet(viewsets.ModelViewSet):
     serializer_class = SubcategorySerializer
 
 
+@method_decorator(directory_cache, name="list")
+@method_decorator(directory_cache(kind="status"), name="retrieve")
 class StatusViewSet(viewsets.ModelViewSet):
     """CRUD для статусов."""
 
@@ -49,6 +60,7 @@ class StatusViewSet(viewsets.ModelViewSet):
     serializer_class = StatusSerializer
 
 
+@method_decorator(directory_cache(kind="type"), name="retrieve")
 class TypeCascadeViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     """Каскады для типов: получить список категорий по type_id."""
 
@@ -56,13 +68,15 @@ class TypeCascadeViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     serializer_class = TypeSerializer
 
     @action(detail=True, methods=["get"], url_path="categories")
+    @method_decorator(directory_cache(kind="type"))
     def categories(self, request, pk: str) -> Response:
         """Возвращает категории для заданного типа."""
-        qs = Category.objects.filter(type_id=pk).order_by("name")
-        data = CategorySerializer(qs, many=True).data
+        categories = get_snapshot().categories_of(pk)
+        data = CategorySerializer(categories, many=True).data
         return Response(data)
 
 
+@method_decorator(directory_cache(kind="category"), name="retrieve")
 class CategoryCascadeViewSet(
     mixins.RetrieveModelMixin, viewsets.GenericViewSet
 ):
@@ -72,8 +86,9 @@ class CategoryCascadeViewSet(
     serializer_class = CategorySerializer
 
     @action(detail=True, methods=["get"], url_path="subcategories")
+    @method_decorator(directory_cache(kind="category"))
     def subcategories(self, request, pk: str) -> Response:
         """Возвращает подкатегории для заданной категории."""
-        qs = Subcategory.objects.filter(category_id=pk).order_by("name")
-        data = SubcategorySerializer(qs, many=True).data
+        subcategories = get_snapshot().subcategories_of(pk)
+        data = SubcategorySerializer(subcategories, many=True).data
         return Response(data)
@@ -4,11 +4,118 @@
 
 from __future__ import annotations
 
+from typing import Any, Callable, Iterable, Optional
+
 from django import forms
+from django.conf import settings
+from django.db.models import Model
+from django.forms.models import ModelChoiceIterator
 from django.utils import timezone
 
 from cashflow.models import Cashflow
-from directories.models import Category, Status, Subcategory, Type
+from directories.cache import get_snapshot, snapshot_for
+
+
+class SnapshotChoiceIterator(ModelChoiceIterator):
+    """Варианты выбора из снимка справочников вместо queryset."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.field.objects():
+            yield self.choice(obj)
+
+    def __len__(self) -> int:
+        return len(self.field.objects()) + (
+            self.field.empty_label is not None
+        )
+
+    def __bool__(self) -> bool:
+        return self.field.empty_label is not None or bool(
+            self.field.objects()
+        )
+
+
+class SnapshotChoiceField(forms.ModelChoiceField):
+    """
+    Выбор объекта справочника без запросов к БД.
+
+    ``objects`` — функция, возвращающая допустимые объекты из снимка
+    справочников; её же используем и для проверки значения. ``kind`` —
+    справочник (ключ ``SNAPSHOT_MODELS``): значение, которого нет в
+    снимке, сверяется с БД, и после перечитывания снимка ищется снова.
+    """
+
+    iterator = SnapshotChoiceIterator
+
+    def __init__(
+        self,
+        objects: Callable[[], Iterable[Model]] = lambda: [],
+        kind: Optional[str] = None,
+        **kwargs: Any,
+    ) -> None:
+        self.objects = objects
+        self.kind = kind
+        super().__init__(queryset=None, **kwargs)
+
+    def _find(self, value: Any) -> Model | None:
+        for obj in self.objects():
+            if str(obj.pk) == str(value):
+                return obj
+        return None
+
+    def to_python(self, value: Any) -> Model | None:
+        if value in self.empty_values:
+            return None
+        value = getattr(value, "pk", value)
+        obj = self._find(value)
+        if obj is None and self.kind is not None:
+            # снимок мог отстать от БД: если значение там есть, снимок
+            # перечитывается, и ``objects`` смотрит уже в новый
+            snapshot_for({self.kind: [value]})
+            obj = self._find(value)
+        if obj is not None:
+            return obj
+        raise forms.ValidationError(
+            self.error_messages["invalid_choice"],
+            code="invalid_choice",
+            params={"value": value},
+        )
+
+
+def _all_types() -> list:
+    return list(get_snapshot().types.values())
+
+
+def _all_statuses() -> list:
+    return list(get_snapshot().statuses.values())
+
+
+def _cascade(form: forms.Form, type_id: Any, category_id: Any) -> None:
+    """Ограничивает категории выбранным типом, подкатегории — категорией."""
+    form.fields["category"].objects = lambda: get_snapshot().categories_of(
+        type_id
+    )
+    form.fields["subcategory"].objects = (
+        lambda: get_snapshot().subcategories_of(category_id)
+    )
+    if settings.UI_CASCADE == "client":
+        _client_cascade(form)
+
+
+def _client_cascade(form: forms.Form) -> None:
+    """
+    Каскад на клиенте: вместо HTMX-запросов селекты заполняются из
+    дерева справочников на странице (ключи ``c`` и ``s`` в
+    ``DirectorySnapshot.tree_json``).
+    """
+    links = (("type", "category", "c"), ("category", "subcategory", "s"))
+    for source, target, key in links:
+        attrs = form.fields[source].widget.attrs
+        for name in ("hx-get", "hx-target", "hx-trigger"):
+            attrs.pop(name, None)
+        attrs["data-cascade"] = key
+        attrs["data-cascade-target"] = f"id_{target}"
 
 
 class CashflowFilterForm(forms.Form):
@@ -28,15 +135,28 @@ class CashflowFilterForm(forms.Form):
             attrs={"type": "datetime-local", "class": "form-control"}
         ),
     )
-    status = forms.ModelChoiceField(
+    status = SnapshotChoiceField(
+        _all_statuses,
+        kind="status",
         label="Статус",
-        queryset=Status.objects.all(),
         required=False,
         widget=forms.Select(attrs={"class": "form-select"}),
     )
-    type = forms.ModelChoiceField(
+    q = forms.CharField(
+        label="Поиск",
+        required=False,
+        widget=forms.TextInput(
+            attrs={
+                "class": "form-control",
+                "type": "search",
+                "placeholder": "Слова из комментария",
+            }
+        ),
+    )
+    type = SnapshotChoiceField(
+        _all_types,
+        kind="type",
         label="Тип",
-        queryset=Type.objects.all(),
         required=False,
         widget=forms.Select(
             attrs={
@@ -47,9 +167,9 @@ class CashflowFilterForm(forms.Form):
             }
         ),
     )
-    category = forms.ModelChoiceField(
+    category = SnapshotChoiceField(
+        kind="category",
         label="Категория",
-        queryset=Category.objects.none(),
         required=False,
         widget=forms.Select(
             attrs={
@@ -60,9 +180,9 @@ class CashflowFilterForm(forms.Form):
             }
         ),
     )
-    subcategory = forms.ModelChoiceField(
+    subcategory = SnapshotChoiceField(
+        kind="subcategory",
         label="Подкатегория",
-        queryset=Subcategory.objects.none(),
         required=False,
         widget=forms.Select(attrs={"class": "form-select"}),
     )
@@ -78,22 +198,7 @@ class CashflowFilterForm(forms.Form):
         ] = "/htmx/categories/subcategories/"
 
         data = self.data if self.is_bound else {}
-        type_id = data.get("type") or None
-        category_id = data.get("category") or None
-
-        if type_id:
-            self.fields["category"].queryset = Category.objects.filter(
-                type_id=type_id
-            ).order_by("name")
-        else:
-            self.fields["category"].queryset = Category.objects.none()
-
-        if category_id:
-            self.fields["subcategory"].queryset = Subcategory.objects.filter(
-                category_id=category_id
-            ).order_by("name")
-        else:
-            self.fields["subcategory"].queryset = Subcategory.objects.none()
+        _cascade(self, data.get("type"), data.get("category"))
 
 
 class CashflowForm(forms.ModelForm):
@@ -109,11 +214,12 @@ class CashflowForm(forms.ModelForm):
         ),
     )
 
-    # В форме держим «виртуальные» поля type и category для UX, но сохраняем
-    # только subcategory/status.
-    type = forms.ModelChoiceField(
+    # В форме держим поля type и category для UX, но сохраняем только
+    # subcategory/status: тип и категорию модель берёт из подкатегории.
+    type = SnapshotChoiceField(
+        _all_types,
+        kind="type",
         label="Тип",
-        queryset=Type.objects.all(),
         required=False,
         widget=forms.Select(
             attrs={
@@ -125,9 +231,9 @@ class CashflowForm(forms.ModelForm):
             }
         ),
     )
-    category = forms.ModelChoiceField(
+    category = SnapshotChoiceField(
+        kind="category",
         label="Категория",
-        queryset=Category.objects.none(),
         required=False,
         widget=forms.Select(
             attrs={
@@ -139,14 +245,24 @@ class CashflowForm(forms.ModelForm):
             }
         ),
     )
+    status = SnapshotChoiceField(
+        _all_statuses,
+        kind="status",
+        label="Статус",
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+    subcategory = SnapshotChoiceField(
+        kind="subcategory",
+        label="Подкатегория",
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
 
     class Meta:
         model = Cashflow
+        # type и category в модели заполняются из подкатегории сами
         fields = [
             "created_at",
             "status",
-            "type",
-            "category",
             "subcategory",
             "amount",
             "comment",
@@ -155,8 +271,6 @@ class CashflowForm(forms.ModelForm):
             "created_at": forms.DateTimeInput(
                 attrs={"type": "datetime-local", "class": "form-control"}
             ),
-            "status": forms.Select(attrs={"class": "form-select"}),
-            "subcategory": forms.Select(attrs={"class": "form-select"}),
             "amount": forms.NumberInput(
                 attrs={"step": "0.01", "class": "form-control"}
             ),
@@ -166,8 +280,6 @@ class CashflowForm(forms.ModelForm):
         }
         labels = {
             "created_at": "Дата/время",
-            "status": "Статус",
-            "subcategory": "Подкатегория",
             "amount": "Сумма",
             "comment": "Комментарий",
         }
@@ -189,40 +301,21 @@ class CashflowForm(forms.ModelForm):
                     "%Y-%m-%dT%H:%M"
                 )
 
-        # Когда редактируем существующую запись — заполняем каскад из instance
-        if self.instance and self.instance.pk:
-            subcat = self.instance.subcategory
-            cat = subcat.category
-            typ = cat.type
-            self.fields["type"].initial = typ.pk
-            self.fields["category"].queryset = Category.objects.filter(
-                type=typ
-            ).order_by("name")
-            self.fields["category"].initial = cat.pk
-            self.fields["subcategory"].queryset = Subcategory.objects.filter(
-                category=cat
-            ).order_by("name")
-            return
-
-        # Когда форма привязана к данным (POST/GET) — подставим queryset'ы
+        # Когда открываем существующую запись — заполняем каскад из
+        # instance (при отправке варианты ограничивают выбранные значения)
+        if self.instance and self.instance.pk and not self.is_bound:
+            subcat = get_snapshot().subcategory(self.instance.subcategory_id)
+            if subcat is not None:
+                cat = subcat.category
+                self.fields["type"].initial = cat.type_id
+                self.fields["category"].initial = cat.pk
+                _cascade(self, cat.type_id, cat.pk)
+                return
+
+        # Когда форма привязана к данным (POST/GET) — ограничим варианты
         # по выбранным значениям
         data = self.data if self.is_bound else {}
-        type_id = data.get("type") or None
-        category_id = data.get("category") or None
-
-        if type_id:
-            self.fields["category"].queryset = Category.objects.filter(
-                type_id=type_id
-            ).order_by("name")
-        else:
-            self.fields["category"].queryset = Category.objects.none()
-
-        if category_id:
-            self.fields["subcategory"].queryset = Subcategory.objects.filter(
-                category_id=category_id
-            ).order_by("name")
-        else:
-            self.fields["subcategory"].queryset = Subcategory.objects.none()
+        _cascade(self, data.get("type"), data.get("category"))
 
     def clean(self) -> dict:
         """
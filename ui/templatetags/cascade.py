@@ -0,0 +1,34 @@
+"""
+Тег ``{% directory_tree %}``: дерево справочников и скрипт каскадов.
+"""
+
+from __future__ import annotations
+
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from directories.cache import get_snapshot
+
+register = template.Library()
+
+# Экранирование JSON внутри <script>, как у json_script
+_SCRIPT_ESCAPES = {
+    ord("<"): "\\u003C",
+    ord(">"): "\\u003E",
+    ord("&"): "\\u0026",
+}
+
+
+@register.inclusion_tag("includes/_cascade.html")
+def directory_tree() -> dict:
+    """
+    Встраивает дерево справочников один раз на страницу.
+
+    Только в режиме ``UI_CASCADE="client"``; JSON строится один раз на
+    версию справочников (``DirectorySnapshot.tree_json``).
+    """
+    if settings.UI_CASCADE != "client":
+        return {"tree": None}
+    tree = get_snapshot().tree_json.translate(_SCRIPT_ESCAPES)
+    return {"tree": mark_safe(tree)}
@@ -0,0 +1,419 @@
+"""
+Бюджет SQL-запросов страниц интерфейса, навигация по списку и проверка
+формы записи ДДС.
+
+Число запросов не зависит от числа записей ДДС: названия справочников в
+строках списка и варианты селектов формы берутся из снимка
+справочников, а не запросом на строку (N+1).
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from datetime import timedelta
+from decimal import Decimal
+from html import unescape
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from dds_project.testing import (
+    QueryBudgetTestCase,
+    create_cashflows,
+    create_directories,
+    create_statuses,
+)
+from directories.cache import get_snapshot
+from directories.models import Category, Subcategory
+
+from .forms import CashflowForm
+from .views import LIST_PAGE_SIZE
+
+# Интерфейс открыт без входа, сообщения хранятся в cookie: запросов к
+# сессии нет.
+# Список: строки страницы и итоги выборки
+LIST_QUERIES = 2
+# Выгрузка: одна выборка, читаемая пачками
+EXPORT_QUERIES = 1
+# Форма создания: варианты селектов — из снимка справочников
+CREATE_FORM_QUERIES = 0
+# Форма изменения: запись со статусом
+UPDATE_FORM_QUERIES = 1
+# Сохранение: запись (при изменении), категория и тип подкатегории,
+# INSERT/UPDATE, корзины агрегата, их пересчёт (с блокировкой дней) и
+# транзакции
+SAVE_QUERIES = 13
+# Удаление: запись, DELETE, пересчёт корзины (с блокировкой дня) и
+# транзакции
+DELETE_QUERIES = 9
+# HTMX-варианты селектов — из снимка справочников
+OPTIONS_QUERIES = 0
+
+
+class UiQueryBudgetTests(QueryBudgetTestCase):
+    """Список, выгрузка, формы записи ДДС и HTMX-каскады."""
+
+    login = False
+    # больше строки, чем на странице списка: есть следующая страница
+    small_rows = LIST_PAGE_SIZE + 5
+
+    def form_data(self, index: int = 0) -> dict:
+        subcategory = self.subcategories[index % len(self.subcategories)]
+        return {
+            "created_at": timezone.localtime().strftime("%Y-%m-%dT%H:%M"),
+            "status": self.statuses[0].pk,
+            "type": subcategory.category.type_id,
+            "category": subcategory.category_id,
+            "subcategory": subcategory.pk,
+            "amount": "250.00",
+            "comment": "из формы",
+        }
+
+    def test_list(self) -> None:
+        url = reverse("cashflow-list")
+        self.assertQueryBudget(LIST_QUERIES, lambda: self.client.get(url))
+
+    def test_list_filters(self) -> None:
+        subcategory = self.subcategories[0]
+        params = [
+            {"status": self.statuses[0].pk, "q": "запись"},
+            {
+                "type": subcategory.category.type_id,
+                "category": subcategory.category_id,
+            },
+            {
+                "type": subcategory.category.type_id,
+                "category": subcategory.category_id,
+                "subcategory": subcategory.pk,
+                "date_from": "2000-01-01T00:00",
+            },
+        ]
+        url = reverse("cashflow-list")
+        for query in params:
+            with self.subTest(**query):
+                self.assertQueryBudget(
+                    LIST_QUERIES, lambda: self.client.get(url, query)
+                )
+
+    def test_list_next_page(self) -> None:
+        url = reverse("cashflow-list")
+
+        def next_page():
+            cursor = self.client.get(url).context["page"].next_cursor
+            return self.client.get(url, {"cursor": cursor})
+
+        # в замер входят обе страницы; итоги второй — из кэша
+        self.assertQueryBudget(LIST_QUERIES * 2 - 1, next_page)
+
+    def test_export(self) -> None:
+        url = reverse("cashflow-export")
+        for file_format in ("csv", "jsonl", "xlsx"):
+            with self.subTest(file_format=file_format):
+                self.assertQueryBudget(
+                    EXPORT_QUERIES,
+                    lambda: self.client.get(url, {"file_format": file_format}),
+                )
+
+    def test_create_form(self) -> None:
+        url = reverse("cashflow-create")
+        self.assertQueryBudget(
+            CREATE_FORM_QUERIES, lambda: self.client.get(url)
+        )
+
+    def test_create(self) -> None:
+        url = reverse("cashflow-create")
+        self.assertQueryBudget(
+            SAVE_QUERIES,
+            lambda: self.client.post(url, self.form_data()),
+            status=302,
+        )
+
+    def test_update_form(self) -> None:
+        def update_form():
+            pk = self.cashflows[-1].pk
+            return self.client.get(reverse("cashflow-update", args=[pk]))
+
+        self.assertQueryBudget(UPDATE_FORM_QUERIES, update_form)
+
+    def test_update(self) -> None:
+        def update():
+            pk = self.cashflows[-1].pk
+            return self.client.post(
+                reverse("cashflow-update", args=[pk]), self.form_data(1)
+            )
+
+        self.assertQueryBudget(SAVE_QUERIES, update, status=302)
+
+    def test_update_moves_to_other_type(self) -> None:
+        self.grow(1)
+        obj = self.cashflows[0]
+        subcategory = self.subcategories[-1]
+        self.assertNotEqual(
+            obj.type_id, subcategory.category.type_id, "нужен другой тип"
+        )
+
+        response = self.client.post(
+            reverse("cashflow-update", args=[obj.pk]),
+            self.form_data(len(self.subcategories) - 1),
+        )
+
+        self.assertEqual(response.status_code, 302)
+        obj.refresh_from_db()
+        self.assertEqual(obj.subcategory_id, subcategory.pk)
+        self.assertEqual(obj.type_id, subcategory.category.type_id)
+
+    def test_delete(self) -> None:
+        def delete():
+            pk = self.cashflows.pop().pk
+            return self.client.post(reverse("cashflow-delete", args=[pk]))
+
+        self.assertQueryBudget(DELETE_QUERIES, delete, status=302)
+
+    def test_htmx_options(self) -> None:
+        category = self.subcategories[0].category
+        requests = [
+            ("htmx-type-categories", {"type": category.type_id}),
+            ("htmx-category-subcategories", {"category": category.pk}),
+        ]
+        for name, params in requests:
+            with self.subTest(name=name):
+                url = reverse(name)
+                self.assertQueryBudget(
+                    OPTIONS_QUERIES, lambda: self.client.get(url, params)
+                )
+
+
+class CashflowFormTests(TestCase):
+    """Форма записи ДДС проверяет выбор по снимку справочников."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.category = create_directories()[0].category
+        cls.status = create_statuses()[0]
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def form(self, subcategory: Subcategory) -> CashflowForm:
+        return CashflowForm(
+            data={
+                "type": self.category.type_id,
+                "category": self.category.pk,
+                "subcategory": subcategory.pk,
+                "status": self.status.pk,
+                "amount": "10.00",
+            }
+        )
+
+    def test_subcategory_from_another_process(self) -> None:
+        get_snapshot()
+        # коллбэки on_commit в тестах не выполняются: версия справочников
+        # не меняется, как в процессе, до которого она не дошла
+        subcategory = Subcategory.objects.create(
+            category=self.category, name="Новая"
+        )
+
+        form = self.form(subcategory)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["subcategory"], subcategory)
+
+    def test_subcategory_of_other_category(self) -> None:
+        other = Subcategory.objects.exclude(category=self.category).first()
+
+        form = self.form(other)
+        self.assertFalse(form.is_valid())
+        self.assertIn("subcategory", form.errors)
+
+
+class CashflowListNavigationTests(TestCase):
+    """Keyset-навигация списка записей ДДС."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        status, other = create_statuses()
+        # больше двух страниц в пределах одной миллисекунды: курсор не
+        # должен терять микросекунды; каждая третья запись — «Личное»
+        cls.objects = create_cashflows(
+            LIST_PAGE_SIZE * 2 + 5,
+            create_directories()[:1],
+            [other, status, status],
+            start=timezone.now().replace(microsecond=500),
+            step=-timedelta(microseconds=10),
+            amount=Decimal("1.00"),
+        )
+        cls.status = status
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def walk(self, params: dict, link: str) -> list[list[int]]:
+        """Идёт по курсорам ``link`` страницы; id строк по страницам."""
+        pages = []
+        while len(pages) <= len(self.objects):
+            response = self.client.get(reverse("cashflow-list"), params)
+            self.assertEqual(response.status_code, 200)
+            page = response.context["page"]
+            pages.append([obj.pk for obj in page.object_list])
+            cursor = getattr(page, f"{link}_cursor")
+            if cursor is None:
+                return pages
+            params = {**params, "cursor": cursor}
+        self.fail("навигация зациклилась")
+
+    def test_walk_both_ways(self) -> None:
+        params = {"status": self.status.pk}
+        expected = sorted(
+            (obj for obj in self.objects if obj.status_id == self.status.pk),
+            key=lambda obj: obj.created_at,
+            reverse=True,
+        )
+        size = LIST_PAGE_SIZE
+
+        pages = self.walk(params, "next")
+        self.assertEqual(
+            pages,
+            [
+                [obj.pk for obj in expected[start : start + size]]
+                for start in range(0, len(expected), size)
+            ],
+        )
+
+        response = self.client.get(reverse("cashflow-list"), params)
+        while response.context["page"].next_cursor:
+            params = {
+                **params,
+                "cursor": response.context["page"].next_cursor,
+            }
+            response = self.client.get(reverse("cashflow-list"), params)
+        back = self.walk(
+            {**params, "cursor": response.context["page"].previous_cursor},
+            "previous",
+        )
+        self.assertEqual(back, pages[-2::-1])
+
+    def test_links_keep_filters(self) -> None:
+        response = self.client.get(
+            reverse("cashflow-list"), {"status": self.status.pk}
+        )
+        links = [
+            parse_qs(urlsplit(unescape(href)).query)
+            for href in response.content.decode().split('href="')[1:]
+            if "cursor=" in href.split('"')[0]
+        ]
+        self.assertTrue(links)
+        for query in links:
+            self.assertEqual(query["status"], [str(self.status.pk)])
+
+    def test_broken_cursor_shows_first_page(self) -> None:
+        response = self.client.get(
+            reverse("cashflow-list"), {"cursor": "broken"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context["page"].has_previous)
+
+
+class CascadeOptionsTests(TestCase):
+    """HTMX-варианты селектов (async-вьюхи) из снимка справочников."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.subcategories = create_directories()
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_options(self) -> None:
+        get_snapshot()
+        category = self.subcategories[0].category
+        cases = [
+            ("htmx-type-categories", {"type": category.type_id}, 2),
+            ("htmx-category-subcategories", {"category": category.pk}, 2),
+            ("htmx-type-categories", {"type": "x"}, 0),
+        ]
+        for name, params, count in cases:
+            with self.subTest(name=name, params=params):
+                with self.assertNumQueries(0):
+                    response = self.client.get(reverse(name), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response.content.decode().count('<option value="'),
+                    count + 1,
+                )
+
+
+@override_settings(UI_CASCADE="client")
+class EmbeddedTreeTests(TestCase):
+    """Дерево справочников на странице для каскадов без запросов."""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.subcategories = create_directories()
+        # название, которое закрыло бы <script>, если не экранировать
+        cls.category = Category.objects.create(
+            type=cls.subcategories[0].category.type, name="</script><b>&"
+        )
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def page(self) -> str:
+        return self.client.get(reverse("cashflow-create")).content.decode()
+
+    def tree(self, page: str) -> dict:
+        match = re.search(
+            r'<script type="application/json" id="directory-tree">'
+            r"(.*?)</script>",
+            page,
+            re.S,
+        )
+        self.assertIsNotNone(match)
+        return json.loads(match[1])
+
+    def test_tree(self) -> None:
+        page = self.page()
+        tree = self.tree(page)
+
+        snapshot = get_snapshot()
+        self.assertEqual(tree["v"], str(snapshot.version))
+        self.assertEqual(
+            tree["t"], [[obj.pk, obj.name] for obj in snapshot.types.values()]
+        )
+        for category in Category.objects.all():
+            with self.subTest(category=category.name):
+                self.assertIn(
+                    [category.pk, category.name],
+                    tree["c"][str(category.type_id)],
+                )
+                self.assertEqual(
+                    tree["s"].get(str(category.pk), []),
+                    [
+                        [obj.pk, obj.name]
+                        for obj in category.subcategories.all()
+                    ],
+                )
+        self.assertNotIn("</script><b>", page)
+        self.assertIn('data-cascade="c"', page)
+        self.assertIn('data-cascade-target="id_subcategory"', page)
+        self.assertNotIn("hx-get", page)
+
+    def test_tree_follows_directory_version(self) -> None:
+        before = self.tree(self.page())
+        with self.captureOnCommitCallbacks(execute=True):
+            Subcategory.objects.create(category=self.category, name="Новая")
+
+        after = self.tree(self.page())
+        self.assertNotEqual(after["v"], before["v"])
+        self.assertEqual(
+            [name for _, name in after["s"][str(self.category.pk)]],
+            ["Новая"],
+        )
+
+    @override_settings(UI_CASCADE="htmx")
+    def test_htmx_mode(self) -> None:
+        page = self.page()
+        self.assertNotIn("directory-tree", page)
+        self.assertIn("hx-get", page)
@@ -9,6 +9,7 @@ from django.urls import path
 from .views import (
     cashflow_create,
     cashflow_delete,
+    cashflow_export,
     cashflow_list,
     cashflow_update,
     htmx_categories_options,
@@ -18,6 +19,7 @@ from .views import (
 urlpatterns = [
     path("", cashflow_list, name="cashflow-list"),
     path("create/", cashflow_create, name="cashflow-create"),
+    path("export/", cashflow_export, name="cashflow-export"),
     path("<int:pk>/edit/", cashflow_update, name="cashflow-update"),
     path("<int:pk>/delete/", cashflow_delete, name="cashflow-delete"),
     # HTMX endpoints: возвращают набор <option>… по выбранному значению
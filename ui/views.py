@@ -7,67 +7,123 @@ from __future__ import annotations
 from decimal import Decimal
 
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import QuerySet, Sum
-from django.http import HttpRequest, HttpResponse
+from django.db.models import QuerySet
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseBase,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.response import TemplateResponse
 from django.views.decorators.http import require_GET, require_http_methods
 
+from cashflow.export import ExportFormatError, export_response
+from cashflow.keyset import InvalidCursor, KeysetPaginator
 from cashflow.models import Cashflow
-from directories.models import Category, Subcategory
+from cashflow.reports import selection_summary
+from cashflow.search import search_cashflows
+from directories.cache import aget_snapshot
+from directories.http import directory_cache
 
 from .forms import CashflowFilterForm, CashflowForm
 
+# Строк на странице списка
+LIST_PAGE_SIZE = 20
 
-@require_GET
-def cashflow_list(request: HttpRequest) -> HttpResponse:
-    """Список записей ДДС с фильтрами и пагинацией."""
-    form = CashflowFilterForm(request.GET or None)
 
+def filter_cashflows(
+    form: CashflowFilterForm,
+) -> tuple[QuerySet[Cashflow], dict]:
+    """
+    Применяет фильтры формы к записям ДДС.
+
+    Args:
+        form (CashflowFilterForm): форма фильтров (привязанная или пустая).
+    Returns:
+        tuple[QuerySet[Cashflow], dict]: выборка и применённые фильтры
+        (по ним решаем, можно ли брать итог из агрегата).
+    """
     qs: QuerySet[Cashflow] = (
         Cashflow.objects.select_related(
             "status",
             "subcategory",
-            "subcategory__category",
-            "subcategory__category__type",
+            "category",
+            "type",
         )
         .all()
         .order_by("-created_at", "-id")
     )
 
+    filters: dict = {}
     if form.is_valid():
         cd = form.cleaned_data
         if cd.get("date_from"):
             qs = qs.filter(created_at__gte=cd["date_from"])
+            filters["date_from"] = cd["date_from"]
         if cd.get("date_to"):
             qs = qs.filter(created_at__lte=cd["date_to"])
+            filters["date_to"] = cd["date_to"]
         if cd.get("status"):
             qs = qs.filter(status=cd["status"])
+            filters["status"] = cd["status"]
         if cd.get("subcategory"):
             qs = qs.filter(subcategory=cd["subcategory"])
+            filters["subcategory"] = cd["subcategory"]
         elif cd.get("category"):
-            qs = qs.filter(subcategory__category=cd["category"])
+            qs = qs.filter(category=cd["category"])
+            filters["category"] = cd["category"]
         elif cd.get("type"):
-            qs = qs.filter(subcategory__category__type=cd["type"])
+            qs = qs.filter(type=cd["type"])
+            filters["type"] = cd["type"]
+        if cd.get("q"):
+            qs = search_cashflows(qs, cd["q"])
+            filters["q"] = cd["q"]
+    return qs, filters
 
-    # Пагинация
-    paginator = Paginator(qs, 20)
-    page = request.GET.get("page")
-    page_obj = paginator.get_page(page)
 
-    # Итог по видимым строкам (страница) и по всему выбору
+@require_GET
+def cashflow_list(request: HttpRequest) -> HttpResponse:
+    """Список записей ДДС с фильтрами и keyset-навигацией."""
+    form = CashflowFilterForm(request.GET or None)
+    qs, filters = filter_cashflows(form)
+
+    # Пагинация по курсору (created_at, id): без OFFSET, любая страница
+    # стоит как первая; повреждённый курсор — показываем начало
+    paginator = KeysetPaginator(qs, LIST_PAGE_SIZE)
+    try:
+        page = paginator.page(request.GET.get("cursor") or None)
+    except InvalidCursor:
+        page = paginator.page()
+
+    # Итог по видимым строкам считаем по уже загруженной странице;
+    # количество, сумма, приход и расход по всей выборке — одним
+    # закэшированным запросом. Всего не больше двух запросов.
     page_total = sum(
-        (obj.amount for obj in page_obj.object_list), start=Decimal("0.00")
+        (obj.amount for obj in page.object_list), start=Decimal("0.00")
     )
-    full_total = qs.aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
+    summary = selection_summary(qs, filters)
 
     ctx = {
         "form": form,
-        "page_obj": page_obj,
+        "page": page,
+        "summary": summary,
         "page_total": page_total,
-        "full_total": full_total,
+        "full_total": summary["total"],
     }
-    return render(request, "cashflow_list.html", ctx)
+    # рендеринг отложен — замер запроса покажет его отдельно от view
+    return TemplateResponse(request, "cashflow_list.html", ctx)
+
+
+@require_GET
+def cashflow_export(request: HttpRequest) -> HttpResponseBase:
+    """Выгрузка отфильтрованных записей ДДС (CSV, JSON Lines, XLSX)."""
+    form = CashflowFilterForm(request.GET or None)
+    qs, _ = filter_cashflows(form)
+    try:
+        return export_response(qs, request.GET.get("file_format", "csv"))
+    except ExportFormatError as exc:
+        return HttpResponseBadRequest(str(exc))
 
 
 @require_http_methods(["GET", "POST"])
@@ -84,7 +140,7 @@ def cashflow_create(request: HttpRequest) -> HttpResponse:
 @require_http_methods(["GET", "POST"])
 def cashflow_update(request: HttpRequest, pk: int) -> HttpResponse:
     """Редактирование записи ДДС."""
-    obj = get_object_or_404(Cashflow, pk=pk)
+    obj = get_object_or_404(Cashflow.objects.select_related("status"), pk=pk)
     form = CashflowForm(request.POST or None, instance=obj)
     if request.method == "POST" and form.is_valid():
         form.save()
@@ -103,26 +159,20 @@ def cashflow_delete(request: HttpRequest, pk: int) -> HttpResponse:
 
 
 @require_GET
-def htmx_categories_options(request: HttpRequest) -> HttpResponse:
+@directory_cache
+async def htmx_categories_options(request: HttpRequest) -> HttpResponse:
     """Отдаёт <option> для категорий по type_id (для фильтра/формы)."""
-    type_id = request.GET.get("type")
-    categories = (
-        Category.objects.filter(type_id=type_id).order_by("name")
-        if type_id
-        else Category.objects.none()
-    )
+    snapshot = await aget_snapshot()
+    categories = snapshot.categories_of(request.GET.get("type"))
     return render(request, "includes/_options.html", {"objects": categories})
 
 
 @require_GET
-def htmx_subcategories_options(request: HttpRequest) -> HttpResponse:
+@directory_cache
+async def htmx_subcategories_options(request: HttpRequest) -> HttpResponse:
     """Отдаёт <option> для подкатегорий по category_id (для фильтра/формы)."""
-    category_id = request.GET.get("category")
-    subcategories = (
-        Subcategory.objects.filter(category_id=category_id).order_by("name")
-        if category_id
-        else Subcategory.objects.none()
-    )
+    snapshot = await aget_snapshot()
+    subcategories = snapshot.subcategories_of(request.GET.get("category"))
     return render(
         request, "includes/_options.html", {"objects": subcategories}
     )